@@ -0,0 +1,132 @@
+"""
+Shared fixtures for the vagrant-mcp-server tests.
+
+The server is a single script with a hyphenated file name, so it is loaded
+with importlib. Tests drive it against stand-in `vagrant`, `ssh` and
+provider scripts placed first on PATH: no Vagrant, provider or guest is
+needed, and each stand-in appends its argv to a log the tests inspect to
+count process spawns.
+"""
+
+import importlib.util
+import os
+import shutil
+import stat
+import tempfile
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Keep the server's persistent state out of the user's cache directory
+os.environ.setdefault(
+    "VAGRANT_MCP_STATE_DIR", tempfile.mkdtemp(prefix="vagrant-mcp-test-state-")
+)
+
+
+def _load_server_module() -> ModuleType:
+    """Import vagrant-mcp-server.py as the module vagrant_mcp_server"""
+    spec = importlib.util.spec_from_file_location(
+        "vagrant_mcp_server", ROOT / "vagrant-mcp-server.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+SERVER_MODULE = _load_server_module()
+
+
+class StandIns:
+    """
+    A directory of stand-in executables at the front of PATH.
+
+    Every script logs its name and argv, one line per run, to a shared
+    log file, so tests can count how often each command was started.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.log = directory / "calls.log"
+        self.log.touch()
+
+    def install(self, name: str, body: str) -> Path:
+        """Write an executable /bin/sh script called name"""
+        path = self.directory / name
+        path.write_text(
+            "#!/bin/sh\n"
+            f'printf "%s\\n" "{name} $*" >> "{self.log}"\n'
+            + body
+        )
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP)
+        return path
+
+    def calls(self, name: str) -> List[str]:
+        """Argument strings of every run of the stand-in called name"""
+        prefix = name + " "
+        return [
+            line[len(prefix):]
+            for line in self.log.read_text().splitlines()
+            if line.startswith(prefix) or line == name
+        ]
+
+
+@pytest.fixture
+def vms() -> ModuleType:
+    """The server module"""
+    return SERVER_MODULE
+
+
+@pytest.fixture
+def stand_ins(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> StandIns:
+    """Stand-in executables found before the real ones on PATH"""
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    monkeypatch.setenv("PATH", f"{directory}{os.pathsep}{os.environ['PATH']}")
+    return StandIns(directory)
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A project directory with a Vagrantfile, used as VAGRANT_PROJECTS_DIR"""
+    directory = tmp_path / "project"
+    directory.mkdir()
+    (directory / "Vagrantfile").write_text(
+        'Vagrant.configure("2") do |config|\n'
+        '  config.vm.box = "generic/alpine318"\n'
+        "end\n"
+    )
+    monkeypatch.setenv("VAGRANT_PROJECTS_DIR", str(directory))
+    return directory
+
+
+@pytest.fixture
+def server(
+    vms: ModuleType,
+    project: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch
+) -> Any:
+    """A VagrantMCPServer serving project, with state kept in tmp_path"""
+    monkeypatch.setattr(vms, "STATE_DIR", str(tmp_path / "state"))
+    instance = vms.VagrantMCPServer()
+    yield instance
+    shutil.rmtree(instance._ssh_runtime_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def call_tool(
+    server: Any
+) -> Callable[..., Awaitable[Tuple[str, Dict[str, Any]]]]:
+    """
+    Call a tool the way the MCP handler does and return its text view and
+    structured result
+    """
+    async def call(name: str, arguments: Dict[str, Any]):
+        content, structured = await server._dispatch_tool(name, arguments)
+        return content[0].text, structured
+
+    return call
@@ -0,0 +1,93 @@
+"""
+Tests that stopping a command stops its whole process tree.
+
+The stand-in vagrant forks two grandchildren of the server: a plain
+`sleep` and one that ignores SIGINT and SIGTERM, so only the final
+SIGKILL of the process group stops it. Their pids are written to a file
+for the test to check.
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+VAGRANT_SCRIPT = """\
+sleep 300 &
+echo $! >> "$STANDIN_PIDS"
+sh -c 'trap "" INT TERM; sleep 301' &
+echo $! >> "$STANDIN_PIDS"
+echo "1,,ui,info,started children"
+wait
+"""
+
+
+def alive(pid: int) -> bool:
+    """Whether pid is a running (not zombie) process"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+async def wait_for_children(path, count=2, timeout=5.0):
+    """Wait until the stand-in has recorded count child pids"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists():
+            pids = [int(line) for line in path.read_text().split()]
+            if len(pids) >= count:
+                return pids
+        await asyncio.sleep(0.05)
+    raise AssertionError("stand-in vagrant did not start its children")
+
+
+@pytest.fixture
+def pid_file(stand_ins, tmp_path, monkeypatch, vms):
+    """Install the forking stand-in and return the file it writes pids to"""
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    path = tmp_path / "pids"
+    monkeypatch.setenv("STANDIN_PIDS", str(path))
+    monkeypatch.setattr(vms, "TERMINATE_GRACE_SECONDS", 0.5)
+    return path
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="needs /proc")
+def test_job_cancel_kills_grandchildren(pid_file, server, call_tool):
+    """vagrant_job_cancel returns only once the whole tree is gone"""
+    async def scenario():
+        _, job = await call_tool(
+            "vagrant_job_submit", {"tool": "vagrant_up", "arguments": {}}
+        )
+        pids = await wait_for_children(pid_file)
+        assert all(alive(pid) for pid in pids)
+        _, cancelled = await call_tool(
+            "vagrant_job_cancel", {"job_id": job["job_id"]}
+        )
+        return pids, cancelled
+
+    pids, cancelled = asyncio.run(scenario())
+    assert cancelled["state"] == "cancelled"
+    assert not any(alive(pid) for pid in pids)
+    assert server._processes == {}
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="needs /proc")
+def test_timeout_kills_grandchildren(pid_file, server, call_tool):
+    """A command stopped by its timeout_s leaves nothing running"""
+    async def scenario():
+        return await call_tool("vagrant_up", {"timeout_s": 0.5})
+
+    started = time.monotonic()
+    _, result = asyncio.run(scenario())
+    pids = [int(line) for line in pid_file.read_text().split()]
+
+    assert result["termination"] == "timed_out"
+    assert not result["success"]
+    assert len(pids) == 2
+    assert not any(alive(pid) for pid in pids)
+    assert server._processes == {}
+    # SIGINT and SIGTERM grace periods, not the children's 300 s
+    assert time.monotonic() - started < 5
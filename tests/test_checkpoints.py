@@ -0,0 +1,96 @@
+"""
+Tests for the checkpoint stacks kept by vagrant_checkpoint_push/pop/drop.
+
+The stand-in vagrant keeps one file per snapshot in SNAPSHOT_DIR and
+lists them the way `vagrant snapshot list --machine-readable` does. The
+project has no .vagrant/machines tree, so every snapshot operation goes
+through Vagrant rather than VBoxManage.
+"""
+
+import asyncio
+
+import pytest
+
+VAGRANT_SCRIPT = """\
+error() { echo "1,,error-exit,Vagrant::Errors::SnapshotNotFound,$1"; exit 1; }
+case "$1 $2" in
+    "snapshot list")
+        if [ -n "$(ls "$SNAPSHOT_DIR")" ]; then
+            echo "1,$3,ui,output,==> $3: "
+            for f in "$SNAPSHOT_DIR"/*; do echo "1,$3,ui,detail,${f##*/}"; done
+        else
+            echo "1,$3,ui,output,==> $3: No snapshots have been taken yet!"
+            echo "1,$3,ui,detail,    $3: Snapshot saves allow you to save"
+        fi
+        ;;
+    "snapshot save") : > "$SNAPSHOT_DIR/$4" ;;
+    "snapshot restore") [ -f "$SNAPSHOT_DIR/$4" ] || error "no $4" ;;
+    "snapshot delete") rm "$SNAPSHOT_DIR/$4" 2>/dev/null || error "no $4" ;;
+    destroy*) rm -f "$SNAPSHOT_DIR"/* ;;
+esac
+"""
+
+MACHINE = {"machine_name": "default"}
+
+
+@pytest.fixture
+def snapshots(stand_ins, tmp_path, monkeypatch):
+    """Stand-in vagrant with snapshots; returns the snapshot directory"""
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    directory = tmp_path / "snapshots"
+    directory.mkdir()
+    monkeypatch.setenv("SNAPSHOT_DIR", str(directory))
+    return directory
+
+
+def list_calls(stand_ins):
+    """Number of `vagrant snapshot list` runs so far"""
+    calls = stand_ins.calls("vagrant")
+    return sum(call.startswith("snapshot list") for call in calls)
+
+
+def test_stack_is_built_once(snapshots, stand_ins, call_tool):
+    """The snapshot list is read for the first operation only"""
+    async def scenario():
+        await call_tool("vagrant_checkpoint_push", MACHINE)
+        _, pushed = await call_tool("vagrant_checkpoint_push", MACHINE)
+        _, popped = await call_tool("vagrant_checkpoint_pop", MACHINE)
+        return pushed, popped
+
+    pushed, popped = asyncio.run(scenario())
+    assert pushed["stack"] == ["vmcp-checkpoint-0001", "vmcp-checkpoint-0002"]
+    assert popped["success"] and popped["stack"] == ["vmcp-checkpoint-0001"]
+    assert sorted(p.name for p in snapshots.iterdir()) == [
+        "vmcp-checkpoint-0001"
+    ]
+    assert list_calls(stand_ins) == 1
+
+
+def test_destroy_clears_the_stack(snapshots, stand_ins, call_tool):
+    """After a destroy, pop finds no checkpoints instead of restoring one"""
+    async def scenario():
+        await call_tool("vagrant_checkpoint_push", MACHINE)
+        await call_tool("vagrant_destroy", dict(MACHINE, force=True))
+        await call_tool("vagrant_checkpoint_pop", MACHINE)
+
+    with pytest.raises(ValueError, match="has no checkpoints"):
+        asyncio.run(scenario())
+    assert not any("restore" in c for c in stand_ins.calls("vagrant"))
+    assert list_calls(stand_ins) == 2
+
+
+def test_snapshot_delete_clears_the_stack(snapshots, stand_ins, call_tool):
+    """A checkpoint deleted with vagrant_snapshot is not dropped again"""
+    async def scenario():
+        await call_tool("vagrant_checkpoint_push", MACHINE)
+        await call_tool("vagrant_checkpoint_push", MACHINE)
+        await call_tool("vagrant_snapshot", dict(
+            MACHINE, action="delete", snapshot_name="vmcp-checkpoint-0002"
+        ))
+        return await call_tool("vagrant_checkpoint_drop", MACHINE)
+
+    _, dropped = asyncio.run(scenario())
+    assert dropped["success"]
+    assert dropped["checkpoint"] == "vmcp-checkpoint-0001"
+    assert dropped["stack"] == []
+    assert list(snapshots.iterdir()) == []
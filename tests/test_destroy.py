@@ -0,0 +1,41 @@
+"""
+Tests for the confirmation vagrant_destroy requires.
+
+The stand-in vagrant only logs its runs.
+"""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def vagrant(stand_ins):
+    """Stand-in vagrant that succeeds without output"""
+    stand_ins.install("vagrant", "exit 0\n")
+    return stand_ins
+
+
+def test_destroy_without_force_is_refused(vagrant, call_tool):
+    """Nothing is destroyed unless the caller confirms with force"""
+    with pytest.raises(ValueError, match="force must be true"):
+        asyncio.run(call_tool("vagrant_destroy", {}))
+    assert vagrant.calls("vagrant") == []
+
+
+def test_destroy_with_force(vagrant, call_tool):
+    """A confirmed destroy passes --force, as Vagrant cannot prompt"""
+    _, result = asyncio.run(
+        call_tool("vagrant_destroy", {"machine_name": "web", "force": True})
+    )
+
+    assert result["success"]
+    assert vagrant.calls("vagrant")[-1].startswith("destroy web --force")
+
+
+def test_dry_run_needs_no_force(vagrant, call_tool):
+    """A dry run destroys nothing, so it is answered without force"""
+    _, result = asyncio.run(call_tool("vagrant_destroy", {"dry_run": True}))
+
+    assert result["dry_run"] is True
+    assert vagrant.calls("vagrant") == []
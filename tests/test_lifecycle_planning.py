@@ -0,0 +1,53 @@
+"""
+Tests for skipping lifecycle commands that would change nothing.
+
+The stand-in vagrant only logs its runs, so a command that was skipped
+leaves no trace in the log.
+"""
+
+import asyncio
+
+import pytest
+
+RUNNING = {
+    "command": "vagrant status",
+    "return_code": 0,
+    "success": True,
+    "machines": [{"name": "default", "state": "running"}],
+}
+
+
+@pytest.fixture
+def vagrant(stand_ins):
+    """Stand-in vagrant that succeeds without output"""
+    stand_ins.install("vagrant", "exit 0\n")
+    return stand_ins
+
+
+def test_up_skipped_on_fresh_cache_entry(vagrant, server, call_tool):
+    """A status read a moment ago is trusted"""
+    server._project(None).store_status(dict(RUNNING))
+
+    _, result = asyncio.run(call_tool("vagrant_up", {}))
+
+    assert result["skipped"] is True
+    assert result["skip_reason"] == "already running"
+    assert vagrant.calls("vagrant") == []
+
+
+def test_up_runs_on_stale_cache_entry(vagrant, server, call_tool, vms):
+    """
+    An older entry may predate a poweroff from inside the guest, so
+    without a live state read the command runs
+    """
+    context = server._project(None)
+    context.store_status(dict(RUNNING))
+    stored_at, result = context._status
+    context._status = (
+        stored_at - vms.LIFECYCLE_STATE_MAX_AGE - 1, result
+    )
+
+    _, result = asyncio.run(call_tool("vagrant_up", {}))
+
+    assert not result.get("skipped")
+    assert len(vagrant.calls("vagrant")) == 1
@@ -0,0 +1,198 @@
+"""
+Tests for MachineReadableParser and parse_ssh_config_hosts against
+fixtures in Vagrant's output formats (tests/fixtures).
+
+Chunked feeds check that a record split anywhere, including between the
+CR and LF of a CRLF line ending or inside a multi-byte character, parses
+the same as when the whole output arrives at once.
+"""
+
+from pathlib import Path
+
+import pytest
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def fixture(name: str) -> bytes:
+    """Contents of a fixture file"""
+    return (FIXTURES / name).read_bytes()
+
+
+def parse(vms, data: bytes, chunk_size: int = 0):
+    """Feed data in chunks of chunk_size (all at once for 0)"""
+    parser = vms.MachineReadableParser()
+    events = []
+    size = chunk_size or max(1, len(data))
+    for start in range(0, len(data), size):
+        events += parser.feed(data[start:start + size])
+    events += parser.close()
+    return parser, events
+
+
+def test_status_machines(vms):
+    """Machine records are folded into one entry per machine, in order"""
+    parser, _ = parse(vms, fixture("status.txt"))
+
+    machines = parser.machine_list()
+    assert [(m["name"], m["provider"], m["state"]) for m in machines] == [
+        ("web", "virtualbox", "running"),
+        ("db", "virtualbox", "poweroff"),
+        ("cache", "libvirt", "not_created"),
+    ]
+    assert machines[2]["state_human"] == "not created"
+
+
+def test_escapes_are_undone(vms):
+    """%!(VAGRANT_COMMA) becomes a comma and \\n a line break"""
+    parser, _ = parse(vms, fixture("status.txt"))
+
+    description = parser.machines["web"]["description"]
+    assert description.startswith(
+        "The VM is running. To stop this VM, you can run `vagrant halt` to\n"
+        "shut it down forcefully, or"
+    )
+    assert "%!(" not in description and "\\n" not in description
+    assert parser.text().startswith("Current machine states:\n\nweb ")
+
+
+def test_event_fields(vms):
+    """Records become typed events with the timestamp as an integer"""
+    _, events = parse(vms, fixture("up.txt"))
+
+    assert events[1] == {
+        "timestamp": 1697612500, "target": "web", "type": "action",
+        "data": ["up", "start"]
+    }
+    assert [e["type"] for e in events].count("ui") == 4
+
+
+def test_non_record_lines_are_kept(vms):
+    """Lines that are not records (plugin warnings) become raw messages"""
+    parser, events = parse(vms, fixture("up.txt"))
+
+    raw = [e for e in events if e["type"] == "raw"]
+    assert raw == [{
+        "timestamp": None, "target": "", "type": "raw",
+        "data": ["WARNING: plugin vagrant-vbguest is deprecated"]
+    }]
+    assert "WARNING: plugin vagrant-vbguest is deprecated" in parser.text()
+
+
+def test_error_exit(vms):
+    """error-exit records are collected as errors, with line breaks"""
+    parser, _ = parse(vms, fixture("error.txt"))
+
+    assert parser.errors == [
+        "The machine with the name 'nosuch' was not found configured for\n"
+        "this Vagrant environment."
+    ]
+    assert parser.messages[0]["level"] == "error"
+
+
+@pytest.mark.parametrize("name", ["status.txt", "up.txt", "error.txt",
+                                  "snapshot_list.txt"])
+@pytest.mark.parametrize("line_ending", [b"\n", b"\r\n"])
+def test_any_split_parses_the_same(vms, name, line_ending):
+    """Chunk boundaries anywhere, e.g. between CR and LF, change nothing"""
+    data = fixture(name)
+    expected = parse(vms, data)[1]
+    data = data.replace(b"\n", line_ending)
+
+    for chunk_size in range(1, 40):
+        _, events = parse(vms, data, chunk_size)
+        assert events == expected, f"chunk size {chunk_size}"
+
+
+def test_split_inside_multibyte_character(vms):
+    """A UTF-8 character split over two chunks is decoded intact"""
+    data = fixture("up.txt")
+    index = data.index("✓".encode())
+
+    parser = vms.MachineReadableParser()
+    parser.feed(data[:index + 1])
+    parser.feed(data[index + 1:])
+
+    assert "Ünïcödé ✓" in parser.text()
+
+
+def test_final_line_without_newline(vms):
+    """A last record without a line ending is parsed by close()"""
+    parser = vms.MachineReadableParser()
+    assert parser.feed(b"1697612346,web,state,running") == []
+    events = parser.close()
+
+    assert events[0]["data"] == ["running"]
+    assert parser.machine_list() == [{"name": "web", "state": "running"}]
+    assert parser.close() == []
+
+
+def test_empty_output(vms):
+    """No output means no events, machines or messages"""
+    parser, events = parse(vms, b"")
+
+    assert events == []
+    assert parser.machine_list() == [] and parser.text() == ""
+
+
+@pytest.mark.parametrize("chunk_size", [0, 1000])
+def test_long_record_is_cut_short(vms, monkeypatch, chunk_size):
+    """A record over MAX_RECORD_BYTES is buffered and kept only in part"""
+    monkeypatch.setattr(vms, "MAX_RECORD_BYTES", 1024)
+    line = b"1697612346,web,ui,info," + b"x" * 10000 + b"\n"
+    parser = vms.MachineReadableParser()
+    buffered = []
+    for start in range(0, len(line), chunk_size or len(line)):
+        parser.feed(line[start:start + (chunk_size or len(line))])
+        buffered.append(len(parser._partial))
+    parser.close()
+
+    assert max(buffered) <= 1024
+    message = parser.messages[0]["message"]
+    assert message.startswith("xxx")
+    omitted = len(line) - 1 - 1024
+    assert message.endswith(f"\n[... {omitted} bytes omitted ...]")
+
+
+def test_messages_are_capped_by_size(vms, monkeypatch):
+    """The oldest messages are dropped once their total size is too big"""
+    monkeypatch.setattr(vms, "MAX_UI_MESSAGE_BYTES", 4096)
+    data = b"".join(
+        b"1697612346,web,ui,info,%04d " % number + b"y" * 95 + b"\n"
+        for number in range(100)
+    )
+    parser, _ = parse(vms, data)
+
+    assert sum(len(m["message"]) for m in parser.messages) <= 4096
+    assert parser.messages[-1]["message"].startswith("0099 ")
+    dropped = 100 - len(parser.messages)
+    assert dropped > 0
+    assert parser.text().startswith(
+        f"[... {dropped} earlier messages omitted ...]\n"
+    )
+
+
+def test_ssh_config_hosts(vms):
+    """ssh-config output is split into one block per Host"""
+    hosts = vms.parse_ssh_config_hosts(fixture("ssh_config.txt").decode())
+
+    assert list(hosts) == ["web", "db"]
+    assert hosts["web"].startswith("Host web\n  HostName 127.0.0.1\n")
+    assert "  Port 2200\n" in hosts["db"] and "web" not in hosts["db"]
+
+
+def test_snapshot_list(vms):
+    """Snapshot names are the machine's detail messages"""
+    parser, _ = parse(vms, fixture("snapshot_list.txt"))
+
+    assert vms.parse_snapshot_list(parser, "web") == [
+        "before-update", "vmcp-checkpoint-1", "vmcp-checkpoint-2"
+    ]
+    assert vms.parse_snapshot_list(parser, "db") == []
+
+
+def test_snapshot_list_empty(vms):
+    """The explanation printed when there are no snapshots is no name"""
+    parser, _ = parse(vms, fixture("snapshot_list_empty.txt"))
+
+    assert vms.parse_snapshot_list(parser, "db") == []
@@ -0,0 +1,81 @@
+"""Tests for preparing warm pool machines in the background"""
+
+import asyncio
+
+VAGRANT_SCRIPT = """\
+case "$1 $2" in
+    # The pool project disappears while its machine is being restored
+    "snapshot restore") rm -rf "$PWD"; exit 1 ;;
+esac
+"""
+
+
+def test_prepare_error_marks_member_failed(stand_ins, server, project, vms,
+                                           monkeypatch):
+    """
+    An exception while preparing a member (here: the pool directory is
+    gone when the cached state is invalidated) fails the member instead
+    of leaving it warming
+    """
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    pool_dir = project / "pool"
+    pool_dir.mkdir()
+    vagrantfile = (project / "Vagrantfile").read_text()
+    (pool_dir / "Vagrantfile").write_text(vagrantfile)
+    monkeypatch.setattr(vms, "POOL_DIRECTORY", "pool")
+    member = vms.PoolMember("default")
+    member.state = "warming"
+    server._pool["default"] = member
+
+    asyncio.run(server._pool_prepare(member))
+
+    assert member.state == "failed"
+    assert "does not exist" in member.error
+    assert server._pool_stats["failed"] == 1
+
+
+FLAKY_UP_SCRIPT = """\
+case "$1 $2" in
+    "snapshot restore") exit 1 ;;
+esac
+if [ "$1" = up ] && [ ! -e "$PWD/failed-once" ]; then
+    touch "$PWD/failed-once"
+    exit 1
+fi
+"""
+
+
+def test_failed_member_is_retried(stand_ins, server, project, vms,
+                                  monkeypatch):
+    """
+    A member whose preparation failed goes back to the pool after the
+    retry delay and is prepared again, instead of staying failed
+    """
+    stand_ins.install("vagrant", FLAKY_UP_SCRIPT)
+    pool_dir = project / "pool"
+    pool_dir.mkdir()
+    (pool_dir / "Vagrantfile").write_text(
+        (project / "Vagrantfile").read_text()
+    )
+    monkeypatch.setattr(vms, "POOL_DIRECTORY", "pool")
+    monkeypatch.setattr(vms, "POOL_RETRY_SECONDS", 0.2)
+    member = vms.PoolMember("default")
+    member.state = "warming"
+    server._pool["default"] = member
+
+    async def scenario():
+        await server._pool_prepare(member)
+        failed = member.describe()
+        for _ in range(50):
+            await asyncio.sleep(0.05)
+            if member.state == "ready":
+                break
+        return failed
+
+    failed = asyncio.run(scenario())
+
+    assert failed["state"] == "failed" and failed["retry_in_s"] > 0
+    assert member.state == "ready" and member.failures == 0
+    assert server._pool_stats["failed"] == 1
+    assert server._pool_stats["warmed"] == 1
+    assert [c.split()[0] for c in stand_ins.calls("vagrant")].count("up") == 2
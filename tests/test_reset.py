@@ -0,0 +1,33 @@
+"""
+Tests for the strategy choice of vagrant_reset, against a stand-in
+`vagrant` that lists no snapshots.
+"""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def vagrant(stand_ins):
+    """Stand-in vagrant whose machine has no snapshots"""
+    stand_ins.install("vagrant", "exit 0\n")
+    return stand_ins
+
+
+@pytest.mark.parametrize("level, lists", [
+    ("pristine", False),
+    ("clean", True),
+])
+def test_reset_lists_snapshots_only_when_useful(vagrant, call_tool, level,
+                                                lists):
+    """Snapshots are listed only if a restore can reach the level"""
+    async def scenario():
+        return await call_tool("vagrant_reset", {
+            "machine_name": "default", "cleanliness": level, "dry_run": True
+        })
+
+    _, result = asyncio.run(scenario())
+    listed = [c for c in vagrant.calls("vagrant") if c.startswith("snapshot")]
+    assert bool(listed) == lists
+    assert result["strategy"] == "recreate"
@@ -0,0 +1,43 @@
+"""
+Tests for the argv vagrant_snapshot builds.
+
+The stand-in vagrant only logs its runs.
+"""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def vagrant(stand_ins):
+    """Stand-in vagrant that succeeds without output"""
+    stand_ins.install("vagrant", "exit 0\n")
+    return stand_ins
+
+
+@pytest.mark.parametrize("action", ["save", "restore", "delete"])
+def test_machine_name_comes_before_snapshot_name(vagrant, call_tool, vms,
+                                                 action):
+    """
+    Vagrant expects `snapshot <action> [vm-name] <name>`, and the
+    scheduler claims the machine named in that position
+    """
+    asyncio.run(call_tool("vagrant_snapshot", {
+        "action": action, "machine_name": "web", "snapshot_name": "clean"
+    }))
+
+    argv = vagrant.calls("vagrant")[-1].split()
+    assert argv[:4] == ["snapshot", action, "web", "clean"]
+    assert vms.command_targets(argv) == (True, frozenset(["web"]))
+
+
+def test_snapshot_name_without_machine(vagrant, call_tool, vms):
+    """Without a machine name the snapshot applies to every machine"""
+    asyncio.run(call_tool("vagrant_snapshot", {
+        "action": "save", "snapshot_name": "clean"
+    }))
+
+    argv = vagrant.calls("vagrant")[-1].split()
+    assert argv[:3] == ["snapshot", "save", "clean"]
+    assert vms.command_targets(argv) == (True, None)
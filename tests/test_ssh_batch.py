@@ -0,0 +1,65 @@
+"""
+Tests for vagrant_ssh_batch.
+
+A stand-in `vagrant ssh -c COMMAND` runs COMMAND locally, so the batch
+script is executed by a local bash instead of a guest shell.
+"""
+
+import asyncio
+
+import pytest
+
+VAGRANT_SCRIPT = """\
+case "$1" in
+    ssh)
+        # vagrant ssh -c COMMAND
+        eval "$3"
+        ;;
+esac
+"""
+
+
+@pytest.fixture
+def batch_stand_ins(stand_ins, vms, monkeypatch):
+    """Stand-in vagrant; batches go through `vagrant ssh -c`"""
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    monkeypatch.setattr(vms, "SSH_DIRECT", False)
+    return stand_ins
+
+
+def test_batch_reports_exit_status_of_exiting_command(
+    batch_stand_ins, call_tool, server
+):
+    """A command that exits the shell reports its exit status"""
+    async def scenario():
+        return await call_tool("vagrant_ssh_batch", {
+            "commands": ["echo one", "exit 3", "echo three"],
+            "stop_on_failure": True
+        })
+
+    text, result = asyncio.run(scenario())
+    first, second, third = result["commands"]
+    assert first["status"] == "ok"
+    assert first["stdout"] == "one\n"
+    assert second["status"] == "aborted"
+    assert second["return_code"] == 3
+    assert "aborted (exit 3)" in text
+    assert third["status"] == "skipped"
+    assert not result["success"]
+    assert server._processes == {}
+
+
+def test_batch_stops_on_failure(batch_stand_ins, call_tool, server):
+    """stop_on_failure skips the commands after the first failure"""
+    async def scenario():
+        return await call_tool("vagrant_ssh_batch", {
+            "commands": ["false", "echo two"],
+            "stop_on_failure": True
+        })
+
+    _, result = asyncio.run(scenario())
+    assert [entry["status"] for entry in result["commands"]] == [
+        "failed", "skipped"
+    ]
+    assert result["commands"][0]["return_code"] == 1
+    assert server._processes == {}
@@ -0,0 +1,175 @@
+"""
+Tests and benchmark for the direct OpenSSH path of vagrant_ssh.
+
+A stand-in `vagrant` sleeps VAGRANT_STANDIN_DELAY seconds before doing
+anything, like Vagrant loading Ruby and the Vagrantfile, and a stand-in
+`ssh` emulates a ControlMaster connection with a marker file. Counting
+their runs shows how many Vagrant startups each path pays for.
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+# Startup time of the stand-in vagrant, in seconds
+VAGRANT_DELAY = 0.3
+
+VAGRANT_SCRIPT = """\
+[ "${VAGRANT_STANDIN_DELAY:-0}" = 0 ] || sleep "$VAGRANT_STANDIN_DELAY"
+case "$1" in
+    ssh-config)
+        printf 'Host default\\n  HostName 127.0.0.1\\n  User vagrant\\n'
+        printf '  Port 2222\\n'
+        ;;
+    ssh)
+        # vagrant ssh -c COMMAND
+        eval "$3"
+        ;;
+esac
+"""
+
+SSH_SCRIPT = """\
+for last; do :; done
+case " $* " in
+    *" -O check "*) [ -f "$SSH_STANDIN_MASTER" ]; exit ;;
+    *" -O exit "*) rm -f "$SSH_STANDIN_MASTER"; exit 0 ;;
+    *" -f -N "*)
+        [ -z "$SSH_STANDIN_FAIL_MASTER" ] || exit 255
+        : > "$SSH_STANDIN_MASTER"
+        exit 0
+        ;;
+esac
+eval "$last"
+"""
+
+
+@pytest.fixture
+def ssh_stand_ins(stand_ins, tmp_path, monkeypatch):
+    """Stand-in vagrant and ssh for a single-machine project"""
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    stand_ins.install("ssh", SSH_SCRIPT)
+    monkeypatch.setenv("VAGRANT_STANDIN_DELAY", str(VAGRANT_DELAY))
+    monkeypatch.setenv("SSH_STANDIN_MASTER", str(tmp_path / "master"))
+    return stand_ins
+
+
+async def run_commands(call_tool, count):
+    """Run count vagrant_ssh calls one after another, return the results"""
+    results = []
+    for number in range(count):
+        _, result = await call_tool(
+            "vagrant_ssh", {"command": f"echo run {number}"}
+        )
+        results.append(result)
+    return results
+
+
+def test_direct_ssh_starts_vagrant_once(ssh_stand_ins, call_tool, vms,
+                                        monkeypatch):
+    """
+    Benchmark: five commands cost one Vagrant startup over direct ssh and
+    five through `vagrant ssh -c`, which shows in the time they take
+    """
+    async def scenario():
+        started = time.monotonic()
+        direct = await run_commands(call_tool, 5)
+        direct_s = time.monotonic() - started
+
+        monkeypatch.setattr(vms, "SSH_DIRECT", False)
+        started = time.monotonic()
+        cli = await run_commands(call_tool, 5)
+        cli_s = time.monotonic() - started
+        return direct, direct_s, cli, cli_s
+
+    direct, direct_s, cli, cli_s = asyncio.run(scenario())
+
+    assert [r["transport"] for r in direct] == ["openssh"] * 5
+    assert [r["transport"] for r in cli] == ["vagrant"] * 5
+    assert [r["stdout"] for r in direct] == [f"run {n}\n" for n in range(5)]
+    calls = ssh_stand_ins.calls("vagrant")
+    assert calls.count("ssh-config") == 1
+    assert len([c for c in calls if c.startswith("ssh -c")]) == 5
+    assert cli_s >= 5 * VAGRANT_DELAY
+    # One startup for ssh-config, plus five quick ssh runs
+    assert direct_s < 2 * VAGRANT_DELAY
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/fd/0"),
+                    reason="needs /proc")
+def test_commands_do_not_inherit_server_stdin(ssh_stand_ins, call_tool, vms,
+                                              monkeypatch):
+    """
+    The server's stdin is the MCP stream; ssh must get /dev/null instead,
+    on the direct path and through `vagrant ssh -c`
+    """
+    monkeypatch.setenv("VAGRANT_STANDIN_DELAY", "0")
+
+    async def scenario():
+        _, direct = await call_tool(
+            "vagrant_ssh", {"command": "readlink /proc/self/fd/0"}
+        )
+        monkeypatch.setattr(vms, "SSH_DIRECT", False)
+        _, cli = await call_tool(
+            "vagrant_ssh", {"command": "readlink /proc/self/fd/0"}
+        )
+        return direct, cli
+
+    # Give the test process a pipe as stdin, like the MCP stdio transport,
+    # so an inherited stdin would show up as "pipe:[...]"
+    read_end, write_end = os.pipe()
+    saved_stdin = os.dup(0)
+    os.dup2(read_end, 0)
+    try:
+        direct, cli = asyncio.run(scenario())
+    finally:
+        os.dup2(saved_stdin, 0)
+        for fd in (saved_stdin, read_end, write_end):
+            os.close(fd)
+    assert direct["transport"] == "openssh"
+    assert direct["stdout"].strip() == "/dev/null"
+    assert cli["transport"] == "vagrant"
+    assert cli["stdout"].strip() == "/dev/null"
+
+
+def test_failed_master_is_not_retried_per_command(ssh_stand_ins, call_tool,
+                                                  server, monkeypatch):
+    """
+    When the master connection cannot be opened, later commands go to
+    `vagrant ssh -c` directly instead of fetching the ssh-config again,
+    until a lifecycle command invalidates the machine's state
+    """
+    monkeypatch.setenv("VAGRANT_STANDIN_DELAY", "0")
+    monkeypatch.setenv("SSH_STANDIN_FAIL_MASTER", "1")
+
+    async def scenario():
+        results = await run_commands(call_tool, 3)
+        server._invalidate_machine_state(None)
+        results += await run_commands(call_tool, 1)
+        return results
+
+    results = asyncio.run(scenario())
+    assert [r["transport"] for r in results] == ["vagrant"] * 4
+    calls = ssh_stand_ins.calls("vagrant")
+    # One lookup before the first command and one after invalidation
+    assert calls.count("ssh-config") == 2
+    assert len(calls) == 6
+    assert server._ssh_stats["skipped_retries"] == 2
+
+
+def test_missing_ssh_client_falls_back(stand_ins, call_tool, server,
+                                       monkeypatch):
+    """Without an ssh binary, commands run through `vagrant ssh -c`"""
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    monkeypatch.setenv("PATH", str(stand_ins.directory))
+
+    async def scenario():
+        return await run_commands(call_tool, 2)
+
+    results = asyncio.run(scenario())
+    assert [r["transport"] for r in results] == ["vagrant"] * 2
+    assert all(r["success"] for r in results)
+    assert server._ssh_missing
+    # ssh-config once; the second command skips direct ssh entirely
+    assert stand_ins.calls("vagrant").count("ssh-config") == 1
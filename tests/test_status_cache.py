@@ -0,0 +1,44 @@
+"""Tests for the vagrant_status cache"""
+
+import asyncio
+
+VAGRANT_SCRIPT = """\
+echo "1,default,provider-name,virtualbox"
+echo "1,default,state,running"
+"""
+
+
+def test_cache_age_in_structured_result(stand_ins, call_tool):
+    """The structured result tells whether it was cached, and its age"""
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+
+    async def scenario():
+        _, first = await call_tool("vagrant_status", {})
+        await asyncio.sleep(0.05)
+        _, second = await call_tool("vagrant_status", {})
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["cached"] is False and first["age_ms"] == 0
+    assert second["cached"] is True and second["age_ms"] >= 50
+    assert second["machines"] == first["machines"]
+    assert len(stand_ins.calls("vagrant")) == 1
+
+
+def test_cache_keeps_each_callers_excerpt(stand_ins, call_tool):
+    """
+    A result cut to one caller's max_output_bytes is not served to a
+    caller asking for another limit
+    """
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+
+    async def scenario():
+        _, short = await call_tool("vagrant_status", {"max_output_bytes": 8})
+        _, same = await call_tool("vagrant_status", {"max_output_bytes": 8})
+        _, full = await call_tool("vagrant_status", {})
+        return short, same, full
+
+    short, same, full = asyncio.run(scenario())
+    assert short["truncated"] and same["cached"] is True
+    assert full["cached"] is False and not full["truncated"]
+    assert len(stand_ins.calls("vagrant")) == 2
@@ -0,0 +1,116 @@
+"""
+Benchmarks for vagrant_status: the .vagrant/machines fast path against
+the CLI, and concurrent calls sharing one `vagrant status` process.
+
+The stand-in vagrant sleeps VAGRANT_STANDIN_DELAY seconds before printing
+the status of a two-machine project, like Vagrant loading Ruby, plugins
+and the Vagrantfile. The stand-in VBoxManage answers at once.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+# Startup time of the stand-in vagrant, in seconds
+VAGRANT_DELAY = 0.3
+
+VAGRANT_SCRIPT = """\
+sleep "$VAGRANT_STANDIN_DELAY"
+echo "1,web,provider-name,virtualbox"
+echo "1,web,state,running"
+echo "1,db,provider-name,virtualbox"
+echo "1,db,state,not_created"
+"""
+
+VBOXMANAGE_SCRIPT = """\
+echo 'name="web"'
+echo 'VMState="running"'
+"""
+
+
+@pytest.fixture
+def status_stand_ins(stand_ins, project, monkeypatch):
+    """
+    Stand-ins plus the .vagrant/machines tree Vagrant leaves behind for a
+    created web machine and a db machine that was never created
+    """
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    stand_ins.install("VBoxManage", VBOXMANAGE_SCRIPT)
+    monkeypatch.setenv("VAGRANT_STANDIN_DELAY", str(VAGRANT_DELAY))
+    machines = project / ".vagrant" / "machines"
+    (machines / "web" / "virtualbox").mkdir(parents=True)
+    (machines / "web" / "virtualbox" / "id").write_text("1f3c-web\n")
+    (machines / "web" / "virtualbox" / "index_uuid").write_text("abc\n")
+    (machines / "db" / "virtualbox").mkdir(parents=True)
+    return stand_ins
+
+
+def test_fast_path_skips_vagrant(status_stand_ins, server, call_tool):
+    """
+    Benchmark: once the machine names are known, an uncached status is
+    read from .vagrant/machines and VBoxManage without starting Vagrant,
+    with the same states the CLI reported
+    """
+    async def scenario():
+        started = time.monotonic()
+        _, cli = await call_tool("vagrant_status", {})
+        cli_s = time.monotonic() - started
+
+        server._project(None).invalidate_status()
+        started = time.monotonic()
+        _, fast = await call_tool("vagrant_status", {})
+        fast_s = time.monotonic() - started
+        return cli, cli_s, fast, fast_s
+
+    cli, cli_s, fast, fast_s = asyncio.run(scenario())
+
+    assert cli["command"].startswith("vagrant status")
+    assert fast["command"] == "read .vagrant/machines (fast path)"
+    assert ([(m["name"], m["state"]) for m in fast["machines"]]
+            == [(m["name"], m["state"]) for m in cli["machines"]]
+            == [("web", "running"), ("db", "not_created")])
+    assert len(status_stand_ins.calls("vagrant")) == 1
+    # Only the created machine needs a provider round trip
+    assert status_stand_ins.calls("VBoxManage") == [
+        "showvminfo 1f3c-web --machinereadable"
+    ]
+    assert cli_s >= VAGRANT_DELAY
+    # No Vagrant startup: a small fraction of the CLI's time
+    assert fast_s < VAGRANT_DELAY / 3
+
+
+def test_fresh_status_asks_vagrant(status_stand_ins, call_tool):
+    """fresh bypasses both the cache and the fast path"""
+    async def scenario():
+        await call_tool("vagrant_status", {})
+        return await call_tool("vagrant_status", {"fresh": True})
+
+    _, result = asyncio.run(scenario())
+
+    assert result["command"].startswith("vagrant status")
+    assert result["cached"] is False
+    assert len(status_stand_ins.calls("vagrant")) == 2
+    assert status_stand_ins.calls("VBoxManage") == []
+
+
+def test_concurrent_status_calls_share_one_process(status_stand_ins,
+                                                   call_tool):
+    """
+    Benchmark: five concurrent status calls on a cold cache start
+    `vagrant status` once and all get its result
+    """
+    async def scenario():
+        started = time.monotonic()
+        results = await asyncio.gather(*(
+            call_tool("vagrant_status", {}) for _ in range(5)
+        ))
+        return [result for _, result in results], time.monotonic() - started
+
+    results, elapsed = asyncio.run(scenario())
+
+    assert len(status_stand_ins.calls("vagrant")) == 1
+    assert all(r["success"] for r in results)
+    assert all(r["machines"] == results[0]["machines"] for r in results)
+    # About the cost of one `vagrant status`, not five
+    assert VAGRANT_DELAY <= elapsed < 2 * VAGRANT_DELAY
@@ -0,0 +1,31 @@
+"""Tests for reading per-tool limits from VAGRANT_TOOL_TIMEOUTS"""
+
+import logging
+
+import pytest
+
+
+def test_valid_overrides(vms):
+    """A JSON object of positive numbers is taken as is"""
+    assert vms.parse_tool_timeouts('{"vagrant_up": 1800, "x": 2.5}') == {
+        "vagrant_up": 1800.0, "x": 2.5
+    }
+
+
+@pytest.mark.parametrize("text", ["{vagrant_up: 1800", "[1800]", "1800"])
+def test_unusable_value_is_ignored(vms, caplog, text):
+    """Malformed JSON or a non-object only logs a warning"""
+    with caplog.at_level(logging.WARNING):
+        assert vms.parse_tool_timeouts(text) == {}
+    assert "Ignoring VAGRANT_TOOL_TIMEOUTS" in caplog.text
+
+
+def test_bad_entries_are_skipped(vms, caplog):
+    """Entries that are not positive numbers are left out one by one"""
+    text = (
+        '{"vagrant_up": "1800", "vagrant_halt": 0, "vagrant_ssh": true,'
+        ' "vagrant_reload": 60}'
+    )
+    with caplog.at_level(logging.WARNING):
+        assert vms.parse_tool_timeouts(text) == {"vagrant_reload": 60.0}
+    assert caplog.text.count("Ignoring VAGRANT_TOOL_TIMEOUTS entry") == 3
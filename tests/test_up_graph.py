@@ -0,0 +1,83 @@
+"""
+Tests for vagrant_up_graph run as a background job and its deadline.
+
+The stand-in vagrant takes UP_STANDIN_DELAY seconds per `vagrant up` and
+prints one machine-readable UI line naming the machine.
+"""
+
+import asyncio
+
+import pytest
+
+VAGRANT_SCRIPT = """\
+if [ "$1" = up ]; then
+    echo "1,$2,ui,info,booting $2"
+    sleep "${UP_STANDIN_DELAY:-0.1}"
+    echo "1,$2,ui,info,$2 is up"
+fi
+"""
+
+
+@pytest.fixture
+def vagrant(stand_ins):
+    """Stand-in vagrant whose up takes a moment"""
+    stand_ins.install("vagrant", VAGRANT_SCRIPT)
+    return stand_ins
+
+
+def test_job_output_follows_each_machine(vagrant, server, call_tool):
+    """
+    Every `vagrant up` of a graph job can be read on its own, with offsets
+    that stay valid after the job has finished
+    """
+    graph = {"db": [], "cache": [], "web": ["db", "cache"]}
+
+    async def scenario():
+        _, job = await call_tool(
+            "vagrant_job_submit",
+            {"tool": "vagrant_up_graph", "arguments": {"graph": graph}}
+        )
+        await server._jobs[job["job_id"]].task
+        _, first = await call_tool(
+            "vagrant_job_output", {"job_id": job["job_id"]}
+        )
+        outputs = {}
+        for run in first["runs"]:
+            _, output = await call_tool(
+                "vagrant_job_output",
+                {"job_id": job["job_id"], "run_id": run["run_id"]}
+            )
+            outputs[run["command"].split()[2]] = output
+        return first, outputs
+
+    first, outputs = asyncio.run(scenario())
+    assert len(first["runs"]) == 3
+    assert first["run_id"] == first["runs"][0]["run_id"]
+    assert sorted(outputs) == ["cache", "db", "web"]
+    for machine, output in outputs.items():
+        assert output["text"] == f"booting {machine}\n{machine} is up"
+        assert output["complete"]
+        assert output["next_offset"] == output["total_bytes"] > 0
+
+
+def test_timeout_bounds_the_whole_graph(vagrant, call_tool, monkeypatch):
+    """
+    timeout_s is shared by the chain: the second machine only gets what
+    the first left over, and the third is never started
+    """
+    monkeypatch.setenv("UP_STANDIN_DELAY", "0.6")
+    graph = {"a": [], "b": ["a"], "c": ["b"]}
+
+    async def scenario():
+        return await call_tool(
+            "vagrant_up_graph", {"graph": graph, "timeout_s": 0.9}
+        )
+
+    _, result = asyncio.run(scenario())
+    status = {node["machine"]: node for node in result["machines"]}
+    assert status["a"]["status"] == "up"
+    assert status["b"]["termination"] == "timed_out"
+    assert status["c"]["status"] == "blocked"
+    assert result["timed_out"] and not result["success"]
+    assert result["duration_ms"] < 1500
+    assert len(vagrant.calls("vagrant")) == 2
@@ -2,25 +2,53 @@
 """
 Vagrant MCP Server
 
-A Model Context Protocol server that provides tools for running Vagrant commands
-and capturing their output for AI agents to utilize.
+A Model Context Protocol server that provides tools for running Vagrant
+commands and capturing their output for AI agents to utilize.
 """
 
 import asyncio
+import codecs
+import contextlib
+import contextvars
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import hashlib
+import itertools
 import json
 import logging
+import mmap
 import os
+import re
+import shlex
+import shutil
+import signal
+import struct
 import subprocess
 import sys
+import tempfile
+import time
+import uuid
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, List, Optional,
+    Sequence, Tuple
+)
+from urllib.parse import parse_qs, urlsplit
+
+import anyio
 
 # MCP SDK imports
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.server.stdio import stdio_server
 from mcp.types import (
     CallToolRequestParams,
+    Resource,
+    ResourceTemplate,
     TextContent,
     Tool,
     INVALID_PARAMS,
@@ -31,433 +59,5896 @@ from mcp.types import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("vagrant-mcp-server")
 
-class VagrantMCPServer:
-    def __init__(self):
-        self.server = Server("vagrant-mcp-server")
-        self.base_projects_dir = os.environ.get("VAGRANT_PROJECTS_DIR", "/vagrant-projects")
-        self._setup_handlers()
-    
-    def _setup_handlers(self):
-        """Setup MCP server handlers"""
-        
-        @self.server.list_tools()
-        async def handle_list_tools() -> list[Tool]:
-            """List available Vagrant tools"""
-            return [
-                Tool(
-                    name="vagrant_status",
-                    description="Get the status of Vagrant machines in the current directory",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "directory": {
-                                "type": "string",
-                                "description": "Directory parameter (ignored in containerized mode - uses mounted volume)"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="vagrant_up",
-                    description="Start and provision Vagrant machines",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "machine_name": {
-                                "type": "string",
-                                "description": "Name of specific machine to start (optional)"
-                            },
-                            "directory": {
-                                "type": "string", 
-                                "description": "Directory parameter (ignored in containerized mode - uses mounted volume)"
-                            },
-                            "provider": {
-                                "type": "string",
-                                "description": "Vagrant provider to use (e.g., virtualbox, vmware)"
-                            },
-                            "provision": {
-                                "type": "boolean",
-                                "description": "Whether to run provisioners",
-                                "default": True
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="vagrant_halt",
-                    description="Stop Vagrant machines gracefully",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "machine_name": {
-                                "type": "string",
-                                "description": "Name of specific machine to stop (optional)"
-                            },
-                            "directory": {
-                                "type": "string",
-                                "description": "Directory containing Vagrantfile"
-                            },
-                            "force": {
-                                "type": "boolean", 
-                                "description": "Force halt the machine",
-                                "default": False
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="vagrant_destroy",
-                    description="Destroy Vagrant machines and remove all traces",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "machine_name": {
-                                "type": "string",
-                                "description": "Name of specific machine to destroy (optional)"
-                            },
-                            "directory": {
-                                "type": "string",
-                                "description": "Directory containing Vagrantfile" 
-                            },
-                            "force": {
-                                "type": "boolean",
-                                "description": "Force destroy without confirmation",
-                                "default": False
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="vagrant_ssh",
-                    description="Execute commands via SSH on Vagrant machine",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "command": {
-                                "type": "string",
-                                "description": "Command to execute on the machine"
-                            },
-                            "machine_name": {
-                                "type": "string",
-                                "description": "Name of machine to SSH into (optional if only one machine)"
-                            },
-                            "directory": {
-                                "type": "string",
-                                "description": "Directory containing Vagrantfile"
-                            }
-                        },
-                        "required": ["command"]
-                    }
-                ),
-                Tool(
-                    name="vagrant_provision",
-                    description="Run provisioners on Vagrant machines",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "machine_name": {
-                                "type": "string",
-                                "description": "Name of specific machine to provision (optional)"
-                            },
-                            "directory": {
-                                "type": "string",
-                                "description": "Directory containing Vagrantfile"
-                            },
-                            "provision_with": {
-                                "type": "string",
-                                "description": "Specific provisioner to run"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="vagrant_reload",
-                    description="Restart Vagrant machines and reload Vagrantfile",
-                    inputSchema={
-                        "type": "object", 
-                        "properties": {
-                            "machine_name": {
-                                "type": "string",
-                                "description": "Name of specific machine to reload (optional)"
-                            },
-                            "directory": {
-                                "type": "string",
-                                "description": "Directory containing Vagrantfile"
-                            },
-                            "provision": {
-                                "type": "boolean",
-                                "description": "Whether to run provisioners after reload",
-                                "default": False
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="vagrant_snapshot",
-                    description="Manage Vagrant snapshots",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "action": {
-                                "type": "string",
-                                "enum": ["save", "restore", "list", "delete"],
-                                "description": "Snapshot action to perform"
-                            },
-                            "snapshot_name": {
-                                "type": "string", 
-                                "description": "Name of the snapshot (required for save, restore, delete)"
-                            },
-                            "machine_name": {
-                                "type": "string",
-                                "description": "Name of machine for snapshot operation"
-                            },
-                            "directory": {
-                                "type": "string",
-                                "description": "Directory containing Vagrantfile"
-                            }
-                        },
-                        "required": ["action"]
-                    }
-                ),
-                Tool(
-                    name="vagrant_global_status", 
-                    description="Get global status of all Vagrant environments",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "prune": {
-                                "type": "boolean",
-                                "description": "Prune invalid entries",
-                                "default": False
-                            }
-                        }
-                    }
-                )
-            ]
+# Size of each read from the vagrant process pipes. Reading fixed-size chunks
+# (instead of readline) keeps a single huge line from blowing the StreamReader
+# limit and lets us forward output as soon as it is produced.
+STREAM_CHUNK_SIZE = 64 * 1024
 
-        @self.server.call_tool()
-        async def handle_call_tool(
-            name: str, arguments: dict | None
-        ) -> list[TextContent]:
-            """Handle tool calls"""
-            try:
-                if name == "vagrant_status":
-                    return await self._vagrant_status(arguments or {})
-                elif name == "vagrant_up":
-                    return await self._vagrant_up(arguments or {})
-                elif name == "vagrant_halt":
-                    return await self._vagrant_halt(arguments or {})
-                elif name == "vagrant_destroy":
-                    return await self._vagrant_destroy(arguments or {})
-                elif name == "vagrant_ssh":
-                    return await self._vagrant_ssh(arguments or {})
-                elif name == "vagrant_provision":
-                    return await self._vagrant_provision(arguments or {})
-                elif name == "vagrant_reload":
-                    return await self._vagrant_reload(arguments or {})
-                elif name == "vagrant_snapshot":
-                    return await self._vagrant_snapshot(arguments or {})
-                elif name == "vagrant_global_status":
-                    return await self._vagrant_global_status(arguments or {})
-                else:
-                    raise ValueError(f"Unknown tool: {name}")
-                    
-            except Exception as e:
-                logger.error(f"Error executing tool {name}: {e}")
-                return [TextContent(type="text", text=f"Error: {str(e)}")]
+# Default number of output bytes per stream returned in a tool result. The
+# rest stays available through the vagrant-run:// resources.
+DEFAULT_MAX_OUTPUT_BYTES = int(
+    os.environ.get("VAGRANT_MAX_OUTPUT_BYTES", str(64 * 1024))
+)
 
-    def _get_working_directory(self, requested_dir: Optional[str] = None) -> str:
-        """Get the working directory, handling container volume mounts"""
-        # In containerized mode, always use the mounted volume directory
-        # The requested_dir parameter is ignored since we're working within a mounted volume
-        # that contains the Vagrant project
-        
-        # Always use the base projects directory (the mounted volume)
-        return self.base_projects_dir
+# Output held in memory before a stream is spilled to a temporary spool file
+SPOOL_THRESHOLD_BYTES = int(
+    os.environ.get("VAGRANT_SPOOL_THRESHOLD_BYTES", str(1024 * 1024))
+)
 
-    async def _run_vagrant_command(
-        self, 
-        args: List[str], 
-        directory: Optional[str] = None,
-        input_text: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """Run a vagrant command and capture output"""
-        try:
-            cmd = ["vagrant"] + args
-            cwd = self._get_working_directory(directory)
-            
-            # Verify the directory exists and contains a Vagrantfile (for most operations)
-            if not os.path.exists(cwd):
-                return {
-                    "command": " ".join(cmd),
-                    "return_code": -1,
-                    "stdout": "",
-                    "stderr": f"Directory does not exist: {cwd}",
-                    "success": False
-                }
-            
-            # Check for Vagrantfile unless it's a global command
-            if args[0] not in ["global-status"] and not os.path.exists(os.path.join(cwd, "Vagrantfile")):
-                return {
-                    "command": " ".join(cmd),
-                    "return_code": -1,
-                    "stdout": "",
-                    "stderr": f"No Vagrantfile found in: {cwd}",
-                    "success": False
-                }
-            
-            logger.info(f"Running command: {' '.join(cmd)} in {cwd}")
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                cwd=cwd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                stdin=asyncio.subprocess.PIPE if input_text else None
-            )
-            
-            stdout, stderr = await process.communicate(
-                input=input_text.encode() if input_text else None
-            )
-            
-            return {
-                "command": " ".join(cmd),
-                "return_code": process.returncode,
-                "stdout": stdout.decode('utf-8', errors='replace'),
-                "stderr": stderr.decode('utf-8', errors='replace'),
-                "success": process.returncode == 0,
-                "working_directory": cwd
-            }
-            
-        except Exception as e:
-            logger.error(f"Failed to run vagrant command: {e}")
-            return {
-                "command": " ".join(cmd) if 'cmd' in locals() else "unknown",
-                "return_code": -1,
-                "stdout": "",
-                "stderr": str(e),
-                "success": False,
-                "working_directory": cwd if 'cwd' in locals() else "unknown"
-            }
+# Size of the in-memory ring buffer holding the end of each stream
+TAIL_BUFFER_BYTES = 256 * 1024
 
-    async def _vagrant_status(self, args: dict) -> list[TextContent]:
-        """Get vagrant machine status"""
-        directory = args.get("directory")
-        result = await self._run_vagrant_command(["status"], directory)
-        
-        response = f"Vagrant Status:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Working Directory: {result.get('working_directory', 'unknown')}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
-        
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
-        else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+# Number of finished runs whose output can still be read as resources
+RETAINED_RUNS = int(os.environ.get("VAGRANT_RETAINED_RUNS", "32"))
 
-    async def _vagrant_up(self, args: dict) -> list[TextContent]:
-        """Start vagrant machines"""
-        cmd_args = ["up"]
-        
-        if args.get("machine_name"):
-            cmd_args.append(args["machine_name"])
-            
-        if args.get("provider"):
-            cmd_args.extend(["--provider", args["provider"]])
-            
-        if args.get("provision", True) is False:
-            cmd_args.append("--no-provision")
-            
-        result = await self._run_vagrant_command(cmd_args, args.get("directory"))
-        
-        response = f"Vagrant Up:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
-        
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
-        else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+# Largest byte range served by a single resource read
+MAX_RESOURCE_READ_BYTES = 1024 * 1024
+
+# How long a parsed `vagrant status` result is reused, in seconds
+STATUS_CACHE_TTL = float(os.environ.get("VAGRANT_STATUS_CACHE_TTL", "30"))
+
+# Whether vagrant_status may read machine state from .vagrant/machines instead
+# of running `vagrant status`
+STATUS_FAST_PATH = os.environ.get(
+    "VAGRANT_STATUS_FAST_PATH", "1"
+) not in ("0", "false", "no")
+
+# Provider CLI commands used by the fast path to check whether a created
+# machine is running, and how to map their answer onto Vagrant state names.
+# Providers not listed here always go through `vagrant status`.
+PROVIDER_STATE_COMMANDS: Dict[str, List[str]] = {
+    "virtualbox": ["VBoxManage", "showvminfo", "{id}", "--machinereadable"],
+    "libvirt": ["virsh", "--connect", "qemu:///system", "domstate", "{id}"],
+    "docker": [
+        "docker", "inspect", "--format", "{{{{.State.Status}}}}", "{id}"
+    ],
+}
+PROVIDER_STATE_NAMES: Dict[str, Dict[str, str]] = {
+    "virtualbox": {"running": "running", "poweroff": "poweroff",
+                   "saved": "saved", "paused": "paused",
+                   "aborted": "aborted"},
+    "libvirt": {"running": "running", "shut off": "shutoff",
+                "paused": "paused", "pmsuspended": "suspended",
+                "crashed": "crashed"},
+    "docker": {"running": "running", "exited": "stopped", "created": "stopped",
+               "paused": "paused"},
+}
+VBOX_STATE_RE = re.compile(r'^VMState="(?P<state>[^"]+)"', re.MULTILINE)
+
+# Provider CLI commands reporting a created machine's memory and CPUs, with
+# patterns extracting them, so the idle reaper can tell what it reclaimed
+PROVIDER_RESOURCE_COMMANDS: Dict[str, List[str]] = {
+    "virtualbox": ["VBoxManage", "showvminfo", "{id}", "--machinereadable"],
+    "libvirt": ["virsh", "--connect", "qemu:///system", "dominfo", "{id}"],
+}
+PROVIDER_RESOURCE_RES: Dict[
+    str, Tuple["re.Pattern[str]", "re.Pattern[str]", int]
+] = {
+    # (memory pattern, cpus pattern, memory units per MB)
+    "virtualbox": (re.compile(r"^memory=(\d+)", re.MULTILINE),
+                   re.compile(r"^cpus=(\d+)", re.MULTILINE), 1),
+    "libvirt": (re.compile(r"^Max memory:\s+(\d+) KiB", re.MULTILINE),
+                re.compile(r"^CPU\(s\):\s+(\d+)", re.MULTILINE), 1024),
+}
+VBOX_SNAPSHOT_NAME_RE = re.compile(
+    r'^SnapshotName(?:-[\d-]+)?="(?P<name>[^"]*)"', re.MULTILINE
+)
+
+# Ways vagrant_reset can bring a machine back to a known state, and the
+# cleanliness levels each one reaches: "provisioned" (provisioners applied
+# again, other changes may survive), "clean" (disk and memory back at a
+# saved clean state) and "pristine" (rebuilt from the base box)
+RESET_STRATEGIES: Dict[str, Tuple[str, ...]] = {
+    "reprovision": ("provisioned",),
+    "snapshot": ("provisioned", "clean"),
+    "recreate": ("provisioned", "clean", "pristine"),
+}
+RESET_LEVELS = ("provisioned", "clean", "pristine")
+# Assumed seconds per strategy until a machine has been reset that way
+RESET_DEFAULT_ESTIMATES = {
+    "snapshot": 30.0, "reprovision": 180.0, "recreate": 600.0
+}
+# Weight of the newest sample in the smoothed operation durations
+DURATION_EWMA_ALPHA = 0.3
+
+# Snapshots made by the checkpoint tools are named <prefix><sequence>, so
+# a machine's checkpoint stack can be rebuilt from its snapshot list
+CHECKPOINT_PREFIX = "vmcp-checkpoint-"
+CHECKPOINT_NAME_RE = re.compile(re.escape(CHECKPOINT_PREFIX) + r"(\d+)$")
+# Checkpoints kept per machine; pushing beyond this deletes the oldest
+CHECKPOINT_MAX_DEPTH = int(
+    os.environ.get("VAGRANT_CHECKPOINT_MAX_DEPTH", "10")
+)
+
+# Commands whose stdout is not Vagrant's own and therefore cannot be run
+# with --machine-readable (`vagrant ssh -c` prints the guest's output, and
+# the ssh-config text is what we want from `vagrant ssh-config`)
+RAW_OUTPUT_COMMANDS = ("ssh", "ssh-config")
+
+# Seconds to wait after each of SIGINT and SIGTERM before escalating when a
+# command is cancelled. SIGINT first lets Vagrant run its own cleanup.
+TERMINATE_GRACE_SECONDS = float(
+    os.environ.get("VAGRANT_TERMINATE_GRACE_SECONDS", "3")
+)
+
+# Whether vagrant_ssh runs commands with the system ssh client using the
+# configuration from `vagrant ssh-config`, instead of `vagrant ssh -c`
+SSH_DIRECT = os.environ.get(
+    "VAGRANT_SSH_DIRECT", "1"
+) not in ("0", "false", "no")
+
+# Seconds after a failed ssh-config lookup or master connection during
+# which a machine's commands go straight to `vagrant ssh -c`, instead of
+# paying for another attempt before each of them. Lifecycle commands on
+# the project clear this early.
+SSH_RETRY_SECONDS = float(os.environ.get("VAGRANT_SSH_RETRY_SECONDS", "60"))
+
+# Default number of machines vagrant_ssh_multi runs a command on at once
+SSH_MULTI_CONCURRENCY = int(
+    os.environ.get("VAGRANT_SSH_MULTI_CONCURRENCY", "8")
+)
+
+# Seconds a shell session may stay idle before it is closed, and the
+# maximum number of sessions open at once
+SHELL_IDLE_TTL_SECONDS = float(
+    os.environ.get("VAGRANT_SHELL_IDLE_TTL_SECONDS", "900")
+)
+MAX_SHELL_SESSIONS = int(os.environ.get("VAGRANT_MAX_SHELL_SESSIONS", "16"))
+
+# Remote command starting a session's shell, which reads commands from stdin
+SHELL_COMMAND = "exec bash --login -s"
+
+# Remote command running a vagrant_ssh_batch script read from stdin
+BATCH_SHELL_COMMAND = "exec bash -s"
+
+# Seconds without tool activity after which the idle reaper suspends (or,
+# with VAGRANT_IDLE_ACTION=halt, halts) a running machine; 0 disables it.
+# Machines matching a VAGRANT_IDLE_ALLOWLIST pattern (machine name or
+# <directory>/<machine>) are never touched.
+IDLE_TIMEOUT_SECONDS = float(
+    os.environ.get("VAGRANT_IDLE_TIMEOUT_SECONDS", "0")
+)
+IDLE_ACTION = (
+    "halt" if os.environ.get("VAGRANT_IDLE_ACTION") == "halt" else "suspend"
+)
+IDLE_ALLOWLIST = [
+    pattern.strip()
+    for pattern in os.environ.get("VAGRANT_IDLE_ALLOWLIST", "").split(",")
+    if pattern.strip()
+]
+# Tool calls that do not count as activity on a machine
+TOOLS_WITHOUT_ACTIVITY = {
+    "vagrant_server_stats", "vagrant_list_projects", "vagrant_global_status",
+    "vagrant_job_status", "vagrant_job_output", "vagrant_job_cancel",
+    "vagrant_lease", "vagrant_release",
+}
+
+# Project directory (relative to VAGRANT_PROJECTS_DIR) whose machines make
+# up the warm pool handed out by vagrant_lease; empty disables the pool
+POOL_DIRECTORY = os.environ.get("VAGRANT_POOL_DIRECTORY", "")
+# Number of pool machines kept booted at their clean snapshot, and the
+# number prepared or restored at once
+POOL_SIZE = int(os.environ.get("VAGRANT_POOL_SIZE", "2"))
+POOL_REFILL_CONCURRENCY = int(
+    os.environ.get("VAGRANT_POOL_REFILL_CONCURRENCY", "2")
+)
+# Default lease duration; machines of expired leases go back to the pool
+POOL_LEASE_TTL_SECONDS = float(
+    os.environ.get("VAGRANT_POOL_LEASE_TTL_SECONDS", "3600")
+)
+# Default seconds vagrant_lease waits for a machine when none is ready
+POOL_LEASE_WAIT_SECONDS = 600.0
+# Snapshot holding the clean state of a pool machine
+POOL_SNAPSHOT = "vagrant-mcp-clean"
+# Seconds before a pool machine that could not be prepared is tried again,
+# doubled after each further failure up to POOL_RETRY_MAX_SECONDS
+POOL_RETRY_SECONDS = 30.0
+POOL_RETRY_MAX_SECONDS = 900.0
+
+# Seconds an idle ssh master connection is kept open for reuse
+SSH_CONTROL_PERSIST_SECONDS = int(
+    os.environ.get("VAGRANT_SSH_CONTROL_PERSIST_SECONDS", "600")
+)
+
+# Default wall-clock limit per tool in seconds. VAGRANT_TOOL_TIMEOUTS may hold
+# a JSON object overriding some of them, and calls can pass timeout_s.
+TOOL_TIMEOUTS: Dict[str, float] = {
+    "vagrant_status": 300,
+    "vagrant_global_status": 300,
+    "vagrant_up": 3600,
+    "vagrant_provision": 3600,
+    "vagrant_reload": 3600,
+    "vagrant_halt": 900,
+    "vagrant_destroy": 900,
+    "vagrant_snapshot": 1800,
+    "vagrant_ssh": 1800,
+    "vagrant_ssh_multi": 1800,
+    "vagrant_shell_open": 300,
+    "vagrant_shell_exec": 1800,
+    "vagrant_ssh_batch": 1800,
+    "vagrant_up_graph": 3600,
+    "vagrant_reset": 3600,
+    "vagrant_suspend": 900,
+    "vagrant_resume": 1800,
+}
+
+
+def parse_tool_timeouts(text: str) -> Dict[str, float]:
+    """
+    The per-tool limits of a VAGRANT_TOOL_TIMEOUTS value. Anything that is
+    not a JSON object of positive numbers is logged and left out, so a
+    typo cannot keep the server from starting.
+    """
+    try:
+        overrides = json.loads(text)
+    except ValueError as e:
+        logger.warning(f"Ignoring VAGRANT_TOOL_TIMEOUTS, not valid JSON: {e}")
+        return {}
+    if not isinstance(overrides, dict):
+        logger.warning("Ignoring VAGRANT_TOOL_TIMEOUTS, not a JSON object")
+        return {}
+    timeouts = {}
+    for tool, seconds in overrides.items():
+        if (isinstance(seconds, (int, float)) and not isinstance(seconds, bool)
+                and seconds > 0):
+            timeouts[tool] = float(seconds)
+        else:
+            logger.warning(
+                f"Ignoring VAGRANT_TOOL_TIMEOUTS entry {tool!r}: "
+                f"{seconds!r} is not a positive number of seconds"
+            )
+    return timeouts
+
+
+TOOL_TIMEOUTS.update(
+    parse_tool_timeouts(os.environ.get("VAGRANT_TOOL_TIMEOUTS", "{}"))
+)
+
+# Seconds without any output after which a command is considered hung
+# (0 disables the check). Vagrant prints progress regularly, but a boot
+# waiting on an unreachable guest or an ssh prompt prints nothing.
+STALL_TIMEOUT_SECONDS = float(
+    os.environ.get("VAGRANT_STALL_TIMEOUT_SECONDS", "600")
+)
+
+# Number of trailing output lines reported when a command is stopped by the
+# watchdog
+WATCHDOG_LAST_LINES = 20
+
+# Number of background jobs kept for vagrant_job_status after they finish
+RETAINED_JOBS = int(os.environ.get("VAGRANT_RETAINED_JOBS", "100"))
+
+# Tools that can be submitted as background jobs
+JOB_TOOLS = (
+    "vagrant_up", "vagrant_halt", "vagrant_destroy", "vagrant_provision",
+    "vagrant_reload", "vagrant_snapshot", "vagrant_up_graph",
+    "vagrant_suspend", "vagrant_resume",
+)
+
+# File in a project directory that vagrant_up_graph reads the machine
+# dependency graph from when none is passed
+UP_GRAPH_FILE = "vagrant-graph.json"
+
+# Default number of machines vagrant_up_graph brings up at once
+UP_GRAPH_CONCURRENCY = int(os.environ.get("VAGRANT_UP_GRAPH_CONCURRENCY", "4"))
+
+# Seconds a machine's health check may keep failing after `vagrant up`
+# before its dependents are given up on, and the pause between attempts
+HEALTH_CHECK_TIMEOUT_SECONDS = float(
+    os.environ.get("VAGRANT_HEALTH_CHECK_TIMEOUT_SECONDS", "600")
+)
+HEALTH_CHECK_INTERVAL_SECONDS = 2.0
+
+# What each lifecycle command does to a machine in a given state. A state
+# mapped to None means the command has nothing to do; states not listed get
+# the command's default action.
+LIFECYCLE_ACTIONS: Dict[str, Dict[str, Optional[str]]] = {
+    "up": {"running": None, "not_created": "create and boot",
+           "saved": "resume", "paused": "resume", "suspended": "resume"},
+    "halt": {"poweroff": None, "shutoff": None, "stopped": None,
+             "aborted": None, "crashed": None, "not_created": None,
+             "saved": "discard saved state"},
+    "destroy": {"not_created": None},
+    "reload": {"not_created": None, "running": "restart"},
+    "suspend": {"saved": None, "paused": None, "suspended": None,
+                "poweroff": None, "shutoff": None, "stopped": None,
+                "aborted": None, "crashed": None, "not_created": None},
+    "resume": {"running": None, "not_created": None},
+    "provision": {"not_created": "fail (not created)",
+                  **{state: "fail (not running)" for state in
+                     ("poweroff", "shutoff", "stopped", "aborted",
+                      "crashed", "saved")}},
+}
+LIFECYCLE_DEFAULT_ACTIONS = {
+    "up": "boot", "halt": "shut down", "destroy": "destroy",
+    "reload": "boot", "provision": "run provisioners",
+    "suspend": "save state and stop", "resume": "resume",
+}
+LIFECYCLE_TOOLS = (
+    "vagrant_up", "vagrant_halt", "vagrant_destroy", "vagrant_provision",
+    "vagrant_reload", "vagrant_suspend", "vagrant_resume",
+)
+# States of a suspended machine, and providers whose suspend keeps the
+# machine's memory so that resuming skips the boot
+SUSPENDED_STATES = ("saved", "paused", "suspended")
+SUSPEND_PROVIDERS = ("virtualbox", "libvirt")
+# Each lifecycle operation and its fast (suspend/resume) counterpart, for
+# comparing their recorded durations
+FAST_COUNTERPARTS = {
+    "up": "resume", "resume": "up", "halt": "suspend", "suspend": "halt"
+}
+STOPPED_STATES = ("poweroff", "shutoff", "stopped", "aborted", "crashed")
+
+# Oldest status cache entry, in seconds, that lifecycle commands are
+# planned on. The cache is not told about changes made outside the server
+# (a poweroff from inside the guest, a halt from a terminal, a crash), so
+# older entries are checked against the provider first.
+LIFECYCLE_STATE_MAX_AGE = 2.0
+
+# Commands (first two argv words) that never change machine state. Identical
+# concurrent invocations of these share one process.
+READ_ONLY_COMMANDS = {
+    ("status",), ("global-status",), ("ssh-config",), ("validate",),
+    ("version",), ("snapshot", "list"), ("box", "list"), ("plugin", "list"),
+}
+
+# Options of mutating commands that take a value, so the value is not
+# mistaken for a machine name when working out which machines are affected
+VALUE_OPTIONS = {"--provider", "--provision-with", "--name"}
+
+# Tools that report server state rather than running a command, and so take
+# no max_output_bytes argument
+TOOLS_WITHOUT_COMMAND_OUTPUT = {
+    "vagrant_server_stats", "vagrant_job_submit", "vagrant_job_status",
+    "vagrant_job_output", "vagrant_job_cancel", "vagrant_shell_open",
+    "vagrant_shell_close", "vagrant_list_projects", "vagrant_lease",
+    "vagrant_release",
+}
+
+# Input-schema properties that mean the same in every tool taking them,
+# see common_properties
+COMMON_PROPERTIES: Dict[str, Dict[str, Any]] = {
+    "directory": {
+        "type": "string",
+        "description": (
+            "Project directory containing the Vagrantfile, relative to "
+            "VAGRANT_PROJECTS_DIR (default: VAGRANT_PROJECTS_DIR)"
+        )
+    },
+    "provider": {
+        "type": "string",
+        "description": "Vagrant provider to use (e.g., virtualbox, vmware)"
+    },
+    "provision": {
+        "type": "boolean",
+        "description": "Whether to run provisioners",
+        "default": True
+    },
+    "session_id": {
+        "type": "string",
+        "description": "Session ID returned by vagrant_shell_open"
+    },
+    "job_id": {
+        "type": "string",
+        "description": "Job id returned by vagrant_job_submit"
+    },
+}
+
+# Number and total size of the UI messages kept per command by
+# MachineReadableParser; older messages are dropped first
+MAX_UI_MESSAGES = 5000
+MAX_UI_MESSAGE_BYTES = 256 * 1024
+# Longest machine-readable record MachineReadableParser keeps; the rest of
+# a longer line is dropped and replaced by an omission marker
+MAX_RECORD_BYTES = 64 * 1024
+
+# Vagrant's global machine index, the file `vagrant global-status` prints
+VAGRANT_HOME = os.environ.get(
+    "VAGRANT_HOME", os.path.expanduser("~/.vagrant.d")
+)
+MACHINE_INDEX_PATH = os.path.join(
+    VAGRANT_HOME, "data", "machine-index", "index"
+)
+
+# Directory for state the server keeps across restarts
+STATE_DIR = os.environ.get(
+    "VAGRANT_MCP_STATE_DIR",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "vagrant-mcp-server"
+    )
+)
+
+# Project discovery: how many directory levels below VAGRANT_PROJECTS_DIR
+# are searched for Vagrantfiles, and directory names never descended into
+PROJECT_SCAN_DEPTH = int(os.environ.get("VAGRANT_PROJECT_SCAN_DEPTH", "4"))
+PROJECT_SKIP_PATTERNS = tuple(
+    pattern.strip() for pattern in os.environ.get(
+        "VAGRANT_PROJECT_SKIP",
+        ".git,.hg,.svn,node_modules,.vagrant,.venv,venv,__pycache__"
+    ).split(",") if pattern.strip()
+)
+
+# The project index follows changes with inotify where available; otherwise
+# (or with VAGRANT_PROJECT_INOTIFY=0, e.g. for mounts that do not deliver
+# inotify events) it rescans every VAGRANT_PROJECT_POLL_SECONDS
+PROJECT_INOTIFY = os.environ.get(
+    "VAGRANT_PROJECT_INOTIFY", "1"
+) not in ("0", "false", "no")
+PROJECT_POLL_SECONDS = float(
+    os.environ.get("VAGRANT_PROJECT_POLL_SECONDS", "60")
+)
+
+# Threads scanning the directories of one tree level in parallel
+PROJECT_SCAN_THREADS = 8
+
+ProgressReporter = Callable[[str, str], Awaitable[None]]
+
+# Result of a tool call: the text view plus the structured content it was
+# rendered from
+ToolResult = Tuple[List[TextContent], Dict[str, Any]]
+
+
+def common_properties(*names: str) -> Dict[str, Dict[str, Any]]:
+    """Copies of the named COMMON_PROPERTIES, for a tool's input schema"""
+    return {name: dict(COMMON_PROPERTIES[name]) for name in names}
+
+
+def is_read_only_command(args: List[str]) -> bool:
+    """Whether a vagrant argv (without "vagrant") leaves machines untouched"""
+    return (
+        tuple(args[:1]) in READ_ONLY_COMMANDS
+        or tuple(args[:2]) in READ_ONLY_COMMANDS
+    )
+
+
+def command_targets(args: List[str]) -> Tuple[bool, Optional[FrozenSet[str]]]:
+    """
+    Work out whether a vagrant argv changes machine state, and for which
+    machines.
+
+    Returns (mutating, machines) where machines is None when the command
+    applies to every machine of the project (no machine name given).
+    Read-only commands and `vagrant ssh` are reported as non-mutating:
+    Vagrant does not take its machine lock for them.
+    """
+    if not args or is_read_only_command(args) or args[0] == "ssh":
+        return False, None
+
+    positional = []
+    skip_next = False
+    for arg in args[1:]:
+        if skip_next:
+            skip_next = False
+        elif arg in VALUE_OPTIONS:
+            skip_next = True
+        elif not arg.startswith("-"):
+            positional.append(arg)
+
+    if args[0] == "snapshot":
+        # snapshot <action> [vm-name] [name]: save, restore and delete take
+        # the snapshot name last, push and pop take only machine names
+        action, names = (
+            (positional[0], positional[1:]) if positional else ("", [])
+        )
+        if action in ("save", "restore", "delete"):
+            names = names[:-1]
+        positional = names
+    return True, frozenset(positional) or None
+
+
+def plan_lifecycle(
+    command: str, machines: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Planned action of a lifecycle command for each machine, given the
+    machines' current states. action is None for machines the command would
+    leave as they are, with the reason in skip_reason.
+    """
+    actions = LIFECYCLE_ACTIONS.get(command, {})
+    plan = []
+    for machine in machines:
+        state = machine.get("state") or "unknown"
+        action = actions.get(state, LIFECYCLE_DEFAULT_ACTIONS[command])
+        entry = {"machine": machine["name"], "state": state, "action": action}
+        if action is None:
+            if state == "not_created":
+                entry["skip_reason"] = "not created"
+            elif state in STOPPED_STATES:
+                entry["skip_reason"] = "already stopped"
+            else:
+                entry["skip_reason"] = f"already {state}"
+        plan.append(entry)
+    return plan
+
+
+def parse_up_graph(spec: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Normalise a machine dependency graph.
+
+    spec maps each machine to the machines it must wait for, either as a
+    list or as {"after": [...], "health": "<command>"}. Machines that are
+    only named as dependencies become nodes without dependencies. Returns
+    {machine: {"after": [...], "health": command or None}}.
+    """
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError(
+            "graph must be a non-empty object mapping machines to dependencies"
+        )
+    graph: Dict[str, Dict[str, Any]] = {}
+    for machine, node in spec.items():
+        if isinstance(node, list):
+            node = {"after": node}
+        if not isinstance(node, dict):
+            raise ValueError(
+                f"graph entry for '{machine}' must be a list or an object"
+            )
+        after = node.get("after") or []
+        health = node.get("health")
+        if not isinstance(after, list) or not all(
+                isinstance(dep, str) for dep in after):
+            raise ValueError(
+                f"'after' of '{machine}' must be a list of machine names"
+            )
+        if health is not None and not isinstance(health, str):
+            raise ValueError(
+                f"'health' of '{machine}' must be a command string"
+            )
+        if machine in after:
+            raise ValueError(f"'{machine}' cannot depend on itself")
+        graph[machine] = {
+            "after": list(dict.fromkeys(after)), "health": health
+        }
+    for node in list(graph.values()):
+        for dep in node["after"]:
+            graph.setdefault(dep, {"after": [], "health": None})
+    return graph
+
+
+def graph_levels(graph: Dict[str, Dict[str, Any]]) -> List[List[str]]:
+    """
+    Group the machines of a dependency graph into levels: each level only
+    depends on earlier ones. Raises ValueError if the graph has a cycle.
+    """
+    remaining = {
+        machine: set(node["after"]) for machine, node in graph.items()
+    }
+    levels = []
+    while remaining:
+        level = [machine for machine, deps in remaining.items() if not deps]
+        if not level:
+            raise ValueError(
+                "Dependency cycle between machines: "
+                + ", ".join(sorted(remaining))
+            )
+        levels.append(level)
+        for machine in level:
+            del remaining[machine]
+        for deps in remaining.values():
+            deps.difference_update(level)
+    return levels
+
+
+def critical_path(
+    graph: Dict[str, Dict[str, Any]], finished: Dict[str, float]
+) -> List[str]:
+    """
+    The chain of machines that determined the total time: starting from the
+    machine that finished last, repeatedly the dependency that finished last.
+    """
+    if not finished:
+        return []
+    machine = max(finished, key=finished.get)
+    path = [machine]
+    while True:
+        deps = [dep for dep in graph[machine]["after"] if dep in finished]
+        if not deps:
+            break
+        machine = max(deps, key=finished.get)
+        path.append(machine)
+    return path[::-1]
+
+
+def format_reset_options(options: List[Dict[str, Any]]) -> str:
+    """Render vagrant_reset's strategy ranking as a table"""
+    rows = [("STRATEGY", "REACHES", "EXPECTED", "RUNS", "FAILURES", "NOTE")]
+    for option in options:
+        rows.append((
+            option["strategy"], option["reaches"],
+            f"{option['expected_s']:.1f} s",
+            str(option["samples"]), str(option["failures"]),
+            option["excluded"]
+            or ("" if option["measured"] else "default estimate")
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "".join(
+        "  ".join(
+            cell.ljust(width) for cell, width in zip(row, widths)
+        ).rstrip() + "\n"
+        for row in rows
+    )
+
+
+def format_plan_table(plan: List[Dict[str, Any]]) -> str:
+    """Render a lifecycle plan as a MACHINE / STATE / ACTION table"""
+    rows = [("MACHINE", "STATE", "ACTION")] + [
+        (entry["machine"], entry["state"],
+         entry["action"] or f"none ({entry['skip_reason']})")
+        for entry in plan
+    ]
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+    return "".join(
+        f"{row[0].ljust(widths[0])}  {row[1].ljust(widths[1])}  {row[2]}\n"
+        for row in rows
+    )
+
+
+def clip_text(text: str, max_bytes: int) -> Tuple[str, bool]:
+    """
+    Limit text to roughly max_bytes of UTF-8, keeping a quarter of the budget
+    for the head and the rest for the tail. Returns the text and whether it
+    was clipped.
+    """
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text, False
+    head_bytes = max_bytes // 4
+    tail_bytes = max_bytes - head_bytes
+    head = data[:head_bytes].decode("utf-8", errors="ignore")
+    tail = data[len(data) - tail_bytes:].decode("utf-8", errors="ignore")
+    omitted = len(data) - head_bytes - tail_bytes
+    return f"{head}\n[... {omitted} bytes omitted ...]\n{tail}", True
+
+
+class MachineReadableParser:
+    """
+    Incremental parser for `vagrant --machine-readable` output.
+
+    Every line is a "timestamp,target,type,data..." record. Data fields use
+    %!(VAGRANT_COMMA) for commas and literal \\n / \\r for line breaks.
+    Chunks are split on newlines into memoryview slices and decoded in
+    place, so output is not copied again before it is parsed; only a line
+    spanning two chunks is buffered, up to MAX_RECORD_BYTES.
+
+    Records are folded into typed state as they arrive: per-target machine
+    data (provider, state), UI messages (bounded by MAX_UI_MESSAGES and
+    MAX_UI_MESSAGE_BYTES) and error-exit messages. A record longer than
+    MAX_RECORD_BYTES is cut short and its last field ends with a marker
+    saying how many bytes were omitted.
+    """
+
+    def __init__(self):
+        self._partial = bytearray()
+        self._partial_dropped = 0
+        self.machines: Dict[str, Dict[str, Any]] = {}
+        self.messages: deque = deque()
+        self.message_count = 0
+        self._message_bytes = 0
+        self.errors: List[str] = []
+        self.event_count = 0
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        """Parse a chunk of output and return the events it completed"""
+        events = []
+        view = memoryview(data)
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            if self._partial:
+                self._buffer_partial(view[start:end])
+                event = self._parse_buffered()
+            else:
+                event = self._parse_line(view[start:end])
+            if event is not None:
+                events.append(event)
+            start = end + 1
+        if start < len(data):
+            self._buffer_partial(view[start:])
+        return events
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Parse a final line that was not newline-terminated"""
+        if not self._partial:
+            return []
+        event = self._parse_buffered()
+        return [event] if event is not None else []
+
+    def _buffer_partial(self, chunk: memoryview) -> None:
+        """Buffer part of an unfinished line, up to MAX_RECORD_BYTES"""
+        room = max(0, MAX_RECORD_BYTES - len(self._partial))
+        self._partial += chunk[:room]
+        self._partial_dropped += max(0, len(chunk) - room)
+
+    def _parse_buffered(self) -> Optional[Dict[str, Any]]:
+        """Parse the buffered line and empty the buffer"""
+        line = memoryview(bytes(self._partial))
+        dropped = self._partial_dropped
+        self._partial = bytearray()
+        self._partial_dropped = 0
+        return self._parse_line(line, dropped)
+
+    @staticmethod
+    def _unescape(value: str) -> str:
+        """Undo Vagrant's machine-readable escaping of a data field"""
+        return (
+            value.replace("%!(VAGRANT_COMMA)", ",")
+            .replace("\\n", "\n")
+            .replace("\\r", "\r")
+        )
+
+    def _parse_line(
+        self, line: memoryview, dropped: int = 0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Parse one record and fold it into the parser state. dropped is the
+        number of bytes of the line already cut off while buffering it.
+        """
+        if len(line) > MAX_RECORD_BYTES:
+            dropped += len(line) - MAX_RECORD_BYTES
+            line = line[:MAX_RECORD_BYTES]
+        text = str(line, "utf-8", "replace").rstrip("\r")
+        if not text:
+            return None
+
+        fields = text.split(",")
+        if len(fields) < 3 or not fields[0].isdigit():
+            # Not a record, e.g. a warning printed by a plugin
+            event = {
+                "timestamp": None, "target": "", "type": "raw", "data": [text]
+            }
+        else:
+            event = {
+                "timestamp": int(fields[0]),
+                "target": fields[1],
+                "type": fields[2],
+                "data": [self._unescape(field) for field in fields[3:]]
+            }
+        if dropped and event["data"]:
+            event["data"][-1] += f"\n[... {dropped} bytes omitted ...]"
+
+        self.event_count += 1
+        self._apply(event)
+        return event
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        """Update machine, message and error state from an event"""
+        event_type, target = event["type"], event["target"]
+        data = event["data"]
+
+        if event_type == "raw":
+            self._add_message(target, "info", data[0])
+        elif event_type == "ui":
+            level = data[0] if data else "info"
+            self._add_message(target, level, data[1] if len(data) > 1 else "")
+        elif event_type == "error-exit":
+            self.errors.append(data[-1] if data else "")
+        elif target and event_type in ("metadata", "provider-name", "state",
+                                       "state-human-short",
+                                       "state-human-long"):
+            machine = self.machines.setdefault(target, {"name": target})
+            if (event_type == "metadata" and len(data) > 1
+                    and data[0] == "provider"):
+                machine["provider"] = data[1]
+            elif event_type == "provider-name" and data:
+                machine["provider"] = data[0]
+            elif event_type == "state" and data:
+                machine["state"] = data[0]
+            elif event_type == "state-human-short" and data:
+                machine["state_human"] = data[0]
+            elif event_type == "state-human-long" and data:
+                machine["description"] = data[0]
+
+    def _add_message(self, target: str, level: str, message: str) -> None:
+        """Record a UI message, dropping the oldest ones over the limits"""
+        self.messages.append(
+            {"target": target, "level": level, "message": message}
+        )
+        self.message_count += 1
+        self._message_bytes += len(message.encode("utf-8", "replace"))
+        while len(self.messages) > 1 and (
+            len(self.messages) > MAX_UI_MESSAGES
+            or self._message_bytes > MAX_UI_MESSAGE_BYTES
+        ):
+            oldest = self.messages.popleft()
+            self._message_bytes -= len(
+                oldest["message"].encode("utf-8", "replace")
+            )
+
+    def text(self) -> str:
+        """Human-readable view of the UI messages"""
+        lines = [m["message"] for m in self.messages]
+        dropped = self.message_count - len(self.messages)
+        if dropped > 0:
+            lines.insert(0, f"[... {dropped} earlier messages omitted ...]")
+        return "\n".join(lines)
+
+    def machine_list(self) -> List[Dict[str, Any]]:
+        """Machines reported by the command, in output order"""
+        return [m for m in self.machines.values() if "state" in m]
+
+
+class Job:
+    """A tool call running in the background, see vagrant_job_submit"""
+
+    def __init__(self, tool: str, arguments: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.tool = tool
+        self.arguments = arguments
+        self.state = "running"
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.runs: List["RunOutput"] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    def describe(self) -> Dict[str, Any]:
+        """Summary of the job for status responses"""
+        end = self.finished_at or time.time()
+        info: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "tool": self.tool,
+            "arguments": self.arguments,
+            "state": self.state,
+            "submitted_at": self.submitted_at,
+            "duration_s": round(end - self.submitted_at, 3),
+            "runs": [
+                {"run_id": run.run_id, "command": run.command,
+                 "stdout_bytes": run.stdout.size,
+                 "stderr_bytes": run.stderr.size}
+                for run in self.runs
+            ]
+        }
+        if self.result is not None:
+            info["return_code"] = self.result.get("return_code")
+            info["success"] = self.result.get("success")
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+# The job whose task is running the current code, used to attach the
+# commands it spawns to it
+CURRENT_JOB: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar(
+    "current_job", default=None
+)
+
+
+# Wall-clock and inactivity limits (seconds, None for no limit) for the
+# commands run by the current tool call, set in _dispatch_tool
+CALL_LIMITS: contextvars.ContextVar[
+    Tuple[Optional[float], Optional[float]]
+] = contextvars.ContextVar("call_limits", default=(None, None))
+
+
+class OutputCapture:
+    """
+    Bounded-memory capture of one output stream of a vagrant command.
+
+    Output is buffered in memory until it exceeds SPOOL_THRESHOLD_BYTES, at
+    which point everything is moved to an anonymous temporary file and only
+    a ring buffer with the last TAIL_BUFFER_BYTES stays in memory. Byte
+    ranges are served from the buffer or, once spooled, through mmap so
+    reading a range never loads the whole log.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.last_write = time.monotonic()
+        self._buffer: Optional[bytearray] = bytearray()
+        self._tail = bytearray()
+        self._spool = None
+
+    @property
+    def spooled(self) -> bool:
+        """Whether the output has been spilled to disk"""
+        return self._spool is not None
+
+    def write(self, data: bytes) -> None:
+        """Append a chunk of output"""
+        if not data:
+            return
+        self.size += len(data)
+        self.last_write = time.monotonic()
+
+        if self._spool is None:
+            self._buffer.extend(data)
+            if len(self._buffer) > SPOOL_THRESHOLD_BYTES:
+                self._spill()
+            return
+
+        self._spool.write(data)
+        self._tail.extend(data)
+        overflow = len(self._tail) - TAIL_BUFFER_BYTES
+        if overflow > 0:
+            del self._tail[:overflow]
+
+    def _spill(self) -> None:
+        """Move the in-memory buffer to a spool file"""
+        self._spool = tempfile.TemporaryFile(prefix="vagrant-mcp-")
+        self._spool.write(self._buffer)
+        self._tail = bytearray(self._buffer[-TAIL_BUFFER_BYTES:])
+        self._buffer = None
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Return up to length bytes starting at offset"""
+        offset = max(0, offset)
+        end = min(self.size, offset + max(0, length))
+        if offset >= end:
+            return b""
+
+        if self._spool is None:
+            return bytes(self._buffer[offset:end])
+
+        # Serve from the ring buffer when the range lies inside it
+        tail_start = self.size - len(self._tail)
+        if offset >= tail_start:
+            return bytes(self._tail[offset - tail_start:end - tail_start])
+
+        self._spool.flush()
+        with mmap.mmap(
+            self._spool.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+            return mapped[offset:end]
+
+    def excerpt(self, max_bytes: int) -> Tuple[str, bool]:
+        """
+        Return a head/tail excerpt of at most max_bytes and whether it was
+        truncated. A quarter of the budget goes to the head since the end of
+        a vagrant log is usually where the interesting part is.
+        """
+        if self.size <= max_bytes:
+            text = self.read(0, self.size).decode("utf-8", errors="replace")
+            return text, False
+
+        head_bytes = max_bytes // 4
+        tail_bytes = max_bytes - head_bytes
+        head = self.read(0, head_bytes).decode("utf-8", errors="replace")
+        tail = self.read(self.size - tail_bytes, tail_bytes).decode(
+            "utf-8", errors="replace"
+        )
+        omitted = self.size - head_bytes - tail_bytes
+        return f"{head}\n[... {omitted} bytes omitted ...]\n{tail}", True
+
+    def close(self) -> None:
+        """Release the buffer and delete the spool file"""
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        self._buffer = bytearray()
+        self._tail = bytearray()
+
+
+class RunOutput:
+    """Captured stdout/stderr of one vagrant command, addressable by run id"""
+
+    STREAMS = ("stdout", "stderr")
+
+    def __init__(self, command: str):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.command = command
+        self.started_at = time.time()
+        self.stdout = OutputCapture()
+        self.stderr = OutputCapture()
+        self.finished_at: Optional[float] = None
+        self.return_code: Optional[int] = None
+        self.parser: Optional["MachineReadableParser"] = None
+        # "timed_out" or "stalled" when the watchdog stopped the command
+        self.termination: Optional[str] = None
+
+    def capture(self, stream_name: str) -> OutputCapture:
+        """Return the capture for stdout or stderr"""
+        if stream_name not in self.STREAMS:
+            raise ValueError(f"Unknown stream: {stream_name}")
+        return getattr(self, stream_name)
+
+    def uri(self, stream_name: str) -> str:
+        """Resource URI serving the given stream"""
+        return f"vagrant-run://{self.run_id}/{stream_name}"
+
+    def last_lines(self, count: int) -> List[str]:
+        """The last count lines of output, as messages when parsed"""
+        if self.parser is not None:
+            return [m["message"] for m in list(self.parser.messages)[-count:]]
+        tail = self.stdout.read(max(0, self.stdout.size - 8192), 8192)
+        return tail.decode("utf-8", errors="replace").splitlines()[-count:]
+
+    def close(self) -> None:
+        """Release both captures"""
+        self.stdout.close()
+        self.stderr.close()
+
+
+def read_machine_dirs(cwd: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Read the per-machine data Vagrant keeps in <cwd>/.vagrant/machines.
+
+    Each machine lives in .vagrant/machines/<name>/<provider>/ and has an
+    "id" file only while it is created. Returns one dict per machine with
+    name, provider, id, index_uuid and provisioned, or None when the layout
+    is missing or not what we expect (in which case the caller should fall
+    back to `vagrant status`).
+    """
+    machines_dir = os.path.join(cwd, ".vagrant", "machines")
+    machines = []
+    try:
+        with os.scandir(machines_dir) as machine_entries:
+            for machine_entry in machine_entries:
+                if not machine_entry.is_dir():
+                    continue
+                with os.scandir(machine_entry.path) as provider_entries:
+                    providers = [p for p in provider_entries if p.is_dir()]
+                if len(providers) != 1:
+                    # Zero or several providers: let Vagrant sort it out
+                    return None
+                provider_dir = providers[0].path
+
+                def read(filename: str) -> Optional[str]:
+                    try:
+                        with open(os.path.join(provider_dir, filename)) as f:
+                            return f.read().strip()
+                    except FileNotFoundError:
+                        return None
+
+                machines.append({
+                    "name": machine_entry.name,
+                    "provider": providers[0].name,
+                    "id": read("id") or None,
+                    "index_uuid": read("index_uuid"),
+                    "provisioned": read("action_provision") is not None
+                })
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None
+
+    return sorted(machines, key=lambda m: m["name"]) or None
+
+
+def format_status_table(machines: List[Dict[str, Any]]) -> str:
+    """Render machine states the way `vagrant status` prints them"""
+    lines = ["Current machine states:", ""]
+    for machine in machines:
+        state = machine["state"].replace("_", " ")
+        lines.append(f"{machine['name']:<25} {state} ({machine['provider']})")
+    return "\n".join(lines) + "\n"
+
+
+class MachineIndexReader:
+    """
+    Reader for Vagrant's machine index
+    ($VAGRANT_HOME/data/machine-index/index).
+
+    The index is a JSON document that Vagrant rewrites whenever a machine
+    changes state, so the parsed entries are cached and only re-read when
+    the file's inode, mtime or size change.
+    """
+
+    FIELDS = ("name", "provider", "state", "vagrantfile_path", "updated_at")
+
+    def __init__(self, path: str = MACHINE_INDEX_PATH):
+        self.path = path
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._entries: List[Dict[str, Any]] = []
+
+    def read(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Return the index entries and whether they came from the cache.
+
+        Raises OSError or ValueError when the index is missing or malformed.
+        """
+        st = os.stat(self.path)
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return self._entries, True
+
+        with open(self.path) as f:
+            data = json.load(f)
+        machines = data.get("machines")
+        if not isinstance(machines, dict):
+            raise ValueError(f"Unexpected machine index format in {self.path}")
+
+        entries = []
+        for machine_id, machine in machines.items():
+            entry = {"id": machine_id}
+            entry.update({field: machine.get(field) for field in self.FIELDS})
+            entries.append(entry)
+        entries.sort(
+            key=lambda e: (e["vagrantfile_path"] or "", e["name"] or "")
+        )
+
+        self._entries = entries
+        self._signature = signature
+        return entries, False
+
+
+def format_global_status(entries: List[Dict[str, Any]]) -> str:
+    """Render index entries the way `vagrant global-status` prints them"""
+    rows = [("id", "name", "provider", "state", "directory")]
+    for entry in entries:
+        rows.append((
+            entry["id"][:7],
+            entry["name"] or "",
+            entry["provider"] or "",
+            entry["state"] or "",
+            entry["vagrantfile_path"] or ""
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(4)]
+    lines = []
+    for row in rows:
+        lines.append(
+            " ".join(value.ljust(width) for value, width in zip(row, widths))
+            + " "
+            + row[4]
+        )
+    lines.insert(1, "-" * max(len(line) for line in lines))
+    if len(rows) == 1:
+        lines.append(
+            "There are no active Vagrant environments on this computer!"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def parse_ssh_config_hosts(text: str) -> Dict[str, str]:
+    """
+    Split `vagrant ssh-config` output into one config block per Host alias,
+    in the order they appear.
+    """
+    hosts: Dict[str, str] = {}
+    host = None
+    for line in text.splitlines(keepends=True):
+        parts = line.strip().split(None, 1)
+        if len(parts) == 2 and parts[0].lower() == "host":
+            host = parts[1].strip()
+            hosts[host] = ""
+        if host is not None:
+            hosts[host] += line
+    return hosts
+
+
+def parse_snapshot_list(
+    parser: MachineReadableParser, machine: str
+) -> List[str]:
+    """
+    Snapshot names from `vagrant snapshot list --machine-readable` output.
+
+    Vagrant prints each name as a detail message of the machine, after an
+    output message holding only the "==> <machine>:" prefix. Without
+    snapshots that output message says so and is followed by a detail
+    message explaining snapshots, which is not a name.
+    """
+    names = []
+    for message in parser.messages:
+        if message["target"] != machine:
+            continue
+        text = message["message"]
+        if message["level"] == "output":
+            if re.sub(r"^==> [^:]*:", "", text).strip():
+                return []
+        elif message["level"] == "detail" and text.strip():
+            names.append(text.strip())
+    return names
+
+
+def format_ssh_multi_table(
+    groups: List[Dict[str, Any]], width: int = 60
+) -> str:
+    """Render grouped vagrant_ssh_multi results as an aligned text table"""
+    rows = [("EXIT", "MACHINES", "OUTPUT")]
+    for group in groups:
+        text = group["stdout"] if group["stdout"].strip() else group["stderr"]
+        lines = text.strip().splitlines()
+        summary = lines[0] if lines else ""
+        if len(summary) > width:
+            summary = summary[:width - 3] + "..."
+        if len(lines) > 1:
+            summary += f" (+{len(lines) - 1} lines)"
+        rows.append(
+            (str(group["return_code"]), ", ".join(group["machines"]), summary)
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+    return "".join(
+        f"{row[0].ljust(widths[0])}  {row[1].ljust(widths[1])}  "
+        f"{row[2]}".rstrip() + "\n"
+        for row in rows
+    )
+
+
+class SshTarget:
+    """
+    Direct OpenSSH access to one machine, from its `vagrant ssh-config`.
+
+    The configuration is written to a file in the server's private runtime
+    directory. Commands share one master connection per machine through a
+    ControlPath socket, so only the first command pays for the handshake.
+    """
+
+    def __init__(self, runtime_dir: str, config_text: str, host: str):
+        self.host = host
+        fd, self.config_path = tempfile.mkstemp(
+            prefix="ssh-", suffix=".config", dir=runtime_dir
+        )
+        with os.fdopen(fd, "w") as f:
+            f.write(config_text)
+        # %C is a hash of the connection parameters, which keeps the socket
+        # path short enough for AF_UNIX
+        self.control_path = os.path.join(runtime_dir, "cm-%C")
+        # Held while the master connection is checked or started
+        self.lock = asyncio.Lock()
+
+    def ssh_args(self, *extra: str) -> List[str]:
+        """ssh argv using this target's config and control socket"""
+        return [
+            "ssh", "-F", self.config_path,
+            "-o", f"ControlPath={self.control_path}",
+            "-o", "BatchMode=yes",
+            *extra
+        ]
+
+    def command(self, remote_command: str) -> List[str]:
+        """ssh argv running remote_command over the master connection"""
+        return self.ssh_args(
+            "-o", "ControlMaster=no", "-T", self.host, remote_command
+        )
+
+    def remove(self) -> None:
+        """Delete the config file"""
+        try:
+            os.unlink(self.config_path)
+        except FileNotFoundError:
+            pass
+
+
+class ShellSession:
+    """
+    A long-lived shell on a guest, fed commands over stdin.
+
+    Commands are eval'd by the shell itself, so the working directory,
+    exported variables and activated virtualenvs carry over from one
+    command to the next. Each command's output is terminated by a sentinel
+    unique to that command, printed on both streams, with the exit status
+    after it on stdout.
+    """
+
+    def __init__(
+        self,
+        machine: Optional[str],
+        cwd: str,
+        process: asyncio.subprocess.Process,
+        transport: str,
+        ttl: float
+    ):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.machine = machine
+        self.cwd = cwd
+        self.process = process
+        self.readers = (
+            SentinelReader(process.stdout), SentinelReader(process.stderr)
+        )
+        self.transport = transport
+        self.ttl = ttl
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.commands = 0
+        self.closed = False
+        # Held while a command runs; commands of one session never overlap
+        self.lock = asyncio.Lock()
+
+    def script(self, command: str, sentinel: str) -> bytes:
+        """Shell input running command and printing the sentinel after it"""
+        # stdin of the command is /dev/null so it cannot consume the input
+        # meant for the shell. The newline before the sentinel is ours.
+        return (
+            f"eval {shlex.quote(command)} < /dev/null\n"
+            f"__vmcp_rc=$?; printf '\\n{sentinel}:%d\\n' \"$__vmcp_rc\"; "
+            f"printf '\\n{sentinel}\\n' >&2\n"
+        ).encode()
+
+    def idle_seconds(self) -> float:
+        """Seconds since the last command finished"""
+        return time.monotonic() - self.last_used
+
+    def describe(self) -> Dict[str, Any]:
+        """Session summary for tool results"""
+        return {
+            "session_id": self.session_id,
+            "machine": self.machine,
+            "transport": self.transport,
+            "commands": self.commands,
+            "idle_s": round(self.idle_seconds(), 1),
+            "ttl_s": self.ttl,
+            "closed": self.closed
+        }
+
+
+class PoolMember:
+    """
+    A machine of the warm pool.
+
+    state is one of cold (not prepared yet), warming (being brought to the
+    clean snapshot), ready, leased, restoring (being reset after a lease)
+    and failed. A failed member goes back to cold at retry_at.
+    """
+
+    def __init__(self, machine: str):
+        self.machine = machine
+        self.state = "cold"
+        self.lease_id: Optional[str] = None
+        self.leased_at: Optional[float] = None
+        self.expires_at: Optional[float] = None
+        self.ready_since = 0.0
+        self.error: Optional[str] = None
+        # Failures since the member was last ready, and when a failed
+        # member is tried again (time.monotonic())
+        self.failures = 0
+        self.retry_at: Optional[float] = None
+
+    def describe(self) -> Dict[str, Any]:
+        """Member summary for tool results"""
+        info = {"machine": self.machine, "state": self.state}
+        if self.lease_id:
+            info["lease_id"] = self.lease_id
+            info["expires_in_s"] = round(self.expires_at - time.time(), 1)
+        if self.error:
+            info["error"] = self.error
+        if self.state == "failed" and self.retry_at is not None:
+            info["retry_in_s"] = round(
+                max(0.0, self.retry_at - time.monotonic()), 1
+            )
+        return info
+
+
+class SentinelReader:
+    """
+    Splits a guest shell's output stream at sentinel lines.
+
+    Bytes read past a sentinel line belong to the next command and are kept
+    for the next call. While searching, only len(marker) bytes are held
+    back, so memory stays bounded however much a command prints.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+        self.pending = b""
+
+    async def _read(self) -> bytes:
+        chunk = await self.reader.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            raise EOFError
+        return chunk
+
+    async def copy_until(
+        self, capture: "OutputCapture", marker: bytes
+    ) -> bytes:
+        """
+        Copy the stream into capture up to marker, which is not copied, and
+        return the rest of the marker's line. Raises EOFError if the stream
+        ends before the marker.
+        """
+        while True:
+            index = self.pending.find(marker)
+            if index >= 0:
+                capture.write(self.pending[:index])
+                self.pending = self.pending[index + len(marker):]
+                while b"\n" not in self.pending:
+                    self.pending += await self._read()
+                line, self.pending = self.pending.split(b"\n", 1)
+                return line
+            keep = len(marker) - 1
+            if len(self.pending) > keep:
+                capture.write(self.pending[:len(self.pending) - keep])
+                self.pending = self.pending[len(self.pending) - keep:]
+            try:
+                self.pending += await self._read()
+            except EOFError:
+                capture.write(self.pending)
+                self.pending = b""
+                raise
+
+
+def build_batch_script(
+    commands: Sequence[str], sentinel: str, stop_on_failure: bool
+) -> bytes:
+    """
+    Generate the vagrant_ssh_batch script.
+
+    Output starts after a "<sentinel>:start:" line on both streams, which
+    skips anything the login prints. Command i is followed by
+    "<sentinel>:i:<rc>:<start_us>:<end_us>" on stdout and "<sentinel>:i:"
+    on stderr, each on a line of its own. Timestamps are taken on the guest
+    in microseconds; EPOCHREALTIME (bash 5) avoids forking `date`.
+    """
+    lines = [
+        '__vmcp_now() { if [ -n "${EPOCHREALTIME:-}" ]; then '
+        '__vmcp_t="${EPOCHREALTIME/[.,]/}"; '
+        'else __vmcp_t=$(date +%s%6N); fi; }',
+        f"printf '\\n{sentinel}:start:\\n'; "
+        f"printf '\\n{sentinel}:start:\\n' >&2",
+    ]
+    for index, command in enumerate(commands):
+        lines += [
+            "__vmcp_now; __vmcp_t0=$__vmcp_t",
+            f"eval {shlex.quote(command)} < /dev/null",
+            "__vmcp_rc=$?; __vmcp_now",
+            f"printf '\\n{sentinel}:{index}:%d:%s:%s\\n' "
+            '"$__vmcp_rc" "$__vmcp_t0" "$__vmcp_t"',
+            f"printf '\\n{sentinel}:{index}:\\n' >&2",
+        ]
+        if stop_on_failure:
+            lines.append('[ "$__vmcp_rc" -eq 0 ] || exit "$__vmcp_rc"')
+    return ("\n".join(lines) + "\n").encode()
+
+
+class MachineScheduler:
+    """
+    Orders mutating vagrant commands per project and machine.
+
+    Each command claims a set of machines (or the whole project). Claims
+    are queued first-come first-served per project; a claim starts as soon
+    as no earlier claim in the queue overlaps it, so commands on the same
+    machine run one after another while commands on different machines run
+    in parallel. Read-only commands never claim anything.
+    """
+
+    class _Claim:
+        """A queued or running command's claim on machines"""
+
+        def __init__(self, machines: Optional[FrozenSet[str]]):
+            self.machines = machines
+            self.started = asyncio.Event()
+
+        def overlaps(self, other: "MachineScheduler._Claim") -> bool:
+            """Whether two claims touch a common machine"""
+            if self.machines is None or other.machines is None:
+                return True
+            return bool(self.machines & other.machines)
+
+    def __init__(self):
+        self._queues: Dict[str, List["MachineScheduler._Claim"]] = {}
+
+    @contextlib.asynccontextmanager
+    async def hold(
+        self, cwd: str, machines: Optional[FrozenSet[str]]
+    ) -> AsyncIterator[float]:
+        """Wait for the machines to be free; yields the wait in seconds"""
+        claim = self._Claim(machines)
+        queue = self._queues.setdefault(cwd, [])
+        queue.append(claim)
+        waited_from = time.monotonic()
+        try:
+            self._start_ready(cwd)
+            await claim.started.wait()
+            yield time.monotonic() - waited_from
+        finally:
+            queue.remove(claim)
+            if not queue:
+                del self._queues[cwd]
+            else:
+                self._start_ready(cwd)
+
+    def _start_ready(self, cwd: str) -> None:
+        """Start every queued claim that overlaps no claim ahead of it"""
+        queue = self._queues.get(cwd, [])
+        for index, claim in enumerate(queue):
+            if claim.started.is_set():
+                continue
+            if not any(claim.overlaps(ahead) for ahead in queue[:index]):
+                claim.started.set()
+
+    def busy(self, cwd: str, machines: Optional[FrozenSet[str]]) -> bool:
+        """Whether a running or queued command touches any of the machines"""
+        probe = self._Claim(machines)
+        return any(
+            claim.overlaps(probe) for claim in self._queues.get(cwd, [])
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Running and queued claim counts per project"""
+        return {
+            cwd: {
+                "running": sum(1 for c in queue if c.started.is_set()),
+                "queued": sum(1 for c in queue if not c.started.is_set())
+            }
+            for cwd, queue in self._queues.items()
+        }
+
+
+def vagrantfile_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Inode, size and mtime of the project's Vagrantfile, or None if it is
+    missing
+    """
+    try:
+        st = os.stat(os.path.join(path, "Vagrantfile"))
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def file_signature(path: str) -> Optional[List[int]]:
+    """mtime and size of a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+# Strings in a Vagrantfile that name other files it reads: require_relative
+# targets and quoted paths with a config-like extension (YAML.load_file,
+# File.read, load, ...)
+VAGRANTFILE_REQUIRE_RE = re.compile(
+    r"""require_relative\s*\(?\s*["']([^"'\n]+)["']"""
+)
+VAGRANTFILE_PATH_RE = re.compile(
+    r"""["']([^"'\n]+\.(?:rb|ya?ml|json|env|toml|ini|properties))["']"""
+)
+VAGRANTFILE_PRIMARY_RE = re.compile(
+    r"""\.define\s*\(?\s*[:"']([\w.-]+)["']?\s*,[^\n]*\bprimary:\s*true"""
+)
+
+
+def vagrantfile_dependencies(project: str, text: str) -> List[str]:
+    """
+    Paths of the files a Vagrantfile appears to load, relative paths
+    resolved against the project
+    """
+    paths = [
+        name if name.endswith(".rb") else name + ".rb"
+        for name in VAGRANTFILE_REQUIRE_RE.findall(text)
+    ]
+    paths += VAGRANTFILE_PATH_RE.findall(text)
+    return sorted(
+        {os.path.normpath(os.path.join(project, path)) for path in paths}
+    )
+
+
+class VagrantfileCache:
+    """
+    What evaluating each project's Vagrantfile produced: machine names in
+    definition order, their providers and the default machine.
+
+    Records are taken from successful `vagrant status` runs and keyed on the
+    SHA-256 of the Vagrantfile plus the mtime and size of the files it loads
+    (see vagrantfile_dependencies). A record is only used while all of
+    those still match, so machine names can be checked without starting
+    Vagrant. The Vagrantfile's stat is kept too, so an untouched file is
+    not hashed again. Records are saved to STATE_DIR and survive restarts.
+    Machines defined from environment variables or other inputs that are
+    not files are not tracked.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self._records = data.get("projects", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def lookup(self, project: str) -> Optional[Dict[str, Any]]:
+        """Return the record for a project if it still matches its files"""
+        record = self._records.get(project)
+        if record is None:
+            return None
+        vagrantfile = os.path.join(project, "Vagrantfile")
+        signature = file_signature(vagrantfile)
+        if signature is None:
+            return None
+        if signature != record["signature"]:
+            try:
+                with open(vagrantfile, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                return None
+            if digest != record["sha256"]:
+                return None
+            record["signature"] = signature
+            self._save()
+        for dependency, dependency_signature in record["deps"].items():
+            if file_signature(dependency) != dependency_signature:
+                return None
+        return record
+
+    def store(
+        self,
+        project: str,
+        machines: List[Dict[str, Any]],
+        expected_signature: Optional[List[int]] = None
+    ) -> None:
+        """
+        Record the machines a status run reported. Nothing is stored when
+        the Vagrantfile no longer has expected_signature, i.e. it changed
+        while Vagrant was reading it.
+        """
+        vagrantfile = os.path.join(project, "Vagrantfile")
+        signature = file_signature(vagrantfile)
+        if signature is None or (
+            expected_signature and signature != expected_signature
+        ):
+            return
+        try:
+            with open(vagrantfile, "rb") as f:
+                content = f.read()
+        except OSError:
+            return
+        text = content.decode("utf-8", errors="replace")
+        names = [m["name"] for m in machines]
+        primary = VAGRANTFILE_PRIMARY_RE.search(text)
+        if primary and primary.group(1) in names:
+            default_machine = primary.group(1)
+        else:
+            default_machine = names[0] if len(names) == 1 else None
+
+        record = {
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "signature": signature,
+            "deps": {
+                path: file_signature(path)
+                for path in vagrantfile_dependencies(project, text)
+            },
+            "machines": names,
+            "providers": {m["name"]: m.get("provider") for m in machines},
+            "default_machine": default_machine
+        }
+        if self._records.get(project) != record:
+            self._records[project] = record
+            self._save()
+
+    def _save(self) -> None:
+        """Write all records atomically; failures only cost the persistence"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.path), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(
+                    {"version": self.VERSION, "projects": self._records}, f
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save {self.path}: {e}")
+
+
+class DurationHistory:
+    """
+    Smoothed durations of machine operations per project and machine.
+
+    Each successful run updates an exponentially weighted moving average
+    (weight DURATION_EWMA_ALPHA for the newest sample), so estimates follow
+    changes on the host without being thrown off by one slow run. Failures
+    are counted separately. The history is saved to STATE_DIR.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self._records = data.get("operations", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @staticmethod
+    def _key(project: str, machine: str, operation: str) -> str:
+        return f"{project}\0{machine}\0{operation}"
+
+    def get(
+        self, project: str, machine: str, operation: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        The record of an operation: seconds (EWMA), samples, failures and
+        last_s
+        """
+        return self._records.get(self._key(project, machine, operation))
+
+    def record(
+        self,
+        project: str,
+        machine: str,
+        operation: str,
+        seconds: float,
+        success: bool
+    ) -> None:
+        """Add the outcome of one run and save the history"""
+        record = self._records.setdefault(
+            self._key(project, machine, operation),
+            {"seconds": None, "samples": 0, "failures": 0, "last_s": None}
+        )
+        if success:
+            previous = record["seconds"]
+            record["seconds"] = round(
+                seconds if previous is None else
+                previous + DURATION_EWMA_ALPHA * (seconds - previous), 3
+            )
+            record["samples"] += 1
+            record["last_s"] = round(seconds, 3)
+        else:
+            record["failures"] += 1
+        self._save()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per operation: samples, failures and mean smoothed seconds"""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for key, record in self._records.items():
+            total = totals.setdefault(
+                key.rsplit("\0", 1)[1],
+                {"samples": 0, "failures": 0, "estimates": []}
+            )
+            total["samples"] += record["samples"]
+            total["failures"] += record["failures"]
+            if record["seconds"] is not None:
+                total["estimates"].append(record["seconds"])
+        return {
+            operation: {
+                "samples": total["samples"],
+                "failures": total["failures"],
+                "mean_s": round(
+                    sum(total["estimates"]) / len(total["estimates"]), 1
+                ) if total["estimates"] else None
+            }
+            for operation, total in sorted(totals.items())
+        }
+
+    def _save(self) -> None:
+        """Write all records atomically; failures only cost the persistence"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.path), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(
+                    {"version": self.VERSION, "operations": self._records}, f
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save {self.path}: {e}")
+
+
+class ProjectContext:
+    """
+    Cached facts about one Vagrant project directory.
+
+    Holds the resolved path, the Vagrantfile signature seen when the project
+    was last validated and the cached status result. Requests for a known
+    project reuse the context instead of probing the filesystem; it is
+    revalidated when a command fails.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.vagrantfile: Optional[Tuple[int, int, int]] = None
+        self._status: Optional[Tuple[float, Dict[str, Any]]] = None
+        # Size the cached result's output excerpts were cut to, None when
+        # it holds the whole output
+        self._status_excerpt: Optional[int] = None
+        # Machine names and states of the last status result, kept after
+        # the cached result itself expires
+        self.last_machines: Optional[List[Dict[str, Any]]] = None
+        self.last_status_at: Optional[float] = None
+        self.validate()
+
+    def validate(self) -> bool:
+        """Stat the Vagrantfile again and return whether it exists"""
+        self.vagrantfile = vagrantfile_signature(self.path)
+        return self.vagrantfile is not None
+
+    def cached_status(
+        self, max_output_bytes: Optional[int] = None
+    ) -> Optional[Tuple[Dict[str, Any], int]]:
+        """
+        Return the cached status result and its age in ms, if fresh. With
+        max_output_bytes, a result whose output was cut to another size is
+        not returned.
+        """
+        if self._status is None:
+            return None
+        stored_at, result = self._status
+        age = time.monotonic() - stored_at
+        if age > STATUS_CACHE_TTL:
+            self._status = None
+            return None
+        if None not in (max_output_bytes, self._status_excerpt) and (
+            self._status_excerpt != max_output_bytes
+        ):
+            return None
+        return result, int(age * 1000)
+
+    def store_status(
+        self, result: Dict[str, Any], max_output_bytes: Optional[int] = None
+    ) -> None:
+        """
+        Cache a status result, whose output excerpts were cut to
+        max_output_bytes if given
+        """
+        self.last_machines = [
+            {"name": m["name"], "state": m.get("state")}
+            for m in result.get("machines", [])
+        ]
+        self.last_status_at = time.time()
+        if STATUS_CACHE_TTL > 0:
+            self._status = (time.monotonic(), result)
+            self._status_excerpt = max_output_bytes
+
+    def invalidate_status(self) -> None:
+        """Forget the cached status"""
+        self._status = None
+
+
+class Inotify:
+    """Minimal inotify binding over ctypes (Linux only)"""
+
+    CREATE = 0x100
+    DELETE = 0x200
+    MOVED_FROM = 0x40
+    MOVED_TO = 0x80
+    Q_OVERFLOW = 0x4000
+    IGNORED = 0x8000
+    ONLYDIR = 0x01000000
+    ISDIR = 0x40000000
+
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch a directory and return the watch descriptor"""
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), ctypes.c_uint32(mask)
+        )
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        """
+        Stop a watch; errors for watches the kernel already dropped are
+        ignored
+        """
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        """Return the pending (wd, mask, name) events"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, _cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class ProjectIndex:
+    """
+    Index of the directories below a root that contain a Vagrantfile.
+
+    The tree is walked once with os.scandir, level by level with the
+    directories of each level split over PROJECT_SCAN_THREADS threads, down
+    to max_depth and skipping directories whose names match skip_patterns.
+    After that, inotify watches on every walked directory keep the index
+    current. Where inotify is unavailable or runs out of watches, the tree
+    is rescanned every PROJECT_POLL_SECONDS instead.
+    """
+
+    WATCH_MASK = (
+        Inotify.CREATE
+        | Inotify.DELETE
+        | Inotify.MOVED_FROM
+        | Inotify.MOVED_TO
+        | Inotify.ONLYDIR
+    )
+
+    def __init__(
+        self,
+        root: str,
+        max_depth: int = PROJECT_SCAN_DEPTH,
+        skip_patterns: Sequence[str] = PROJECT_SKIP_PATTERNS
+    ):
+        self.root = root
+        self.max_depth = max_depth
+        self.skip_patterns = tuple(skip_patterns)
+        # Project directory -> time it was first seen
+        self.projects: Dict[str, float] = {}
+        self.mode = "not started"
+        self.scanned_at: Optional[float] = None
+        self.scan_ms: Optional[int] = None
+        self._started: Optional["asyncio.Future[None]"] = None
+        self._inotify: Optional[Inotify] = None
+        self._wd_paths: Dict[int, str] = {}
+        self._path_wds: Dict[str, int] = {}
+        self._tasks: set = set()
+
+    async def start(self) -> None:
+        """
+        Build the index and start following changes; later calls wait for
+        the first scan
+        """
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._started)
+
+    async def _start(self) -> None:
+        if PROJECT_INOTIFY:
+            try:
+                self._inotify = Inotify()
+                asyncio.get_running_loop().add_reader(
+                    self._inotify.fd, self._on_events
+                )
+            except (OSError, AttributeError) as e:
+                logger.info(
+                    f"inotify unavailable ({e}), polling for project changes"
+                )
+                self._inotify = None
+        await self.rescan()
+        if self._inotify is None:
+            self._spawn(self._poll())
+
+    async def rescan(self) -> None:
+        """Walk the whole tree again"""
+        started = time.monotonic()
+        projects, walked = await self._scan(self.root)
+        now = time.time()
+        self.projects = {
+            path: self.projects.get(path, now) for path in sorted(projects)
+        }
+        if self._inotify is not None:
+            self._watch(walked)
+        self.scanned_at = now
+        self.scan_ms = int((time.monotonic() - started) * 1000)
+        self.mode = "inotify" if self._inotify is not None else "polling"
+
+    def close(self) -> None:
+        """Stop watching"""
+        for task in self._tasks:
+            task.cancel()
+        self._stop_inotify()
+
+    def describe(self) -> Dict[str, Any]:
+        """Index summary for tool results and stats"""
+        return {
+            "mode": self.mode,
+            "projects": len(self.projects),
+            "watches": len(self._wd_paths),
+            "scanned_at": self.scanned_at,
+            "scan_ms": self.scan_ms
+        }
+
+    def _skip(self, name: str) -> bool:
+        return any(
+            fnmatch.fnmatchcase(name, pattern)
+            for pattern in self.skip_patterns
+        )
+
+    def _depth(self, path: str) -> int:
+        relative = os.path.relpath(path, self.root)
+        return 0 if relative == "." else relative.count(os.sep) + 1
+
+    def _scan_dirs(
+        self, paths: List[str]
+    ) -> List[Tuple[str, bool, List[str]]]:
+        """
+        List directories (in a worker thread): (path, has Vagrantfile,
+        subdirectories)
+        """
+        results = []
+        for path in paths:
+            has_vagrantfile = False
+            subdirs = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.name == "Vagrantfile":
+                            has_vagrantfile = entry.is_file()
+                        elif (entry.is_dir(follow_symlinks=False)
+                              and not self._skip(entry.name)):
+                            subdirs.append(entry.path)
+            except OSError:
+                pass
+            results.append((path, has_vagrantfile, subdirs))
+        return results
+
+    async def _scan(self, start: str) -> Tuple[List[str], List[str]]:
+        """
+        Walk the tree below start; returns the projects and walked
+        directories
+        """
+        loop = asyncio.get_running_loop()
+        projects: List[str] = []
+        walked: List[str] = []
+        level = [start]
+        depth = self._depth(start)
+        while level:
+            walked.extend(level)
+            chunks = [
+                level[i::PROJECT_SCAN_THREADS]
+                for i in range(PROJECT_SCAN_THREADS)
+            ]
+            results = await asyncio.gather(*(
+                loop.run_in_executor(None, self._scan_dirs, chunk)
+                for chunk in chunks if chunk
+            ))
+            level = []
+            for path, has_vagrantfile, subdirs in (
+                itertools.chain.from_iterable(results)
+            ):
+                if has_vagrantfile:
+                    projects.append(path)
+                if depth < self.max_depth:
+                    level.extend(subdirs)
+            depth += 1
+        return projects, walked
+
+    def _watch(self, paths: List[str]) -> None:
+        for path in paths:
+            if self._inotify is None:
+                return
+            try:
+                wd = self._inotify.add_watch(path, self.WATCH_MASK)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    logger.warning(
+                        "inotify watch limit reached, polling for project "
+                        "changes"
+                    )
+                    self._stop_inotify()
+                    self.mode = "polling"
+                    self._spawn(self._poll())
+                continue
+            self._wd_paths[wd] = path
+            self._path_wds[path] = wd
+
+    def _stop_inotify(self) -> None:
+        if self._inotify is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+        except RuntimeError:
+            pass
+        self._inotify.close()
+        self._inotify = None
+        self._wd_paths.clear()
+        self._path_wds.clear()
+
+    def _on_events(self) -> None:
+        if self._inotify is None:
+            return
+        for wd, mask, name in self._inotify.read_events():
+            if mask & Inotify.Q_OVERFLOW:
+                self._spawn(self.rescan())
+                continue
+            if mask & Inotify.IGNORED:
+                path = self._wd_paths.pop(wd, None)
+                if path is not None and self._path_wds.get(path) == wd:
+                    del self._path_wds[path]
+                continue
+            parent = self._wd_paths.get(wd)
+            if parent is None:
+                continue
+            path = os.path.join(parent, name)
+            added = mask & (Inotify.CREATE | Inotify.MOVED_TO)
+            if mask & Inotify.ISDIR:
+                if (
+                    added
+                    and not self._skip(name)
+                    and self._depth(path) <= self.max_depth
+                ):
+                    self._spawn(self._add_subtree(path))
+                elif not added:
+                    self._drop_subtree(path)
+            elif name == "Vagrantfile":
+                if added:
+                    self.projects.setdefault(parent, time.time())
+                else:
+                    self.projects.pop(parent, None)
+
+    async def _add_subtree(self, path: str) -> None:
+        projects, walked = await self._scan(path)
+        now = time.time()
+        for project in projects:
+            self.projects.setdefault(project, now)
+        if self._inotify is not None:
+            self._watch(walked)
+
+    def _drop_subtree(self, path: str) -> None:
+        prefix = path + os.sep
+        for project in [
+            p for p in self.projects if p == path or p.startswith(prefix)
+        ]:
+            del self.projects[project]
+        for watched in [
+            p for p in self._path_wds if p == path or p.startswith(prefix)
+        ]:
+            wd = self._path_wds.pop(watched)
+            self._wd_paths.pop(wd, None)
+            if self._inotify is not None:
+                self._inotify.rm_watch(wd)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(PROJECT_POLL_SECONDS)
+            try:
+                await self.rescan()
+            except Exception as e:
+                logger.warning(f"Project rescan failed: {e}")
+
+    def _spawn(self, coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+class VagrantMCPServer:
+    def __init__(self):
+        self.server = Server("vagrant-mcp-server")
+        self.base_projects_dir = os.environ.get(
+            "VAGRANT_PROJECTS_DIR", "/vagrant-projects"
+        )
+        # Output of recent commands, oldest first, served as resources
+        self._runs: "OrderedDict[str, RunOutput]" = OrderedDict()
+        # Running child processes by pid (= process group id)
+        self._processes: Dict[int, asyncio.subprocess.Process] = {}
+        # Read-only commands currently running, see _execute_single_flight
+        self._in_flight: Dict[
+            Tuple[Any, ...], "asyncio.Future[RunOutput]"
+        ] = {}
+        self._in_flight_waiters: Dict[Tuple[Any, ...], int] = {}
+        self._single_flight_stats = {"hits": 0, "misses": 0}
+        self._scheduler = MachineScheduler()
+        # Lifecycle commands answered from known machine states
+        self._plan_stats = {"skipped": 0, "dry_runs": 0}
+        # Direct ssh access per (working directory, machine name)
+        self._ssh_targets: Dict[Tuple[str, str], SshTarget] = {}
+        self._ssh_runtime_dir = tempfile.mkdtemp(prefix="vagrant-mcp-ssh-")
+        self._ssh_stats = {
+            "direct": 0, "cli": 0, "fallbacks": 0, "skipped_retries": 0
+        }
+        # When direct ssh last failed per (working directory, machine name)
+        self._ssh_failed: Dict[Tuple[str, str], float] = {}
+        # Set once the ssh client turned out not to be runnable
+        self._ssh_missing = False
+        # Open shell sessions by session id
+        self._shell_sessions: Dict[str, ShellSession] = {}
+        self._shell_reaper_task: Optional["asyncio.Task[None]"] = None
+        self._shell_stats = {"opened": 0, "commands": 0, "reaped": 0}
+        # Checkpoint snapshot names per (working directory, machine), oldest
+        # first, and locks keeping operations on one stack in order
+        self._checkpoints: Dict[Tuple[str, str], List[str]] = {}
+        self._checkpoint_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._checkpoint_stats = {"pushed": 0, "popped": 0, "dropped": 0,
+                                  "pruned": 0, "native": 0, "vagrant": 0}
+        # Time of the last tool call per (working directory, machine), with
+        # "*" for calls on a whole project, see _note_activity
+        self._activity: Dict[Tuple[str, str], float] = {}
+        self._idle_reaper_task: Optional["asyncio.Task[None]"] = None
+        self._idle_stats = {"reaped": 0, "suspended": 0, "halted": 0,
+                            "failed": 0, "memory_mb_reclaimed": 0,
+                            "cpus_reclaimed": 0}
+        self._idle_recent: deque = deque(maxlen=20)
+        # Warm pool members by machine name, see _vagrant_lease
+        self._pool: Dict[str, PoolMember] = {}
+        self._pool_loading: Optional["asyncio.Task[None]"] = None
+        self._pool_changed = asyncio.Condition()
+        self._pool_slots = asyncio.Semaphore(POOL_REFILL_CONCURRENCY)
+        self._pool_reaper_task: Optional["asyncio.Task[None]"] = None
+        self._pool_stats = {
+            "hits": 0, "misses": 0, "wait_ms": 0, "max_wait_ms": 0,
+            "timeouts": 0, "released": 0, "expired": 0, "warmed": 0,
+            "restored": 0, "failed": 0, "last_warm_ms": None,
+            "last_restore_ms": None
+        }
+        # Fire-and-forget tasks, referenced so they are not garbage collected
+        self._background_tasks: set = set()
+        # Background jobs, oldest first
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Project contexts by resolved path, and resolved paths by the
+        # directory argument that named them
+        self._projects_root = os.path.realpath(self.base_projects_dir)
+        self._projects: Dict[str, ProjectContext] = {}
+        self._project_paths: Dict[str, str] = {}
+        self._project_index = ProjectIndex(self._projects_root)
+        self._vagrantfiles = VagrantfileCache(
+            os.path.join(STATE_DIR, "vagrantfiles.json")
+        )
+        self._durations = DurationHistory(
+            os.path.join(STATE_DIR, "durations.json")
+        )
+        self._machine_index = MachineIndexReader()
+        self._setup_handlers()
+    
+    def _setup_handlers(self):
+        """Setup MCP server handlers"""
+        
+        @self.server.list_tools()
+        async def handle_list_tools() -> list[Tool]:
+            """List available Vagrant tools"""
+            tools = [
+                Tool(
+                    name="vagrant_status",
+                    description=(
+                        "Get the status of Vagrant machines in the current "
+                        "directory"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **common_properties("directory"),
+                            "fresh": {
+                                "type": "boolean",
+                                "description": (
+                                    "Bypass the status cache and query "
+                                    "Vagrant"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_up",
+                    description="Start and provision Vagrant machines",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of specific machine to start "
+                                    "(optional)"
+                                )
+                            },
+                            **common_properties(
+                                "directory", "provider", "provision"
+                            ),
+                            "fast": {
+                                "type": "boolean",
+                                "description": (
+                                    "Resume instead of booting when the "
+                                    "machines are suspended"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_up_graph",
+                    description=(
+                        "Start the machines of a multi-machine environment in "
+                        "dependency order, independent machines in parallel, "
+                        "waiting for health checks before starting "
+                        "dependents. Reports per-machine timings and the "
+                        "critical path"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **common_properties("directory"),
+                            "graph": {
+                                "type": "object",
+                                "description": (
+                                    "Machines mapped to the machines they "
+                                    "wait for, as a list or as "
+                                    "{\"after\": [...], \"health\": "
+                                    "\"<command that exits 0 when "
+                                    "ready>\"}. Defaults to "
+                                    f"{UP_GRAPH_FILE} in the project "
+                                    "directory"
+                                )
+                            },
+                            "concurrency": {
+                                "type": "integer",
+                                "description": (
+                                    "Maximum number of machines started at "
+                                    "once"
+                                ),
+                                "default": UP_GRAPH_CONCURRENCY
+                            },
+                            "health_timeout_s": {
+                                "type": "number",
+                                "description": (
+                                    "Seconds a machine's health check may "
+                                    "keep failing before its dependents are "
+                                    "abandoned"
+                                ),
+                                "default": HEALTH_CHECK_TIMEOUT_SECONDS
+                            },
+                            **common_properties("provider", "provision"),
+                            "dry_run": {
+                                "type": "boolean",
+                                "description": (
+                                    "Report the start order and planned "
+                                    "action per machine without starting "
+                                    "anything"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_halt",
+                    description="Stop Vagrant machines gracefully",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of specific machine to stop "
+                                    "(optional)"
+                                )
+                            },
+                            **common_properties("directory"),
+                            "force": {
+                                "type": "boolean", 
+                                "description": "Force halt the machine",
+                                "default": False
+                            },
+                            "fast": {
+                                "type": "boolean",
+                                "description": (
+                                    "Suspend instead of shutting down when "
+                                    "the provider supports it, so a later "
+                                    "vagrant_up with fast resumes without "
+                                    "booting"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_suspend",
+                    description=(
+                        "Suspend Vagrant machines, saving their memory so "
+                        "they resume without booting"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of specific machine to suspend "
+                                    "(optional)"
+                                )
+                            },
+                            **common_properties("directory")
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_resume",
+                    description="Resume suspended Vagrant machines",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of specific machine to resume "
+                                    "(optional)"
+                                )
+                            },
+                            **common_properties("directory")
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_destroy",
+                    description=(
+                        "Destroy Vagrant machines and remove all traces"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of specific machine to destroy "
+                                    "(optional)"
+                                )
+                            },
+                            **common_properties("directory"),
+                            "force": {
+                                "type": "boolean",
+                                "description": (
+                                    "Confirm the destroy. Must be true: the "
+                                    "server cannot answer Vagrant's prompt, "
+                                    "so it refuses to destroy without it"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_ssh",
+                    description="Execute commands via SSH on Vagrant machine",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "command": {
+                                "type": "string",
+                                "description": (
+                                    "Command to execute on the machine"
+                                )
+                            },
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of machine to SSH into (optional if "
+                                    "only one machine)"
+                                )
+                            },
+                            **common_properties("directory")
+                        },
+                        "required": ["command"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_ssh_multi",
+                    description=(
+                        "Execute a command via SSH on several Vagrant "
+                        "machines in parallel and return a table of exit "
+                        "codes with identical outputs grouped together"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "command": {
+                                "type": "string",
+                                "description": (
+                                    "Command to execute on each machine"
+                                )
+                            },
+                            "machines": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": (
+                                    "Names of the machines to run the command "
+                                    "on"
+                                )
+                            },
+                            "pattern": {
+                                "type": "string",
+                                "description": (
+                                    "Glob selecting running machines by name, "
+                                    "e.g. 'web*' (used when machines is not "
+                                    "given)"
+                                )
+                            },
+                            "regex": {
+                                "type": "string",
+                                "description": (
+                                    "Regular expression selecting running "
+                                    "machines by name (used when machines is "
+                                    "not given)"
+                                )
+                            },
+                            "concurrency": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "description": (
+                                    "Maximum number of machines to run on at "
+                                    f"once (default {SSH_MULTI_CONCURRENCY})"
+                                )
+                            },
+                            **common_properties("directory")
+                        },
+                        "required": ["command"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_ssh_batch",
+                    description=(
+                        "Execute a list of commands on a Vagrant machine in "
+                        "one SSH session and return each command's stdout, "
+                        "stderr, exit code and duration. max_output_bytes "
+                        "applies to each command"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "commands": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": (
+                                    "Commands to run, in order, in the same "
+                                    "shell"
+                                )
+                            },
+                            "stop_on_failure": {
+                                "type": "boolean",
+                                "description": (
+                                    "Skip the remaining commands after the "
+                                    "first non-zero exit code"
+                                ),
+                                "default": False
+                            },
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of machine to run the commands on "
+                                    "(optional if only one machine)"
+                                )
+                            },
+                            **common_properties("directory")
+                        },
+                        "required": ["commands"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_shell_open",
+                    description=(
+                        "Open a persistent shell on a Vagrant machine. "
+                        "Commands run with vagrant_shell_exec share its "
+                        "working directory and environment"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of machine to open the shell on "
+                                    "(optional if only one machine)"
+                                )
+                            },
+                            "ttl_s": {
+                                "type": "number",
+                                "description": (
+                                    "Close the session after this many idle "
+                                    "seconds (default "
+                                    f"{SHELL_IDLE_TTL_SECONDS:g})"
+                                )
+                            },
+                            **common_properties("directory")
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_shell_exec",
+                    description=(
+                        "Run a command in a shell session opened with "
+                        "vagrant_shell_open"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **common_properties("session_id"),
+                            "command": {
+                                "type": "string",
+                                "description": (
+                                    "Command to run in the session's shell"
+                                )
+                            }
+                        },
+                        "required": ["session_id", "command"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_shell_close",
+                    description="Close a shell session",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **common_properties("session_id")
+                        },
+                        "required": ["session_id"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_lease",
+                    description=(
+                        "Lease a clean machine from the warm pool of booted, "
+                        "snapshotted machines. Returns the directory and "
+                        "machine name to use with the other tools"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "ttl_s": {
+                                "type": "number",
+                                "description": (
+                                    "Seconds until the lease expires and the "
+                                    "machine is reset and returned to the "
+                                    "pool"
+                                ),
+                                "default": POOL_LEASE_TTL_SECONDS
+                            },
+                            "wait_s": {
+                                "type": "number",
+                                "description": (
+                                    "Seconds to wait for a machine when none "
+                                    "is ready"
+                                ),
+                                "default": POOL_LEASE_WAIT_SECONDS
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_release",
+                    description=(
+                        "Return a leased machine; it is restored to its clean "
+                        "snapshot in the background"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "lease_id": {
+                                "type": "string",
+                                "description": (
+                                    "Lease ID returned by vagrant_lease"
+                                )
+                            }
+                        },
+                        "required": ["lease_id"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_provision",
+                    description="Run provisioners on Vagrant machines",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of specific machine to provision "
+                                    "(optional)"
+                                )
+                            },
+                            **common_properties("directory"),
+                            "provision_with": {
+                                "type": "string",
+                                "description": "Specific provisioner to run"
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_reload",
+                    description=(
+                        "Restart Vagrant machines and reload Vagrantfile"
+                    ),
+                    inputSchema={
+                        "type": "object", 
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of specific machine to reload "
+                                    "(optional)"
+                                )
+                            },
+                            **common_properties("directory"),
+                            "provision": {
+                                "type": "boolean",
+                                "description": (
+                                    "Whether to run provisioners after reload"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_snapshot",
+                    description="Manage Vagrant snapshots",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "action": {
+                                "type": "string",
+                                "enum": ["save", "restore", "list", "delete"],
+                                "description": "Snapshot action to perform"
+                            },
+                            "snapshot_name": {
+                                "type": "string", 
+                                "description": (
+                                    "Name of the snapshot (required for save, "
+                                    "restore, delete)"
+                                )
+                            },
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Name of machine for snapshot operation"
+                                )
+                            },
+                            **common_properties("directory")
+                        },
+                        "required": ["action"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_checkpoint_push",
+                    description=(
+                        "Save the machine's current state as a checkpoint on "
+                        "top of its checkpoint stack (a snapshot named by the "
+                        "server)"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Machine to checkpoint (optional for "
+                                    "single-machine projects)"
+                                )
+                            },
+                            **common_properties("directory")
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_checkpoint_pop",
+                    description=(
+                        "Roll the machine back to its most recent checkpoint "
+                        "and remove it from the stack"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Machine to roll back (optional for "
+                                    "single-machine projects)"
+                                )
+                            },
+                            **common_properties("directory"),
+                            "keep": {
+                                "type": "boolean",
+                                "description": (
+                                    "Keep the checkpoint on the stack, to "
+                                    "roll back to it again later"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_checkpoint_drop",
+                    description=(
+                        "Delete the machine's most recent checkpoint without "
+                        "rolling back"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Machine whose checkpoint to delete "
+                                    "(optional for single-machine projects)"
+                                )
+                            },
+                            **common_properties("directory"),
+                            "all": {
+                                "type": "boolean",
+                                "description": (
+                                    "Delete every checkpoint of the machine"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_reset",
+                    description=(
+                        "Bring a machine back to a known state with the "
+                        "strategy (snapshot restore, reload with "
+                        "provisioning, or destroy and up) measured to be "
+                        "fastest on this host that reaches the requested "
+                        "cleanliness. Explains the choice"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "machine_name": {
+                                "type": "string",
+                                "description": (
+                                    "Machine to reset (optional for "
+                                    "single-machine projects)"
+                                )
+                            },
+                            **common_properties("directory"),
+                            "cleanliness": {
+                                "type": "string",
+                                "enum": list(RESET_LEVELS),
+                                "description": (
+                                    "provisioned: provisioners applied again, "
+                                    "other changes may survive; clean: back "
+                                    "at the clean snapshot (or rebuilt); "
+                                    "pristine: rebuilt from the base box"
+                                ),
+                                "default": "clean"
+                            },
+                            "snapshot_name": {
+                                "type": "string",
+                                "description": (
+                                    "Snapshot holding the machine's clean "
+                                    "state"
+                                ),
+                                "default": POOL_SNAPSHOT
+                            },
+                            "strategy": {
+                                "type": "string",
+                                "enum": list(RESET_STRATEGIES),
+                                "description": (
+                                    "Use this strategy instead of choosing "
+                                    "one (its duration is still recorded)"
+                                )
+                            },
+                            "dry_run": {
+                                "type": "boolean",
+                                "description": (
+                                    "Explain which strategy would be used "
+                                    "without resetting"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_global_status", 
+                    description=(
+                        "Get global status of all Vagrant environments"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "prune": {
+                                "type": "boolean",
+                                "description": "Prune invalid entries",
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_list_projects",
+                    description=(
+                        "List the project directories under "
+                        "VAGRANT_PROJECTS_DIR that contain a Vagrantfile, "
+                        "with their last known machine states"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "filter": {
+                                "type": "string",
+                                "description": (
+                                    "Glob matched against the project "
+                                    "directory, e.g. 'team-a/*'"
+                                )
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": (
+                                    "Maximum number of projects to return"
+                                ),
+                                "default": 1000
+                            },
+                            "refresh": {
+                                "type": "boolean",
+                                "description": (
+                                    "Rescan the directory tree before listing"
+                                ),
+                                "default": False
+                            }
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_job_submit",
+                    description=(
+                        "Start a long-running Vagrant tool (up, halt, "
+                        "destroy, provision, reload, snapshot) in the "
+                        "background and return a job id immediately"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "tool": {
+                                "type": "string",
+                                "enum": list(JOB_TOOLS),
+                                "description": "Tool to run"
+                            },
+                            "arguments": {
+                                "type": "object",
+                                "description": (
+                                    "Arguments for the tool, as it would be "
+                                    "called directly"
+                                )
+                            }
+                        },
+                        "required": ["tool"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_job_status",
+                    description=(
+                        "Get the state of a background job, or of all jobs "
+                        "when no id is given"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **common_properties("job_id")
+                        }
+                    }
+                ),
+                Tool(
+                    name="vagrant_job_output",
+                    description=(
+                        "Read a background job's output incrementally; pass "
+                        "the returned next_offset as offset to continue where "
+                        "the last read stopped"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **common_properties("job_id"),
+                            "stream": {
+                                "type": "string",
+                                "enum": ["stdout", "stderr"],
+                                "description": "Output stream to read",
+                                "default": "stdout"
+                            },
+                            "offset": {
+                                "type": "integer",
+                                "description": "Byte offset to read from",
+                                "default": 0
+                            },
+                            "max_bytes": {
+                                "type": "integer",
+                                "description": "Maximum bytes to read",
+                                "default": DEFAULT_MAX_OUTPUT_BYTES
+                            },
+                            "run_id": {
+                                "type": "string",
+                                "description": (
+                                    "Command of the job to read, from the "
+                                    "runs listed by vagrant_job_status "
+                                    "(default: the job's first command)"
+                                )
+                            }
+                        },
+                        "required": ["job_id"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_job_cancel",
+                    description=(
+                        "Cancel a running background job and stop its Vagrant "
+                        "process"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            **common_properties("job_id")
+                        },
+                        "required": ["job_id"]
+                    }
+                ),
+                Tool(
+                    name="vagrant_server_stats",
+                    description=(
+                        "Get internal statistics of the Vagrant MCP server "
+                        "(caches, process sharing)"
+                    ),
+                    inputSchema={
+                        "type": "object",
+                        "properties": {}
+                    }
+                )
+            ]
+
+            # Tools that return command output accept the per-call output
+            # budget
+            for tool in tools:
+                if tool.name in TOOLS_WITHOUT_COMMAND_OUTPUT:
+                    continue
+                tool.inputSchema["properties"]["max_output_bytes"] = {
+                    "type": "integer",
+                    "description": (
+                        "Maximum bytes of stdout/stderr to include in the "
+                        "result (head and tail excerpt); the full output is "
+                        "available as a vagrant-run:// resource"
+                    ),
+                    "default": DEFAULT_MAX_OUTPUT_BYTES
+                }
+                tool.inputSchema["properties"]["timeout_s"] = {
+                    "type": "number",
+                    "description": (
+                        "Wall-clock limit in seconds for the Vagrant command; "
+                        "it is stopped and partial output returned when "
+                        "exceeded"
+                    ),
+                    "default": TOOL_TIMEOUTS.get(tool.name)
+                }
+                if tool.name in LIFECYCLE_TOOLS:
+                    tool.inputSchema["properties"]["dry_run"] = {
+                        "type": "boolean",
+                        "description": (
+                            "Report the planned action for each machine from "
+                            "its known state without running anything"
+                        ),
+                        "default": False
+                    }
+            return tools
+
+        @self.server.list_resources()
+        async def handle_list_resources() -> list[Resource]:
+            """List the captured output of recent vagrant commands"""
+            resources = []
+            for run in reversed(self._runs.values()):
+                for stream_name in RunOutput.STREAMS:
+                    capture = run.capture(stream_name)
+                    resources.append(Resource(
+                        uri=run.uri(stream_name),
+                        name=f"{run.command} ({stream_name})",
+                        mimeType="text/plain",
+                        size=capture.size
+                    ))
+            return resources
+
+        @self.server.list_resource_templates()
+        async def handle_list_resource_templates() -> list[ResourceTemplate]:
+            """Describe the URI scheme for ranged output reads"""
+            return [
+                ResourceTemplate(
+                    uriTemplate=(
+                        "vagrant-run://{run_id}/{stream}{?offset,length}"
+                    ),
+                    name="vagrant-run-output",
+                    description=(
+                        "Byte range of the stdout or stderr of a recent "
+                        f"vagrant command (at most {MAX_RESOURCE_READ_BYTES} "
+                        "bytes per read)"
+                    ),
+                    mimeType="text/plain"
+                )
+            ]
+
+        @self.server.read_resource()
+        async def handle_read_resource(uri) -> list[ReadResourceContents]:
+            """Read a byte range of a captured command output"""
+            text = self._read_run_resource(str(uri))
+            return [ReadResourceContents(content=text, mime_type="text/plain")]
+
+        @self.server.call_tool()
+        async def handle_call_tool(
+            name: str, arguments: dict | None
+        ) -> list[TextContent] | ToolResult:
+            """Handle tool calls"""
+            try:
+                # Activity counts from the start and the end of a call, so
+                # a long command is not mistaken for idleness
+                self._note_activity(name, arguments or {})
+                try:
+                    return await self._dispatch_tool(name, arguments or {})
+                finally:
+                    self._note_activity(name, arguments or {})
+                    
+            except Exception as e:
+                logger.error(f"Error executing tool {name}: {e}")
+                return [TextContent(type="text", text=f"Error: {str(e)}")]
+
+    async def _dispatch_tool(self, name: str, args: dict) -> ToolResult:
+        """Route a tool call to its handler"""
+        self._check_machine_names(args)
+        timeout = args.get("timeout_s", TOOL_TIMEOUTS.get(name))
+        CALL_LIMITS.set((
+            float(timeout) if timeout else None,
+            STALL_TIMEOUT_SECONDS or None
+        ))
+
+        if name == "vagrant_status":
+            return await self._vagrant_status(args)
+        elif name == "vagrant_up":
+            return await self._vagrant_up(args)
+        elif name == "vagrant_up_graph":
+            return await self._vagrant_up_graph(args)
+        elif name == "vagrant_halt":
+            return await self._vagrant_halt(args)
+        elif name == "vagrant_suspend":
+            return await self._vagrant_suspend(args)
+        elif name == "vagrant_resume":
+            return await self._vagrant_resume(args)
+        elif name == "vagrant_destroy":
+            return await self._vagrant_destroy(args)
+        elif name == "vagrant_ssh":
+            return await self._vagrant_ssh(args)
+        elif name == "vagrant_ssh_multi":
+            return await self._vagrant_ssh_multi(args)
+        elif name == "vagrant_ssh_batch":
+            return await self._vagrant_ssh_batch(args)
+        elif name == "vagrant_shell_open":
+            return await self._vagrant_shell_open(args)
+        elif name == "vagrant_shell_exec":
+            return await self._vagrant_shell_exec(args)
+        elif name == "vagrant_shell_close":
+            return await self._vagrant_shell_close(args)
+        elif name == "vagrant_lease":
+            return await self._vagrant_lease(args)
+        elif name == "vagrant_release":
+            return await self._vagrant_release(args)
+        elif name == "vagrant_provision":
+            return await self._vagrant_provision(args)
+        elif name == "vagrant_reload":
+            return await self._vagrant_reload(args)
+        elif name == "vagrant_snapshot":
+            return await self._vagrant_snapshot(args)
+        elif name == "vagrant_checkpoint_push":
+            return await self._vagrant_checkpoint_push(args)
+        elif name == "vagrant_checkpoint_pop":
+            return await self._vagrant_checkpoint_pop(args)
+        elif name == "vagrant_checkpoint_drop":
+            return await self._vagrant_checkpoint_drop(args)
+        elif name == "vagrant_reset":
+            return await self._vagrant_reset(args)
+        elif name == "vagrant_global_status":
+            return await self._vagrant_global_status(args)
+        elif name == "vagrant_list_projects":
+            return await self._vagrant_list_projects(args)
+        elif name == "vagrant_server_stats":
+            return await self._vagrant_server_stats(args)
+        elif name == "vagrant_job_submit":
+            return await self._vagrant_job_submit(args)
+        elif name == "vagrant_job_status":
+            return await self._vagrant_job_status(args)
+        elif name == "vagrant_job_output":
+            return await self._vagrant_job_output(args)
+        elif name == "vagrant_job_cancel":
+            return await self._vagrant_job_cancel(args)
+        else:
+            raise ValueError(f"Unknown tool: {name}")
+
+    def _check_machine_names(self, args: dict) -> None:
+        """
+        Reject machine names the project's Vagrantfile does not define.
+
+        Uses the Vagrantfile cache only, so it costs a few stat calls. When
+        the Vagrantfile has not been evaluated yet (or changed since), the
+        names are left for Vagrant to check. Regex patterns (/.../) and
+        machine ids, which Vagrant also accepts, are not checked.
+        """
+        names = list(args.get("machines") or [])
+        if args.get("machine_name"):
+            names.append(args["machine_name"])
+        if not names:
+            return
+        try:
+            path = self._get_working_directory(args.get("directory"))
+        except ValueError:
+            return
+        definitions = self._vagrantfiles.lookup(path)
+        if definitions is None:
+            return
+        for name in names:
+            if not isinstance(name, str) or name in definitions["machines"]:
+                continue
+            if (name.startswith("/") and name.endswith("/")) or re.fullmatch(
+                r"[0-9a-f]{7,32}", name
+            ):
+                continue
+            raise ValueError(
+                f"Unknown machine '{name}'. Machines defined in the "
+                f"Vagrantfile: {', '.join(definitions['machines']) or 'none'}"
+            )
+
+    def _get_working_directory(
+        self, requested_dir: Optional[str] = None
+    ) -> str:
+        """
+        Resolve a directory argument to a real path inside the projects
+        directory (the mounted volume).
+
+        Relative paths are taken from the projects directory and no
+        directory means the projects directory itself. Symlinks and `..`
+        are resolved before checking that the result stays inside it.
+        Resolutions are cached, so known projects are not probed again.
+        """
+        key = requested_dir or ""
+        path = self._project_paths.get(key)
+        if path is not None:
+            return path
+
+        path = os.path.realpath(os.path.join(self.base_projects_dir, key))
+        root = self._projects_root
+        if os.path.commonpath([path, root]) != root:
+            raise ValueError(
+                f"Directory is outside the projects directory: {requested_dir}"
+            )
+        if not os.path.isdir(path):
+            raise ValueError(f"Directory does not exist: {path}")
+        self._project_paths[key] = path
+        return path
+
+    def _project(self, directory: Optional[str] = None) -> ProjectContext:
+        """
+        Return the context of a project directory.
+
+        Only directories with a Vagrantfile are cached; others are looked at
+        again on every request, so a Vagrantfile created later is found.
+        """
+        path = self._get_working_directory(directory)
+        context = self._projects.get(path)
+        if context is None:
+            context = ProjectContext(path)
+            if context.vagrantfile is not None:
+                self._projects[path] = context
+        return context
+
+    def _forget_project(self, path: str) -> None:
+        """Drop a project's context and cached resolutions"""
+        self._projects.pop(path, None)
+        for key in [
+            key for key, value in self._project_paths.items() if value == path
+        ]:
+            del self._project_paths[key]
+
+    async def _run_vagrant_command(
+        self, 
+        args: List[str], 
+        directory: Optional[str] = None,
+        input_text: Optional[str] = None,
+        stream: bool = False,
+        max_output_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Run a vagrant command and capture output.
+
+        Output is captured with bounded memory (see OutputCapture) and the
+        result only holds head/tail excerpts of at most max_output_bytes per
+        stream; the full output stays readable through the run's resource
+        URIs. When stream is True, output is also forwarded to the client
+        as it is produced (see _progress_reporter).
+        """
+        try:
+            machine_readable = args[0] not in RAW_OUTPUT_COMMANDS
+            cmd = (
+                ["vagrant"]
+                + args
+                + (["--machine-readable"] if machine_readable else [])
+            )
+            try:
+                context = self._project(directory)
+            except ValueError as e:
+                return {
+                    "command": " ".join(cmd),
+                    "return_code": -1,
+                    "stdout": "",
+                    "stderr": str(e),
+                    "success": False
+                }
+            cwd = context.path
+
+            # Check for Vagrantfile unless it's a global command. For known
+            # projects this uses the cached signature, not a new probe.
+            if (
+                args[0] not in ["global-status"]
+                and context.vagrantfile is None
+            ):
+                return {
+                    "command": " ".join(cmd),
+                    "return_code": -1,
+                    "stdout": "",
+                    "stderr": f"No Vagrantfile found in: {cwd}",
+                    "success": False
+                }
+            
+            reporter = self._progress_reporter() if stream else None
+            mutating, machines = command_targets(args)
+            queue_wait = 0.0
+            if mutating:
+                async with self._scheduler.hold(cwd, machines) as queue_wait:
+                    run = await self._execute(
+                        cmd, cwd, machine_readable, input_text, reporter
+                    )
+            elif is_read_only_command(args) and not input_text:
+                run = await self._execute_single_flight(
+                    cmd, cwd, machine_readable
+                )
+            else:
+                run = await self._execute(
+                    cmd, cwd, machine_readable, input_text, reporter
+                )
+
+            result = self._build_result(
+                cmd, cwd, run, max_output_bytes, queue_wait
+            )
+            if not result["success"] and not os.path.isdir(cwd):
+                self._forget_project(cwd)
+            elif not result["success"] and not context.validate():
+                self._projects.pop(cwd, None)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Failed to run vagrant command: {e}")
+            return {
+                "command": " ".join(cmd) if 'cmd' in locals() else "unknown",
+                "return_code": -1,
+                "stdout": "",
+                "stderr": str(e),
+                "success": False,
+                "working_directory": cwd if 'cwd' in locals() else "unknown"
+            }
+
+    def _build_result(
+        self,
+        cmd: List[str],
+        cwd: str,
+        run: RunOutput,
+        max_output_bytes: Optional[int] = None,
+        queue_wait: float = 0.0
+    ) -> Dict[str, Any]:
+        """Build the result dict of a finished run"""
+        result = {
+            "command": " ".join(cmd),
+            "return_code": run.return_code,
+            "success": run.return_code == 0,
+            "working_directory": cwd,
+            "queue_wait_ms": int(queue_wait * 1000)
+        }
+        result.update(self._run_excerpts(run, max_output_bytes))
+        if run.parser:
+            result.update(
+                self._parsed_output(run.parser, result, max_output_bytes)
+            )
+        if run.termination:
+            result["success"] = False
+            result[run.termination] = True
+            result["termination"] = run.termination
+            result["last_lines"] = run.last_lines(WATCHDOG_LAST_LINES)
+        return result
+
+    async def _execute(
+        self,
+        cmd: List[str],
+        cwd: str,
+        machine_readable: bool,
+        input_text: Optional[str] = None,
+        reporter: Optional[ProgressReporter] = None
+    ) -> RunOutput:
+        """
+        Spawn a command and capture its output until it exits.
+
+        If the caller is cancelled (MCP cancellation, job cancel, shutdown),
+        the command's whole process group is terminated before the
+        cancellation propagates, so any machine claim held by the caller is
+        released only once Vagrant has actually stopped.
+        """
+        logger.info(f"Running command: {' '.join(cmd)} in {cwd}")
+
+        stdin = (
+            asyncio.subprocess.PIPE if input_text
+            else asyncio.subprocess.DEVNULL
+        )
+        async with self._running_process(cmd, cwd, stdin) as process:
+            run = self._register_run(" ".join(cmd))
+            run.parser = MachineReadableParser() if machine_readable else None
+            job = CURRENT_JOB.get()
+            if job is not None:
+                job.runs.append(run)
+
+            work = asyncio.ensure_future(
+                self._collect_output(process, run, input_text, reporter)
+            )
+            timeout, stall_timeout = CALL_LIMITS.get()
+            watchdog = asyncio.ensure_future(
+                self._watchdog(run, timeout, stall_timeout)
+            )
+            try:
+                done, _ = await asyncio.wait(
+                    {work, watchdog}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if watchdog in done:
+                    run.termination = watchdog.result()
+                    logger.warning(
+                        f"Stopping {run.command}: {run.termination}"
+                    )
+                    await self._terminate_process_group(process)
+                run.return_code = await work
+            finally:
+                work.cancel()
+                watchdog.cancel()
+                run.finished_at = time.time()
+        return run
+
+    async def _collect_output(
+        self,
+        process: asyncio.subprocess.Process,
+        run: RunOutput,
+        input_text: Optional[str] = None,
+        reporter: Optional[ProgressReporter] = None
+    ) -> int:
+        """Feed stdin, capture both pipes until EOF and return the exit code"""
+        if input_text:
+            process.stdin.write(input_text.encode())
+            await process.stdin.drain()
+            process.stdin.close()
+
+        await asyncio.gather(
+            self._pump_stream(
+                process.stdout, "stdout", run.stdout, reporter, run.parser
+            ),
+            self._pump_stream(process.stderr, "stderr", run.stderr, reporter)
+        )
+        return await process.wait()
+
+    async def _watchdog(
+        self,
+        run: RunOutput,
+        timeout: Optional[float],
+        stall_timeout: Optional[float]
+    ) -> str:
+        """
+        Return "timed_out" once the run exceeds timeout seconds, or "stalled"
+        once it has produced no output for stall_timeout seconds. Never
+        returns when both limits are None.
+        """
+        started = time.monotonic()
+        while True:
+            now = time.monotonic()
+            last_output = max(
+                run.stdout.last_write, run.stderr.last_write, started
+            )
+            if timeout and now - started >= timeout:
+                return "timed_out"
+            if stall_timeout and now - last_output >= stall_timeout:
+                return "stalled"
+
+            deadlines = []
+            if timeout:
+                deadlines.append(started + timeout)
+            if stall_timeout:
+                deadlines.append(last_output + stall_timeout)
+            if not deadlines:
+                await asyncio.Event().wait()
+            await asyncio.sleep(max(0.05, min(deadlines) - now))
+
+    async def _spawn_process(
+        self,
+        cmd: List[str],
+        cwd: Optional[str] = None,
+        stdin: Any = asyncio.subprocess.DEVNULL
+    ) -> asyncio.subprocess.Process:
+        """
+        Start a process in its own process group and register it.
+
+        A separate group lets us signal Vagrant together with the Ruby,
+        VBoxManage and ssh processes it starts. Callers remove the process
+        from self._processes once it has exited.
+
+        stdin is /dev/null unless the caller passes a pipe: the server's own
+        stdin is the MCP stream, and ssh (directly or under `vagrant ssh`)
+        would otherwise read client requests off it and forward them.
+        """
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=stdin,
+            start_new_session=True
+        )
+        self._processes[process.pid] = process
+        return process
+
+    @contextlib.asynccontextmanager
+    async def _running_process(
+        self,
+        cmd: List[str],
+        cwd: Optional[str],
+        stdin: Any = asyncio.subprocess.DEVNULL,
+        grace: float = 0.0
+    ) -> AsyncIterator[asyncio.subprocess.Process]:
+        """
+        Spawn a process (see _spawn_process) for the body of the block and
+        make sure its process group is gone when the block exits.
+
+        If the body raises, including on cancellation, the group is
+        terminated right away, shielded from the cancellation. Otherwise a
+        process still running is given grace seconds to exit first.
+        """
+        process = await self._spawn_process(cmd, cwd=cwd, stdin=stdin)
+        try:
+            yield process
+        except BaseException:
+            if process.returncode is None:
+                with anyio.CancelScope(shield=True):
+                    await self._terminate_process_group(process)
+            raise
+        else:
+            if process.returncode is None and grace:
+                try:
+                    await asyncio.wait_for(process.wait(), grace)
+                except asyncio.TimeoutError:
+                    pass
+            if process.returncode is None:
+                await self._terminate_process_group(process)
+        finally:
+            self._processes.pop(process.pid, None)
+
+    async def _terminate_process_group(
+        self, process: asyncio.subprocess.Process
+    ) -> None:
+        """
+        Stop a process group: SIGINT, then SIGTERM, then SIGKILL.
+
+        Each signal goes to the whole group and is followed by a wait of
+        TERMINATE_GRACE_SECONDS for the leader to exit. Members left behind
+        by the leader still get the final SIGKILL.
+        """
+        pgid = process.pid
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            if process.returncode is not None:
+                break
+            try:
+                os.killpg(pgid, sig)
+            except ProcessLookupError:
+                break
+            try:
+                await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Process group {pgid} still running after {sig.name}"
+                )
+
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        # SIGKILL reaches the leader's orphaned children asynchronously.
+        # Give them a moment to go, so a machine claim released after this
+        # is not handed to the next command while they still run. Zombies
+        # nobody reaps keep the group alive, hence the bound.
+        for _ in range(20):
+            try:
+                os.killpg(pgid, 0)
+            except ProcessLookupError:
+                break
+            await asyncio.sleep(0.025)
+        logger.info(f"Terminated process group {pgid}")
+
+    async def _terminate_all_processes(self) -> None:
+        """Stop every registered process group, e.g. on server shutdown"""
+        processes = list(self._processes.values())
+        if processes:
+            logger.info(
+                f"Terminating {len(processes)} running process group(s)"
+            )
+            await asyncio.gather(
+                *(self._terminate_process_group(p) for p in processes),
+                return_exceptions=True
+            )
+        self._processes.clear()
+
+    async def _execute_single_flight(
+        self, cmd: List[str], cwd: str, machine_readable: bool
+    ) -> RunOutput:
+        """
+        Run a read-only command, sharing one process between identical calls.
+
+        Calls are identical when they have the same working directory, argv
+        and Vagrant environment. The first caller starts the command as its
+        own task; callers arriving while it runs await the same task instead
+        of spawning another Ruby process. The task is shielded so one caller
+        being cancelled does not cancel it for the others; it is cancelled
+        (stopping the process) only when its last caller goes away.
+        """
+        vagrant_env = tuple(
+            sorted(
+                (key, value)
+                for key, value in os.environ.items()
+                if key.startswith("VAGRANT_")
+            )
+        )
+        key = (cwd, tuple(cmd), vagrant_env)
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._single_flight_stats["hits"] += 1
+        else:
+            self._single_flight_stats["misses"] += 1
+            task = asyncio.ensure_future(
+                self._execute(cmd, cwd, machine_readable)
+            )
+            self._in_flight[key] = task
+            self._in_flight_waiters[key] = 0
+
+            def forget(_: Any) -> None:
+                self._in_flight.pop(key, None)
+                self._in_flight_waiters.pop(key, None)
+            task.add_done_callback(forget)
+
+        self._in_flight_waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if key in self._in_flight_waiters:
+                self._in_flight_waiters[key] -= 1
+                if self._in_flight_waiters[key] == 0 and not task.done():
+                    task.cancel()
+
+    def _register_run(self, command: str) -> RunOutput:
+        """Create a RunOutput, evicting the oldest runs beyond RETAINED_RUNS"""
+        run = RunOutput(command)
+        self._runs[run.run_id] = run
+        # Runs still producing output are never evicted
+        for run_id in list(self._runs):
+            if len(self._runs) <= RETAINED_RUNS:
+                break
+            if self._runs[run_id].finished_at is not None:
+                self._runs.pop(run_id).close()
+        return run
+
+    def _run_excerpts(
+        self, run: RunOutput, max_output_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Build the result fields describing a run's captured output"""
+        if max_output_bytes is None:
+            max_output_bytes = DEFAULT_MAX_OUTPUT_BYTES
+        max_output_bytes = max(0, int(max_output_bytes))
+
+        fields: Dict[str, Any] = {"run_id": run.run_id, "truncated": False}
+        for stream_name in RunOutput.STREAMS:
+            capture = run.capture(stream_name)
+            text, truncated = capture.excerpt(max_output_bytes)
+            fields[stream_name] = text
+            fields[f"{stream_name}_bytes"] = capture.size
+            fields[f"{stream_name}_uri"] = run.uri(stream_name)
+            fields["truncated"] = fields["truncated"] or truncated
+        return fields
+
+    def _parsed_output(
+        self,
+        parser: MachineReadableParser,
+        result: Dict[str, Any],
+        max_output_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Build the result fields derived from machine-readable output.
+
+        The raw records stay available through the run's resources; the
+        result's stdout becomes the human-readable UI messages, and errors
+        Vagrant reported on stdout are folded into stderr.
+        """
+        if max_output_bytes is None:
+            max_output_bytes = DEFAULT_MAX_OUTPUT_BYTES
+        parser.close()
+
+        stdout, clipped = clip_text(
+            parser.text(), max(0, int(max_output_bytes))
+        )
+        fields: Dict[str, Any] = {
+            "stdout": stdout,
+            "truncated": result["truncated"] or clipped,
+            "event_count": parser.event_count
+        }
+        if parser.errors:
+            fields["error"] = "\n".join(parser.errors)
+            fields["stderr"] = "\n".join(
+                filter(None, [fields["error"], result["stderr"]])
+            )
+        machines = parser.machine_list()
+        if machines:
+            fields["machines"] = machines
+        return fields
+
+    def _tool_result(self, text: str, result: Dict[str, Any]) -> ToolResult:
+        """Return the text view together with the structured result"""
+        return [TextContent(type="text", text=text)], result
+
+    def _read_run_resource(self, uri: str) -> str:
+        """
+        Serve a byte range of a captured stream.
+
+        URIs have the form vagrant-run://<run_id>/<stream>?offset=&length=
+        and default to the first MAX_RESOURCE_READ_BYTES bytes.
+        """
+        parts = urlsplit(uri)
+        if parts.scheme != "vagrant-run":
+            raise ValueError(f"Unsupported resource URI: {uri}")
+
+        run = self._runs.get(parts.netloc)
+        if run is None:
+            raise ValueError(f"Unknown or expired run: {parts.netloc}")
+        capture = run.capture(parts.path.strip("/") or "stdout")
+
+        query = parse_qs(parts.query)
+        offset = int(query.get("offset", ["0"])[0] or 0)
+        length = int(
+            query.get("length", [str(MAX_RESOURCE_READ_BYTES)])[0]
+            or MAX_RESOURCE_READ_BYTES
+        )
+        length = min(length, MAX_RESOURCE_READ_BYTES)
+
+        return capture.read(offset, length).decode("utf-8", errors="replace")
+
+    def _format_result(
+        self,
+        title: str,
+        result: Dict[str, Any],
+        show_directory: bool = False,
+        details: Optional[List[str]] = None
+    ) -> str:
+        """
+        Format a command result as the text returned to the client.
+
+        details are extra "Key: value" lines added to the header.
+        """
+        response = f"{title}:\n"
+        response += f"Command: {result['command']}\n"
+        if show_directory:
+            directory = result.get("working_directory", "unknown")
+            response += f"Working Directory: {directory}\n"
+        response += f"Return Code: {result['return_code']}\n"
+        if result.get("skipped"):
+            response += (
+                f"Skipped: {result['skip_reason']}; nothing was run "
+                f"(machine states from {result['state_source']})\n"
+            )
+        if result.get("queue_wait_ms"):
+            response += f"Queue Wait: {result['queue_wait_ms']} ms\n"
+        for line in details or []:
+            response += f"{line}\n"
+
+        if result.get("truncated"):
+            response += (
+                f"Output truncated (stdout {result['stdout_bytes']} bytes, "
+                f"stderr {result['stderr_bytes']} bytes). Full output: "
+                f"{result['stdout_uri']} , {result['stderr_uri']} "
+                f"(append ?offset=&length= to read a range)\n"
+            )
+        response += "\n"
+
+        if result.get("termination"):
+            reason = (
+                "timed out"
+                if result["termination"] == "timed_out"
+                else "stalled (no output)"
+            )
+            response += f"Stopped by watchdog: {reason}\nLast output:\n"
+            response += "\n".join(result["last_lines"]) + "\n\n"
+
+        if result['success']:
+            response += f"Output:\n{result['stdout']}"
+        else:
+            response += f"Error:\n{result['stderr']}"
+        return response
+
+    def _progress_reporter(self) -> Optional[ProgressReporter]:
+        """
+        Build a callback that forwards command output to the current client.
+
+        Output is sent as progress notifications when the client supplied a
+        progress token, and as log messages otherwise. Returns None outside
+        of a request (e.g. when called from a background task).
+        """
+        try:
+            ctx = self.server.request_context
+        except LookupError:
+            return None
+
+        session = ctx.session
+        token = ctx.meta.progressToken if ctx.meta else None
+        counter = itertools.count(1)
+
+        async def report(stream_name: str, text: str) -> None:
+            try:
+                if token is not None:
+                    await session.send_progress_notification(
+                        token,
+                        next(counter),
+                        message=f"[{stream_name}] {text}",
+                        related_request_id=ctx.request_id
+                    )
+                else:
+                    await session.send_log_message(
+                        "warning" if stream_name == "stderr" else "info",
+                        text,
+                        logger="vagrant",
+                        related_request_id=ctx.request_id
+                    )
+            except Exception as e:
+                # A client that went away must not abort the command itself
+                logger.debug(f"Failed to send output notification: {e}")
+
+        return report
+
+    async def _pump_stream(
+        self,
+        reader: asyncio.StreamReader,
+        stream_name: str,
+        capture: OutputCapture,
+        reporter: Optional[ProgressReporter] = None,
+        parser: Optional[MachineReadableParser] = None
+    ) -> None:
+        """
+        Read a process pipe chunk by chunk into capture.
+
+        With a parser, chunks are fed to it as machine-readable records and
+        the reporter receives the UI messages they contain. Otherwise, when
+        a reporter is given, chunks are split into lines with an incremental
+        decoder, so multi-byte UTF-8 sequences split across chunk boundaries
+        are decoded correctly, and each chunk's worth of complete lines is
+        handed to reporter as a single notification.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+
+        while True:
+            chunk = await reader.read(STREAM_CHUNK_SIZE)
+            final = not chunk
+            capture.write(chunk)
+            if parser is not None:
+                events = parser.feed(chunk) if chunk else parser.close()
+                messages = [e["data"][-1] for e in events
+                            if e["type"] in ("ui", "raw") and e["data"]]
+                if reporter and messages:
+                    await reporter(stream_name, "\n".join(messages))
+                if final:
+                    return
+                continue
+            if reporter is None:
+                if final:
+                    return
+                continue
+
+            pending += decoder.decode(chunk, final=final)
+
+            # The last element is a partial line carried over to the next chunk
+            parts = pending.split("\n")
+            pending = parts.pop()
+            complete = parts
+            if pending and (final or len(pending) > STREAM_CHUNK_SIZE):
+                # Flush at EOF, and never let one unterminated line grow
+                # without bound
+                complete.append(pending)
+                pending = ""
+
+            if complete:
+                await reporter(stream_name, "\n".join(complete))
+
+            if final:
+                return
+
+    async def _vagrant_status(self, args: dict) -> ToolResult:
+        """Get vagrant machine status, from the status cache when fresh"""
+        directory = args.get("directory")
+        context = self._project(directory)
+        fresh = args.get("fresh", False)
+        # Excerpts of `vagrant status` output depend on the caller's limit,
+        # so a cached result only serves callers with the same one
+        max_output_bytes = args.get("max_output_bytes")
+        if max_output_bytes is None:
+            max_output_bytes = DEFAULT_MAX_OUTPUT_BYTES
+        max_output_bytes = max(0, int(max_output_bytes))
+
+        cached = None if fresh else context.cached_status(max_output_bytes)
+        if cached:
+            result, age_ms = cached
+        else:
+            age_ms = 0
+            excerpt = None
+            # fresh asks Vagrant itself, not the provider CLIs
+            result = None if fresh else await self._fast_status(context)
+            if result is None:
+                signature = file_signature(
+                    os.path.join(context.path, "Vagrantfile")
+                )
+                excerpt = max_output_bytes
+                result = await self._run_vagrant_command(
+                    ["status"], directory, max_output_bytes=max_output_bytes
+                )
+                if result['success']:
+                    result.setdefault("machines", [])
+                    self._vagrantfiles.store(
+                        context.path, result["machines"], signature
+                    )
+            if result['success']:
+                context.store_status(result, excerpt)
+
+        # A copy, so the cached result itself stays free of per-call fields
+        result = dict(result, cached=bool(cached), age_ms=age_ms)
+
+        response = self._format_result(
+            "Vagrant Status", result, show_directory=True,
+            details=[f"Cached: {'yes' if cached else 'no'} (age_ms: {age_ms})"]
+        )
+        return self._tool_result(response, result)
+
+    async def _fast_status(
+        self, context: ProjectContext
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Build a status result without running Vagrant.
+
+        Machine data is read from .vagrant/machines and only machines that
+        have an id are checked with the provider's own CLI. Returns None
+        whenever the answer cannot be trusted, so the caller falls back to
+        `vagrant status`.
+        """
+        if not STATUS_FAST_PATH:
+            return None
+        definitions = self._vagrantfiles.lookup(context.path)
+        if definitions is None:
+            return None
+        known_names = definitions["machines"]
+        cwd = context.path
+
+        machine_dirs = read_machine_dirs(cwd)
+        if machine_dirs is None:
+            return None
+        by_name = {m["name"]: m for m in machine_dirs}
+        if not known_names or any(name not in by_name for name in known_names):
+            return None
+        # Report machines in Vagrantfile order, as `vagrant status` does
+        machines = [by_name[name] for name in known_names]
+
+        # Machines without an id have never been created (or were
+        # destroyed), so only the others need a provider round trip
+        created = [m for m in machines if m["id"]]
+        states = await asyncio.gather(*(
+            self._provider_state(m["provider"], m["id"]) for m in created
+        ))
+        if None in states:
+            return None
+        for machine in machines:
+            machine["state"] = "not_created"
+        for machine, state in zip(created, states):
+            machine["state"] = state
+
+        return {
+            "command": "read .vagrant/machines (fast path)",
+            "return_code": 0,
+            "stdout": format_status_table(machines),
+            "stderr": "",
+            "success": True,
+            "working_directory": cwd,
+            "machines": machines
+        }
+
+    async def _provider_state(
+        self, provider: str, machine_id: str
+    ) -> Optional[str]:
+        """
+        Ask the provider CLI for the state of a created machine.
+
+        Returns a Vagrant state name, or None when the provider is
+        unsupported, failed, or gave an answer we cannot interpret.
+        """
+        template = PROVIDER_STATE_COMMANDS.get(provider)
+        if template is None:
+            return None
+        cmd = [part.format(id=machine_id) for part in template]
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await process.communicate()
+        except OSError as e:
+            logger.debug(f"Provider state check failed for {provider}: {e}")
+            return None
+
+        if process.returncode != 0:
+            return None
+
+        output = stdout.decode("utf-8", errors="replace")
+        if provider == "virtualbox":
+            match = VBOX_STATE_RE.search(output)
+            raw_state = match.group("state") if match else ""
+        else:
+            raw_state = output.strip()
+        return PROVIDER_STATE_NAMES[provider].get(raw_state)
+
+    def _invalidate_machine_state(
+        self, directory: Optional[str] = None, keep_checkpoints: bool = False
+    ) -> None:
+        """
+        Drop cached machine state after a command that may have changed it:
+        the status cache entry, the ssh connection details, which change
+        when a machine is recreated or its port forwards are reassigned,
+        and the checkpoint stacks, whose snapshots go away with a destroy
+        or a snapshot deleted by hand. Checkpoint tools, which keep their
+        stack up to date themselves, pass keep_checkpoints.
+        """
+        cwd = self._get_working_directory(directory)
+        if not keep_checkpoints:
+            self._forget_checkpoints(cwd)
+        context = self._projects.get(cwd)
+        if context is not None:
+            context.invalidate_status()
+        for key in [key for key in self._ssh_targets if key[0] == cwd]:
+            self._start_background(
+                self._close_ssh_target(self._ssh_targets.pop(key))
+            )
+        for key in [key for key in self._ssh_failed if key[0] == cwd]:
+            del self._ssh_failed[key]
+
+    def _forget_checkpoints(self, cwd: str) -> None:
+        """Drop the project's checkpoint stacks, rebuilt on next use"""
+        for key in [key for key in self._checkpoints if key[0] == cwd]:
+            del self._checkpoints[key]
+
+    async def _known_machine_states(
+        self, context: ProjectContext
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """
+        Machine states from the status cache or the status fast path, and
+        which of the two answered. Never runs Vagrant; returns (None, None)
+        when neither source can tell.
+
+        Cache entries are only used while at most LIFECYCLE_STATE_MAX_AGE
+        old; after that the fast path asks the provider for the live state,
+        so a machine stopped behind the server's back is not reported as
+        still running.
+        """
+        cached = context.cached_status()
+        if cached is not None and cached[1] <= LIFECYCLE_STATE_MAX_AGE * 1000:
+            return cached[0]["machines"], f"status cache, age {cached[1]} ms"
+        status = await self._fast_status(context)
+        if status is None:
+            return None, None
+        context.store_status(status)
+        return status["machines"], "fast path"
+
+    async def _plan_lifecycle_command(
+        self, command: str, cmd_args: List[str], args: dict, title: str
+    ) -> Optional[ToolResult]:
+        """
+        Plan a lifecycle command before running it.
+
+        With dry_run, the planned action per machine is returned and nothing
+        runs. Otherwise a result marked skipped is returned when the known
+        machine states show the command would change nothing, and None when
+        it has to run. Unknown states, machine names Vagrant would have to
+        resolve (regexes, ids) and machines with commands pending never skip.
+        """
+        dry_run = args.get("dry_run", False)
+        if command == "provision" and not dry_run:
+            return None
+        try:
+            context = self._project(args.get("directory"))
+        except ValueError:
+            # Reported by the command run itself
+            return None
+        if context.vagrantfile is None:
+            return None
+
+        name = args.get("machine_name")
+        states, source = await self._known_machine_states(context)
+        plan = None
+        if states is not None:
+            if name:
+                states = [m for m in states if m["name"] == name]
+            if states:
+                plan = plan_lifecycle(command, states)
+        pending = self._scheduler.busy(
+            context.path, frozenset([name]) if name else None
+        )
+        command_line = " ".join(["vagrant"] + cmd_args)
+
+        if dry_run:
+            self._plan_stats["dry_runs"] += 1
+            would_run = (
+                plan is None or pending or any(e["action"] for e in plan)
+            )
+            result = {
+                "command": command_line,
+                "dry_run": True,
+                "would_run": would_run,
+                "state_source": source,
+                "pending_commands": pending,
+                "plan": plan,
+                "working_directory": context.path
+            }
+            response = f"{title} (dry run):\nCommand: {command_line}\n"
+            response += f"Would run: {'yes' if would_run else 'no'}\n"
+            source = source or "unknown (Vagrant would be asked)"
+            response += f"Machine states: {source}\n"
+            if pending:
+                response += (
+                    "Other commands on these machines are running or queued; "
+                    "states may change first\n"
+                )
+            if plan is not None:
+                response += "\n" + format_plan_table(plan)
+            return self._tool_result(response, result)
+
+        if plan is None or pending or any(entry["action"] for entry in plan):
+            return None
+        self._plan_stats["skipped"] += 1
+        reasons = sorted({entry["skip_reason"] for entry in plan})
+        result = {
+            "command": command_line,
+            "return_code": 0,
+            "stdout": "".join(
+                f"{e['machine']}: {e['skip_reason']}\n" for e in plan
+            ),
+            "stderr": "",
+            "success": True,
+            "working_directory": context.path,
+            "skipped": True,
+            "skip_reason": (
+                reasons[0] if len(reasons) == 1 else "nothing to do"
+            ),
+            "state_source": source,
+            "plan": plan
+        }
+        response = self._format_result(title, result)
+        return self._tool_result(response, result)
+
+    async def _vagrant_up(self, args: dict) -> ToolResult:
+        """Start vagrant machines"""
+        cmd_args = ["up"]
+        
+        if args.get("machine_name"):
+            cmd_args.append(args["machine_name"])
+            
+        if args.get("provider"):
+            cmd_args.extend(["--provider", args["provider"]])
+            
+        if args.get("provision", True) is False:
+            cmd_args.append("--no-provision")
+
+        if args.get("fast", False) and await self._can_go_fast("up", args):
+            return await self._vagrant_resume(args, replaces="up")
+
+        planned = await self._plan_lifecycle_command(
+            "up", cmd_args, args, "Vagrant Up"
+        )
+        if planned is not None:
+            return planned
+
+        result = await self._run_timed_command(
+            "up", cmd_args, args, stream=True
+        )
+
+        self._invalidate_machine_state(args.get("directory"))
+        response = self._format_result(
+            "Vagrant Up", result,
+            details=self._timing_details("up", args, result)
+        )
+        return self._tool_result(response, result)
+
+    async def _vagrant_up_graph(self, args: dict) -> ToolResult:
+        """
+        Bring up machines in dependency order.
+
+        Each machine starts as soon as all machines it depends on are up
+        and healthy, with at most `concurrency` `vagrant up` commands
+        running at once, so the total time approaches the longest chain of
+        the graph rather than the sum of all machines. A machine whose
+        start or health check fails blocks its dependents; independent
+        machines carry on.
+
+        timeout_s bounds the whole call rather than each command: every
+        `vagrant up` and health check is limited to what is left of it, and
+        machines still waiting when it runs out are not started.
+        """
+        directory = args.get("directory")
+        context = self._project(directory)
+        spec, source = args.get("graph"), "argument"
+        if spec is None:
+            source = UP_GRAPH_FILE
+            try:
+                with open(os.path.join(context.path, UP_GRAPH_FILE)) as f:
+                    spec = json.load(f)
+            except FileNotFoundError:
+                raise ValueError(
+                    f"graph parameter or a {UP_GRAPH_FILE} file in the "
+                    "project is required"
+                )
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Cannot read {UP_GRAPH_FILE}: {e}")
+        graph = parse_up_graph(spec)
+        levels = graph_levels(graph)
+        self._check_machine_names(
+            {"directory": directory, "machines": list(graph)}
+        )
+        concurrency = int(args.get("concurrency") or UP_GRAPH_CONCURRENCY)
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        health_timeout = float(
+            args.get("health_timeout_s") or HEALTH_CHECK_TIMEOUT_SECONDS
+        )
+
+        if args.get("dry_run", False):
+            return await self._up_graph_plan(context, graph, levels, source)
+
+        reporter = self._progress_reporter()
+        semaphore = asyncio.Semaphore(concurrency)
+        began = time.monotonic()
+        timeout, stall_timeout = CALL_LIMITS.get()
+        graph_deadline = began + timeout if timeout else None
+        nodes = {
+            machine: {
+                "machine": machine,
+                "after": graph[machine]["after"],
+                "status": "pending"
+            }
+            for level in levels for machine in level
+        }
+        finished: Dict[str, float] = {}
+
+        def elapsed_ms() -> int:
+            return int((time.monotonic() - began) * 1000)
+
+        async def report(machine: str, text: str) -> None:
+            if reporter:
+                await reporter(machine, text)
+
+        async def bring_up(machine: str) -> bool:
+            node = nodes[machine]
+            if not all(
+                await asyncio.gather(*(tasks[dep] for dep in node["after"]))
+            ):
+                node["status"] = "blocked"
+                await report(machine, "blocked by a failed dependency")
+                return False
+            ready_ms = elapsed_ms()
+            async with semaphore:
+                node["start_ms"] = elapsed_ms()
+                node["wait_ms"] = node["start_ms"] - ready_ms
+                if graph_deadline is not None:
+                    left = graph_deadline - time.monotonic()
+                    if left <= 0:
+                        node["status"] = "timed_out"
+                        await report(machine, "not started: timeout_s reached")
+                        return False
+                    # This task's own context: other machines keep theirs
+                    CALL_LIMITS.set((left, stall_timeout))
+                await report(machine, "starting")
+                _, result = await self._vagrant_up({
+                    "directory": directory, "machine_name": machine,
+                    "provider": args.get("provider"),
+                    "provision": args.get("provision", True),
+                    "max_output_bytes": args.get("max_output_bytes")
+                })
+                node["up_ms"] = elapsed_ms() - node["start_ms"]
+            node["return_code"] = result["return_code"]
+            for key in ("stdout_uri", "stderr_uri", "termination"):
+                if result.get(key):
+                    node[key] = result[key]
+            if not result["success"]:
+                node["status"] = "failed"
+                node["error"] = "\n".join(
+                    (result["stderr"] or result["stdout"])
+                    .strip()
+                    .splitlines()[-WATCHDOG_LAST_LINES:]
+                )
+                await report(
+                    machine,
+                    f"vagrant up failed (exit {result['return_code']})"
+                )
+                return False
+            node["status"] = (
+                "already running" if result.get("skipped") else "up"
+            )
+
+            health = graph[machine]["health"]
+            if health:
+                checked_from = time.monotonic()
+                deadline = checked_from + health_timeout
+                graph_bound = (
+                    graph_deadline is not None and graph_deadline < deadline
+                )
+                if graph_bound:
+                    deadline = graph_deadline
+                node["health_attempts"] = 0
+                while True:
+                    node["health_attempts"] += 1
+                    # Bound each attempt by what is left of the health timeout
+                    CALL_LIMITS.set(
+                        (max(1.0, deadline - time.monotonic()), None)
+                    )
+                    check = await self._ssh_command(
+                        health, directory, machine, 4096
+                    )
+                    if check["success"]:
+                        break
+                    now = time.monotonic()
+                    if now + HEALTH_CHECK_INTERVAL_SECONDS >= deadline:
+                        node["health_ms"] = int((now - checked_from) * 1000)
+                        node["status"] = (
+                            "timed_out" if graph_bound else "unhealthy"
+                        )
+                        node["error"] = (
+                            check["stderr"] or check["stdout"]
+                        ).strip()[-1000:]
+                        await report(
+                            machine,
+                            "health check still failing after "
+                            f"{node['health_attempts']} attempts"
+                        )
+                        return False
+                    await asyncio.sleep(HEALTH_CHECK_INTERVAL_SECONDS)
+                node["health_ms"] = int(
+                    (time.monotonic() - checked_from) * 1000
+                )
+
+            node["done_ms"] = elapsed_ms()
+            finished[machine] = node["done_ms"]
+            await report(
+                machine,
+                f"{node['status']} after {node['done_ms'] / 1000:.1f} s"
+            )
+            return True
+
+        # Dependencies come first in level order, so each task can await
+        # the tasks of its dependencies
+        tasks: Dict[str, "asyncio.Task[bool]"] = {}
+        for level in levels:
+            for machine in level:
+                tasks[machine] = asyncio.ensure_future(bring_up(machine))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        path = critical_path(graph, finished)
+        serial_ms = sum(
+            node.get("up_ms", 0) + node.get("health_ms", 0)
+            for node in nodes.values()
+        )
+        summary = {
+            "graph_source": source,
+            "levels": levels,
+            "concurrency": concurrency,
+            "success": all(
+                node["status"] in ("up", "already running")
+                for node in nodes.values()
+            ),
+            "timed_out": any(
+                node["status"] == "timed_out"
+                or node.get("termination") == "timed_out"
+                for node in nodes.values()
+            ),
+            "duration_ms": elapsed_ms(),
+            "serial_ms": serial_ms,
+            "critical_path": path,
+            "critical_path_ms": finished[path[-1]] if path else 0,
+            "machines": list(nodes.values())
+        }
+
+        response = (
+            "Vagrant Up Graph:\n"
+            f"Graph: {source} ({len(nodes)} machines, {len(levels)} levels)\n"
+            f"Concurrency: {concurrency}\n"
+            f"Wall Clock: {summary['duration_ms'] / 1000:.1f} s (machines one "
+            f"after another: {serial_ms / 1000:.1f} s)\n"
+            f"Critical Path: {' -> '.join(path) or 'none'}\n\n"
+        )
+        rows = [("MACHINE", "STATUS", "START", "UP", "HEALTH", "DONE")]
+        for node in nodes.values():
+            rows.append((node["machine"], node["status"]) + tuple(
+                f"{node[key] / 1000:.1f} s" if key in node else "-"
+                for key in ("start_ms", "up_ms", "health_ms", "done_ms")
+            ))
+        widths = [
+            max(len(row[i]) for row in rows) for i in range(len(rows[0]))
+        ]
+        for row in rows:
+            response += "  ".join(
+                cell.ljust(width) for cell, width in zip(row, widths)
+            ).rstrip() + "\n"
+        for node in nodes.values():
+            if node.get("error"):
+                response += (
+                    f"\n{node['machine']} ({node['status']}):\n"
+                    f"{node['error']}\n"
+                )
+        return self._tool_result(response, summary)
+
+    async def _up_graph_plan(
+        self,
+        context: ProjectContext,
+        graph: Dict[str, Dict[str, Any]],
+        levels: List[List[str]],
+        source: str
+    ) -> ToolResult:
+        """Describe what vagrant_up_graph would do, level by level"""
+        self._plan_stats["dry_runs"] += 1
+        states, state_source = await self._known_machine_states(context)
+        known = {machine["name"]: machine for machine in states or []}
+        plan = {
+            entry["machine"]: entry
+            for entry in plan_lifecycle("up", [
+                known.get(machine, {"name": machine})
+                for level in levels for machine in level
+            ])
+        }
+        result = {
+            "dry_run": True,
+            "graph_source": source,
+            "levels": levels,
+            "state_source": state_source,
+            "plan": [dict(plan[machine], after=graph[machine]["after"],
+                          health=graph[machine]["health"])
+                     for level in levels for machine in level]
+        }
+        response = (
+            "Vagrant Up Graph (dry run):\n"
+            f"Graph: {source} ({len(plan)} machines, {len(levels)} levels)\n"
+            f"Machine states: {state_source or 'unknown'}\n\n"
+        )
+        for number, level in enumerate(levels, 1):
+            response += f"Level {number}:\n"
+            for machine in level:
+                entry = plan[machine]
+                action = entry["action"] or f"none ({entry['skip_reason']})"
+                response += f"  {machine} [{entry['state']}]: {action}"
+                if graph[machine]["after"]:
+                    response += f", after {', '.join(graph[machine]['after'])}"
+                if graph[machine]["health"]:
+                    response += f", health: {graph[machine]['health']}"
+                response += "\n"
+        return self._tool_result(response, result)
+
+    async def _vagrant_halt(self, args: dict) -> ToolResult:
+        """Halt vagrant machines"""
+        cmd_args = ["halt"]
+        
+        if args.get("machine_name"):
+            cmd_args.append(args["machine_name"])
+            
+        if args.get("force", False):
+            cmd_args.append("--force")
+
+        if args.get("fast", False) and await self._can_go_fast("halt", args):
+            return await self._vagrant_suspend(args, replaces="halt")
+
+        planned = await self._plan_lifecycle_command(
+            "halt", cmd_args, args, "Vagrant Halt"
+        )
+        if planned is not None:
+            return planned
+
+        result = await self._run_timed_command("halt", cmd_args, args)
+        
+        self._invalidate_machine_state(args.get("directory"))
+        response = self._format_result(
+            "Vagrant Halt", result,
+            details=self._timing_details("halt", args, result)
+        )
+        return self._tool_result(response, result)
+
+    async def _vagrant_suspend(
+        self, args: dict, replaces: Optional[str] = None
+    ) -> ToolResult:
+        """
+        Suspend vagrant machines. replaces names the command this stands in
+        for when called for a fast halt.
+        """
+        return await self._suspend_or_resume("suspend", args, replaces)
+
+    async def _vagrant_resume(
+        self, args: dict, replaces: Optional[str] = None
+    ) -> ToolResult:
+        """
+        Resume suspended vagrant machines. replaces names the command this
+        stands in for when called for a fast up.
+        """
+        return await self._suspend_or_resume("resume", args, replaces)
+
+    async def _suspend_or_resume(
+        self, operation: str, args: dict, replaces: Optional[str]
+    ) -> ToolResult:
+        """Run `vagrant suspend` or `vagrant resume` and report its timing"""
+        title = f"Vagrant {operation.title()}"
+        cmd_args = [operation]
+        if args.get("machine_name"):
+            cmd_args.append(args["machine_name"])
+
+        planned = await self._plan_lifecycle_command(
+            operation, cmd_args, args, title
+        )
+        if planned is not None:
+            return planned
+
+        result = await self._run_timed_command(
+            operation, cmd_args, args, stream=operation == "resume"
+        )
+        self._invalidate_machine_state(args.get("directory"))
+        details = self._timing_details(operation, args, result)
+        if replaces:
+            result["fast"] = True
+            result["replaces"] = replaces
+            details.insert(0, f"Fast: {operation} instead of {replaces}")
+        response = self._format_result(title, result, details=details)
+        return self._tool_result(response, result)
+
+    async def _can_go_fast(self, command: str, args: dict) -> bool:
+        """
+        Whether a fast up or halt can be served by resume or suspend: for
+        up, every targeted machine is suspended or already running (and at
+        least one is suspended); for halt, every targeted machine runs on a
+        provider that can suspend, or is already suspended. Machine states
+        come from the status cache or fast path; when they are unknown the
+        normal command runs.
+        """
+        try:
+            context = self._project(args.get("directory"))
+        except ValueError:
+            return False
+        states, _ = await self._known_machine_states(context)
+        name = args.get("machine_name")
+        targets = [m for m in states or [] if not name or m["name"] == name]
+        if not targets:
+            return False
+        if command == "up":
+            return (
+                all(m["state"] in SUSPENDED_STATES + ("running",)
+                    for m in targets)
+                and any(m["state"] in SUSPENDED_STATES for m in targets)
+            )
+        return (
+            all(m["state"] in SUSPENDED_STATES
+                or (m["state"] == "running"
+                    and m.get("provider") in SUSPEND_PROVIDERS)
+                for m in targets)
+            and any(m["state"] == "running" for m in targets)
+        )
+
+    async def _run_timed_command(
+        self,
+        operation: str,
+        cmd_args: List[str],
+        args: dict,
+        stream: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run a lifecycle command and record its duration for the machine
+        (or "*" for the whole project) in the duration history.
+        """
+        began = time.monotonic()
+        result = await self._run_vagrant_command(
+            cmd_args, args.get("directory"), stream=stream,
+            max_output_bytes=args.get("max_output_bytes")
+        )
+        seconds = time.monotonic() - began
+        result["duration_ms"] = int(seconds * 1000)
+        if result.get("working_directory") and not result.get("termination"):
+            self._durations.record(
+                result["working_directory"], args.get("machine_name") or "*",
+                operation, seconds, result["success"]
+            )
+        return result
+
+    def _timing_details(
+        self, operation: str, args: dict, result: Dict[str, Any]
+    ) -> List[str]:
+        """
+        The Duration line of a lifecycle result, with the typical durations
+        of the operation and its fast counterpart when both are known.
+        """
+        line = f"Duration: {result['duration_ms'] / 1000:.1f} s"
+        cwd = result.get("working_directory")
+        if cwd:
+            machine = args.get("machine_name") or "*"
+            counterpart = FAST_COUNTERPARTS[operation]
+            mine = self._durations.get(cwd, machine, operation) or {}
+            other = self._durations.get(cwd, machine, counterpart) or {}
+            if mine.get("seconds") and other.get("seconds"):
+                line += (
+                    f" (typical {operation} {mine['seconds']:.1f} s, "
+                    f"{counterpart} {other['seconds']:.1f} s)"
+                )
+        return [line]
+
+    async def _vagrant_destroy(self, args: dict) -> ToolResult:
+        """Destroy vagrant machines"""
+        cmd_args = ["destroy"]
+        
+        if args.get("machine_name"):
+            cmd_args.append(args["machine_name"])
+            
+        # Machine-readable mode cannot answer the confirmation prompt, so
+        # the caller has to confirm up front
+        if not args.get("force", False) and not args.get("dry_run", False):
+            raise ValueError(
+                "force must be true to destroy machines: the server cannot "
+                "answer Vagrant's confirmation prompt"
+            )
+        cmd_args.append("--force")
+
+        planned = await self._plan_lifecycle_command(
+            "destroy", cmd_args, args, "Vagrant Destroy"
+        )
+        if planned is not None:
+            return planned
+
+        result = await self._run_vagrant_command(
+            cmd_args, args.get("directory"),
+            max_output_bytes=args.get("max_output_bytes")
+        )
+        
+        self._invalidate_machine_state(args.get("directory"))
+        response = self._format_result("Vagrant Destroy", result)
+        return self._tool_result(response, result)
+
+    async def _vagrant_ssh(self, args: dict) -> ToolResult:
+        """Execute SSH commands on vagrant machines"""
+        if not args.get("command"):
+            raise ValueError("command parameter is required")
+
+        result = await self._ssh_command(
+            args["command"], args.get("directory"), args.get("machine_name"),
+            args.get("max_output_bytes")
+        )
+        response = self._format_result("Vagrant SSH Command", result)
+        return self._tool_result(response, result)
+
+    async def _ssh_command(
+        self,
+        command: str,
+        directory: Optional[str],
+        machine_name: Optional[str],
+        max_output_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Run a command on a machine over SSH.
+
+        Commands go straight to the system ssh client over a shared master
+        connection when the machine's ssh-config is available, and through
+        `vagrant ssh -c` otherwise.
+        """
+        target = await self._ssh_target(directory, machine_name)
+        if target is not None:
+            self._ssh_stats["direct"] += 1
+            cwd = self._get_working_directory(directory)
+            cmd = target.command(command)
+            run = await self._execute(cmd, cwd, machine_readable=False)
+            result = self._build_result(cmd, cwd, run, max_output_bytes)
+            result["transport"] = "openssh"
+            return result
+
+        self._ssh_stats["cli"] += 1
+        cmd_args = ["ssh"]
+        if machine_name:
+            cmd_args.append(machine_name)
+        cmd_args.extend(["-c", command])
+
+        result = await self._run_vagrant_command(
+            cmd_args, directory, max_output_bytes=max_output_bytes
+        )
+        result["transport"] = "vagrant"
+        return result
+
+    async def _vagrant_ssh_multi(self, args: dict) -> ToolResult:
+        """
+        Execute a command on several machines at once.
+
+        Machines are taken from the machines argument or selected from the
+        running machines in `vagrant status` by glob or regex. A progress
+        message is sent as each machine finishes, and machines that produced
+        identical output are reported together.
+        """
+        if not args.get("command"):
+            raise ValueError("command parameter is required")
+        directory = args.get("directory")
+        concurrency = int(args.get("concurrency") or SSH_MULTI_CONCURRENCY)
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        machines, skipped = await self._select_machines(args)
+
+        await self._prefetch_ssh_targets(directory, machines)
+
+        reporter = self._progress_reporter()
+        semaphore = asyncio.Semaphore(concurrency)
+        done = itertools.count(1)
+
+        async def run_on(machine: str) -> Dict[str, Any]:
+            async with semaphore:
+                started = time.monotonic()
+                result = await self._ssh_command(
+                    args["command"], directory, machine,
+                    args.get("max_output_bytes")
+                )
+                result["machine"] = machine
+                result["duration_ms"] = int(
+                    (time.monotonic() - started) * 1000
+                )
+            if reporter:
+                await reporter(
+                    machine,
+                    f"exit {result['return_code']} in "
+                    f"{result['duration_ms']} ms "
+                    f"({next(done)}/{len(machines)})"
+                )
+            return result
+
+        results = await asyncio.gather(
+            *(run_on(machine) for machine in machines)
+        )
+
+        groups: Dict[Tuple, Dict[str, Any]] = {}
+        for result in results:
+            key = (result["return_code"], result.get("termination"),
+                   result["stdout"], result["stderr"])
+            group = groups.setdefault(key, {
+                "machines": [],
+                "return_code": result["return_code"],
+                "success": result["success"],
+                "stdout": result["stdout"],
+                "stderr": result["stderr"]
+            })
+            group["machines"].append(result["machine"])
+
+        summary = {
+            "command": args["command"],
+            "machines": machines,
+            "skipped": skipped,
+            "concurrency": concurrency,
+            "success": all(result["success"] for result in results),
+            "results": [
+                {key: result.get(key) for key in (
+                    "machine", "return_code", "success", "transport",
+                    "duration_ms", "termination", "stdout_uri", "stderr_uri"
+                )}
+                for result in results
+            ],
+            "groups": list(groups.values())
+        }
+
+        response = (
+            f"Vagrant SSH Multi:\nCommand: {args['command']}\n"
+            f"Machines: {len(machines)} (concurrency {concurrency})\n"
+        )
+        if skipped:
+            response += f"Skipped (not running): {', '.join(skipped)}\n"
+        response += "\n" + format_ssh_multi_table(summary["groups"])
+        for number, group in enumerate(summary["groups"], 1):
+            response += f"\nGroup {number} ({', '.join(group['machines'])}):\n"
+            response += (
+                group["stdout"]
+                if group["success"]
+                else group["stderr"] or group["stdout"]
+            )
+            if not response.endswith("\n"):
+                response += "\n"
+        return self._tool_result(response, summary)
+
+    async def _select_machines(
+        self, args: dict
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Resolve the machines a multi-machine tool should act on.
+
+        Returns the selected machine names and the names that matched the
+        pattern but were skipped because they are not running.
+        """
+        if args.get("machines"):
+            return list(dict.fromkeys(args["machines"])), []
+
+        pattern, regex = args.get("pattern"), args.get("regex")
+        if not pattern and not regex:
+            raise ValueError("one of machines, pattern or regex is required")
+        try:
+            compiled = re.compile(regex) if regex else None
+        except re.error as e:
+            raise ValueError(f"Invalid regex: {e}")
+
+        _, status = await self._vagrant_status(
+            {"directory": args.get("directory")}
+        )
+        if not status["success"]:
+            raise ValueError(
+                f"Could not list machines: {status['stderr'].strip()}"
+            )
+
+        selected, skipped = [], []
+        for machine in status["machines"]:
+            name = machine["name"]
+            if pattern and not fnmatch.fnmatchcase(name, pattern):
+                continue
+            if compiled and not compiled.search(name):
+                continue
+            (
+                selected if machine.get("state") == "running" else skipped
+            ).append(name)
+        if not selected:
+            raise ValueError("No running machine matches the selection")
+        return selected, skipped
+
+    async def _ssh_target(
+        self, directory: Optional[str], machine_name: Optional[str]
+    ) -> Optional[SshTarget]:
+        """
+        Return a ready SshTarget for the machine, or None to use the CLI.
+
+        The ssh-config is fetched once per machine and cached until the
+        machine state changes. Before the first command a master connection
+        is opened; if that fails (stale config, machine down) the target is
+        dropped and the caller falls back to `vagrant ssh`, without the
+        command having run anywhere.
+
+        Failures are remembered for SSH_RETRY_SECONDS, during which the
+        machine's commands use `vagrant ssh` right away: otherwise each of
+        them would start Vagrant twice (ssh-config, then ssh -c) and the
+        fallback would be slower than never trying.
+        """
+        if not SSH_DIRECT or self._ssh_missing:
+            return None
+        cwd = self._get_working_directory(directory)
+        key = (cwd, machine_name or "")
+        if self._ssh_recently_failed(key):
+            self._ssh_stats["skipped_retries"] += 1
+            return None
+
+        target = self._ssh_targets.get(key)
+        if target is None:
+            config_args = ["ssh-config"] + (
+                [machine_name] if machine_name else []
+            )
+            result = await self._run_vagrant_command(config_args, directory)
+            hosts = (
+                parse_ssh_config_hosts(result["stdout"])
+                if result["success"]
+                else {}
+            )
+            if len(hosts) != 1:
+                # Machine not reachable, or a multi-machine project without
+                # a machine name: let `vagrant ssh` run or report the error
+                self._ssh_failed[key] = time.monotonic()
+                return None
+            target = self._add_ssh_target(key, *next(iter(hosts.items())))
+
+        if await self._ensure_ssh_master(target):
+            return target
+
+        logger.info(
+            f"Direct ssh to {target.host} failed, falling back to vagrant ssh"
+        )
+        self._ssh_stats["fallbacks"] += 1
+        self._ssh_failed[key] = time.monotonic()
+        if self._ssh_targets.get(key) is target:
+            del self._ssh_targets[key]
+        await self._close_ssh_target(target)
+        return None
+
+    def _ssh_recently_failed(self, key: Tuple[str, str]) -> bool:
+        """Whether direct ssh failed for key less than SSH_RETRY_SECONDS ago"""
+        failed_at = self._ssh_failed.get(key)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < SSH_RETRY_SECONDS:
+            return True
+        del self._ssh_failed[key]
+        return False
+
+    def _add_ssh_target(
+        self, key: Tuple[str, str], host: str, config_text: str
+    ) -> SshTarget:
+        """Cache a target, keeping the one of a call that won the race"""
+        if key not in self._ssh_targets:
+            self._ssh_targets[key] = SshTarget(
+                self._ssh_runtime_dir, config_text, host
+            )
+        return self._ssh_targets[key]
+
+    async def _prefetch_ssh_targets(
+        self, directory: Optional[str], machines: List[str]
+    ) -> None:
+        """
+        Fetch the ssh-config of several machines with a single Vagrant run.
+
+        Without a machine name `vagrant ssh-config` prints a Host block per
+        machine. If it fails (e.g. one machine is not running) nothing is
+        cached and each machine's config is fetched on its own later.
+        """
+        cwd = self._get_working_directory(directory)
+        missing = [
+            m for m in machines
+            if (cwd, m) not in self._ssh_targets
+            and not self._ssh_recently_failed((cwd, m))
+        ]
+        if not SSH_DIRECT or self._ssh_missing or len(missing) < 2:
+            return
+        result = await self._run_vagrant_command(["ssh-config"], directory)
+        if not result["success"]:
+            return
+        for host, config_text in parse_ssh_config_hosts(
+            result["stdout"]
+        ).items():
+            if host in missing:
+                self._add_ssh_target((cwd, host), host, config_text)
+
+    async def _ensure_ssh_master(self, target: SshTarget) -> bool:
+        """Make sure a master connection for target is running"""
+        async with target.lock:
+            return await self._start_ssh_master(target)
+
+    async def _start_ssh_master(self, target: SshTarget) -> bool:
+        """
+        Check for a master connection and start one if there is none.
+
+        If the ssh client cannot be run at all (e.g. openssh-client is not
+        installed), direct ssh is switched off for the rest of the server's
+        life and False is returned, so callers use `vagrant ssh`.
+        """
+        try:
+            check = await asyncio.create_subprocess_exec(
+                *target.ssh_args("-O", "check", target.host),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            if await check.wait() == 0:
+                return True
+
+            # -f backgrounds the master once it is authenticated. Its stdio
+            # goes to /dev/null so it never holds a command's pipes open.
+            master = await asyncio.create_subprocess_exec(
+                *target.ssh_args(
+                    "-o", "ControlMaster=yes",
+                    "-o", f"ControlPersist={SSH_CONTROL_PERSIST_SECONDS}",
+                    "-o", "ConnectTimeout=10",
+                    "-f", "-N", target.host
+                ),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True
+            )
+        except OSError as e:
+            logger.warning(f"Cannot run ssh ({e}), using vagrant ssh instead")
+            self._ssh_missing = True
+            return False
+        try:
+            return await asyncio.wait_for(master.wait(), 30) == 0
+        except asyncio.TimeoutError:
+            master.kill()
+            return False
+
+    async def _close_ssh_target(self, target: SshTarget) -> None:
+        """Stop the master connection of target and delete its config"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *target.ssh_args("-O", "exit", target.host),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            await process.wait()
+        except OSError as e:
+            logger.debug(f"Could not stop ssh master for {target.host}: {e}")
+        target.remove()
+
+    def _start_background(self, coro: Awaitable[Any]) -> "asyncio.Task[Any]":
+        """Run a coroutine as a task nobody awaits, keeping a reference"""
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def _start_background_detached(
+        self, coro: Awaitable[Any]
+    ) -> "asyncio.Task[Any]":
+        """
+        Like _start_background, but in an empty context: the task does not
+        see (or report progress to) the request that started it
+        """
+        return contextvars.Context().run(self._start_background, coro)
+
+    async def _vagrant_ssh_batch(self, args: dict) -> ToolResult:
+        """
+        Run several commands on one machine with a single connection.
+
+        The commands are sent as one generated script to a shell on the
+        guest (see build_batch_script) and each command's output is read up
+        to its sentinel into a run of its own, so each gets its own exit
+        code, duration, output excerpt and resource URIs.
+        """
+        commands = args.get("commands")
+        if not commands or not isinstance(commands, list):
+            raise ValueError("commands must be a non-empty list of strings")
+        if not all(
+            isinstance(command, str) and command.strip()
+            for command in commands
+        ):
+            raise ValueError("commands must be non-empty strings")
+        directory = args.get("directory")
+        machine = args.get("machine_name")
+        stop_on_failure = bool(args.get("stop_on_failure", False))
+        cwd = self._get_working_directory(directory)
+
+        cmd, transport = await self._guest_shell_command(
+            directory, machine, BATCH_SHELL_COMMAND
+        )
+        sentinel = f"__VAGRANT_MCP_{uuid.uuid4().hex}"
+        timeout, stall_timeout = CALL_LIMITS.get()
+        deadline = time.monotonic() + timeout if timeout else None
+        started = time.monotonic()
+
+        entries: List[Dict[str, Any]] = []
+        async with self._running_process(
+            cmd, cwd, asyncio.subprocess.PIPE, grace=TERMINATE_GRACE_SECONDS
+        ) as process:
+            readers = (
+                SentinelReader(process.stdout),
+                SentinelReader(process.stderr)
+            )
+            preamble = RunOutput(" ".join(cmd))
+            try:
+                process.stdin.write(
+                    build_batch_script(commands, sentinel, stop_on_failure)
+                )
+                await process.stdin.drain()
+                process.stdin.close()
+                ended = await self._copy_framed_output(
+                    readers, preamble, f"\n{sentinel}:start:".encode(),
+                    timeout, stall_timeout
+                ) is None
+                stuck = preamble.termination is not None
+            finally:
+                preamble.close()
+
+            for index, command in enumerate(commands):
+                entry: Dict[str, Any] = {"index": index, "command": command}
+                entries.append(entry)
+                if ended:
+                    entry.update(status="skipped", success=False)
+                    continue
+
+                run = self._register_run(command)
+                remaining = (
+                    max(deadline - time.monotonic(), 0.001) if deadline
+                    else None
+                )
+                status = await self._copy_framed_output(
+                    readers, run, f"\n{sentinel}:{index}:".encode(),
+                    remaining, stall_timeout
+                )
+                run.finished_at = time.time()
+                fields = (
+                    status.decode(errors="replace").split(":") if status
+                    else []
+                )
+                aborted = status is None and run.termination is None
+                if len(fields) == 3:
+                    run.return_code = int(fields[0])
+                    if fields[1].isdigit() and fields[2].isdigit():
+                        entry["duration_ms"] = round(
+                            (int(fields[2]) - int(fields[1])) / 1000, 1
+                        )
+                elif aborted:
+                    # The shell went away mid-command, e.g. the command ran
+                    # `exit N`: ssh exits with the shell's status, which is
+                    # the command's
+                    try:
+                        await asyncio.wait_for(
+                            process.wait(), TERMINATE_GRACE_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    run.return_code = process.returncode
+                entry.update(self._build_result(
+                    [command], cwd, run,
+                    max_output_bytes=args.get("max_output_bytes")
+                ))
+                for key in ("command", "working_directory", "queue_wait_ms"):
+                    entry.pop(key, None)
+                entry["command"] = command
+
+                if run.termination:
+                    entry["status"] = run.termination
+                    ended = stuck = True
+                elif aborted:
+                    entry["status"] = "aborted"
+                    ended = True
+                else:
+                    entry["status"] = (
+                        "ok" if run.return_code == 0 else "failed"
+                    )
+                    ended = stop_on_failure and run.return_code != 0
+
+            if stuck:
+                await self._terminate_process_group(process)
+
+        result = {
+            "machine": machine,
+            "transport": transport,
+            "stop_on_failure": stop_on_failure,
+            "success": all(entry["status"] == "ok" for entry in entries),
+            "duration_ms": int((time.monotonic() - started) * 1000),
+            "commands": entries
+        }
+
+        counts = {}
+        for entry in entries:
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        tally = ", ".join(
+            f"{count} {status}" for status, count in counts.items()
+        )
+        response = (
+            "Vagrant SSH Batch:\n"
+            f"Machine: {machine or 'default'}\n"
+            f"Transport: {transport}\n"
+            f"Commands: {tally}\n"
+            f"Duration: {result['duration_ms']} ms\n"
+        )
+        for entry in entries:
+            response += f"\n[{entry['index'] + 1}] {entry['command']}\n"
+            if entry["status"] == "skipped":
+                response += "Skipped\n"
+                continue
+            timing = (
+                f", {entry['duration_ms']} ms"
+                if "duration_ms" in entry
+                else ""
+            )
+            response += (
+                f"Status: {entry['status']} "
+                f"(exit {entry['return_code']}{timing})\n"
+            )
+            if entry.get("truncated"):
+                response += (
+                    "Output truncated. Full output: "
+                    f"{entry['stdout_uri']} , {entry['stderr_uri']}\n"
+                )
+            if entry["stdout"]:
+                response += (
+                    entry["stdout"]
+                    if entry["stdout"].endswith("\n")
+                    else entry["stdout"] + "\n"
+                )
+            if entry["stderr"]:
+                response += "stderr:\n"
+                response += (
+                    entry["stderr"]
+                    if entry["stderr"].endswith("\n")
+                    else entry["stderr"] + "\n"
+                )
+        return self._tool_result(response, result)
+
+    async def _vagrant_shell_open(self, args: dict) -> ToolResult:
+        """Open a persistent shell session on a machine"""
+        if len(self._shell_sessions) >= MAX_SHELL_SESSIONS:
+            raise ValueError(
+                f"Too many open shell sessions ({MAX_SHELL_SESSIONS}); close "
+                "one first"
+            )
+        directory = args.get("directory")
+        machine = args.get("machine_name")
+        cwd = self._get_working_directory(directory)
+
+        cmd, transport = await self._guest_shell_command(
+            directory, machine, SHELL_COMMAND
+        )
+        process = await self._spawn_process(
+            cmd, cwd=cwd, stdin=asyncio.subprocess.PIPE
+        )
+        session = ShellSession(
+            machine, cwd, process, transport,
+            float(args.get("ttl_s") or SHELL_IDLE_TTL_SECONDS)
+        )
+        self._shell_sessions[session.session_id] = session
+
+        # A first no-op command checks that the shell is up and soaks up
+        # anything the login scripts print
+        result = await self._shell_run(session, "true")
+        if not result["success"]:
+            await self._close_shell_session(session)
+            raise ValueError(
+                f"Could not open a shell: {result['stderr'].strip()}"
+            )
+        session.commands = 0
+        self._shell_stats["opened"] += 1
+        if self._shell_reaper_task is None:
+            self._shell_reaper_task = self._start_background(
+                self._reap_shell_sessions()
+            )
+
+        info = session.describe()
+        response = (
+            f"Vagrant Shell Open:\nSession ID: {session.session_id}\n"
+            f"Machine: {machine or 'default'}\nTransport: {transport}\n"
+            f"Idle TTL: {session.ttl:g} s\n"
+        )
+        return self._tool_result(response, info)
+
+    async def _vagrant_shell_exec(self, args: dict) -> ToolResult:
+        """Run a command in an open shell session"""
+        if not args.get("command"):
+            raise ValueError("command parameter is required")
+        session = self._get_shell_session(args.get("session_id"))
+
+        result = await self._shell_run(
+            session, args["command"], args.get("max_output_bytes")
+        )
+        details = [
+            f"Session: {session.session_id}",
+            f"Duration: {result['duration_ms']} ms"
+        ]
+        if session.closed:
+            details.append(
+                "Session closed: the shell exited or the command was stopped"
+            )
+        response = self._format_result(
+            "Vagrant Shell Exec", result, details=details
+        )
+        return self._tool_result(response, result)
+
+    async def _vagrant_shell_close(self, args: dict) -> ToolResult:
+        """Close a shell session"""
+        session = self._get_shell_session(args.get("session_id"))
+        await self._close_shell_session(session)
+        info = session.describe()
+        response = (
+            f"Vagrant Shell Close:\nSession ID: {session.session_id}\n"
+            f"Commands run: {session.commands}\n"
+        )
+        return self._tool_result(response, info)
+
+    def _get_shell_session(self, session_id: Optional[str]) -> ShellSession:
+        """Look up an open shell session"""
+        if not session_id:
+            raise ValueError("session_id parameter is required")
+        session = self._shell_sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"Unknown or closed shell session: {session_id}")
+        return session
+
+    async def _shell_run(
+        self,
+        session: ShellSession,
+        command: str,
+        max_output_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Run one command in a session and capture its output up to the
+        sentinels.
+
+        If the command outlives the call's limits, or the call is cancelled,
+        the shell is left mid-command with no way to interrupt it, so the
+        session is closed. The same happens when the shell exits.
+        """
+        async with session.lock:
+            if session.closed:
+                raise ValueError(
+                    f"Unknown or closed shell session: {session.session_id}"
+                )
+            process = session.process
+            sentinel = f"__VAGRANT_MCP_{uuid.uuid4().hex}"
+            marker = f"\n{sentinel}".encode()
+            run = self._register_run(command)
+            session.commands += 1
+            self._shell_stats["commands"] += 1
+            started = time.monotonic()
+            status = None
+            try:
+                process.stdin.write(session.script(command, sentinel))
+                await process.stdin.drain()
+                status = await self._copy_framed_output(
+                    session.readers, run, marker, *CALL_LIMITS.get()
+                )
+            except ConnectionError:
+                pass
+            except BaseException:
+                with anyio.CancelScope(shield=True):
+                    await self._close_shell_session(session, graceful=False)
+                raise
+            finally:
+                run.finished_at = time.time()
+                session.last_used = time.monotonic()
+
+            if status is not None:
+                run.return_code = int(status.lstrip(b":"))
+            if run.return_code is None:
+                # The shell exited (e.g. the command ran `exit`) or is stuck
+                await self._close_shell_session(session, graceful=False)
+                if run.termination is None:
+                    run.return_code = process.returncode
+
+        result = self._build_result(
+            [command], session.cwd, run, max_output_bytes
+        )
+        result.update(
+            session_id=session.session_id,
+            duration_ms=int((time.monotonic() - started) * 1000),
+            session_closed=session.closed
+        )
+        if session.closed:
+            result["success"] = False
+        return result
+
+    async def _guest_shell_command(
+        self,
+        directory: Optional[str],
+        machine: Optional[str],
+        remote_command: str
+    ) -> Tuple[List[str], str]:
+        """
+        Command line running remote_command on a machine with stdin attached,
+        over direct ssh when possible. Returns it with the transport name.
+        """
+        target = await self._ssh_target(directory, machine)
+        if target is not None:
+            return target.command(remote_command), "openssh"
+        cmd = (
+            ["vagrant", "ssh"]
+            + ([machine] if machine else [])
+            + ["-c", remote_command]
+        )
+        return cmd, "vagrant"
+
+    async def _copy_framed_output(
+        self,
+        readers: Tuple[SentinelReader, SentinelReader],
+        run: RunOutput,
+        marker: bytes,
+        timeout: Optional[float],
+        stall_timeout: Optional[float]
+    ) -> Optional[bytes]:
+        """
+        Copy a guest shell's stdout and stderr readers into run up to marker
+        on both streams and return the rest of the marker line on stdout.
+
+        Returns None if the shell exited first, or if the watchdog stopped
+        waiting (run.termination is set then). The process is left running
+        in either case; the caller decides what to do with it.
+        """
+        async def copy_both() -> List[bytes]:
+            return await asyncio.gather(
+                readers[0].copy_until(run.stdout, marker),
+                readers[1].copy_until(run.stderr, marker)
+            )
+
+        work = asyncio.ensure_future(copy_both())
+        watchdog = asyncio.ensure_future(
+            self._watchdog(run, timeout, stall_timeout)
+        )
+        try:
+            done, _ = await asyncio.wait(
+                {work, watchdog}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if watchdog in done:
+                run.termination = watchdog.result()
+                return None
+            return work.result()[0]
+        except (EOFError, ConnectionError):
+            return None
+        finally:
+            work.cancel()
+            watchdog.cancel()
+
+    async def _close_shell_session(
+        self, session: ShellSession, graceful: bool = True
+    ) -> None:
+        """
+        Ask the shell to exit, terminating it if it does not. A shell stuck
+        in a command is terminated right away (graceful=False).
+        """
+        session.closed = True
+        self._shell_sessions.pop(session.session_id, None)
+        process = session.process
+        if process.returncode is None and graceful:
+            try:
+                process.stdin.write(b"exit\n")
+                process.stdin.close()
+                await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+        if process.returncode is None:
+            await self._terminate_process_group(process)
+        self._processes.pop(process.pid, None)
+
+    async def _reap_shell_sessions(self) -> None:
+        """Close sessions idle for longer than their TTL, until none is left"""
+        try:
+            while self._shell_sessions:
+                interval = min(
+                    [30.0] + [s.ttl / 4 for s in self._shell_sessions.values()]
+                )
+                await asyncio.sleep(max(interval, 0.5))
+                for session in list(self._shell_sessions.values()):
+                    if (not session.lock.locked()
+                            and session.idle_seconds() > session.ttl):
+                        logger.info(
+                            f"Closing idle shell session {session.session_id}"
+                        )
+                        self._shell_stats["reaped"] += 1
+                        await self._close_shell_session(session)
+        finally:
+            self._shell_reaper_task = None
+
+    async def _vagrant_lease(self, args: dict) -> ToolResult:
+        """
+        Hand out a ready machine from the warm pool.
+
+        When no machine is ready, the call waits up to wait_s for one to be
+        prepared or returned. Either way the pool is topped up again in the
+        background.
+        """
+        if not POOL_DIRECTORY:
+            raise ValueError(
+                "No warm pool is configured (set VAGRANT_POOL_DIRECTORY)"
+            )
+        ttl = float(args.get("ttl_s") or POOL_LEASE_TTL_SECONDS)
+        wait = float(args.get("wait_s", POOL_LEASE_WAIT_SECONDS))
+        if ttl <= 0:
+            raise ValueError("ttl_s must be positive")
+        await self._pool_start()
+
+        began = time.monotonic()
+        hit = any(member.state == "ready" for member in self._pool.values())
+        self._pool_stats["hits" if hit else "misses"] += 1
+        self._pool_refill()
+        try:
+            async with self._pool_changed:
+                if not hit:
+                    await asyncio.wait_for(self._pool_changed.wait_for(
+                        lambda: any(
+                            member.state == "ready"
+                            for member in self._pool.values()
+                        )
+                    ), wait)
+                member = min(
+                    (m for m in self._pool.values() if m.state == "ready"),
+                    key=lambda m: m.ready_since
+                )
+                member.state = "leased"
+                member.lease_id = uuid.uuid4().hex[:12]
+                member.leased_at = time.time()
+                member.expires_at = member.leased_at + ttl
+        except asyncio.TimeoutError:
+            self._pool_stats["timeouts"] += 1
+            members = ", ".join(
+                f"{m.machine}={m.state}" for m in self._pool.values()
+            )
+            raise ValueError(
+                f"No pool machine became ready within {wait:g} s "
+                f"(pool: {members or 'empty'})"
+            )
+        wait_ms = int((time.monotonic() - began) * 1000)
+        self._pool_stats["wait_ms"] += wait_ms
+        self._pool_stats["max_wait_ms"] = max(
+            self._pool_stats["max_wait_ms"], wait_ms
+        )
+
+        # Replace the leased machine in the pool
+        self._pool_refill()
+        if self._pool_reaper_task is None:
+            self._pool_reaper_task = self._start_background(
+                self._reap_pool_leases()
+            )
+
+        result = dict(member.describe(), directory=POOL_DIRECTORY, ttl_s=ttl,
+                      wait_ms=wait_ms, hit=hit)
+        response = (
+            "Vagrant Lease:\n"
+            f"Lease ID: {member.lease_id}\n"
+            f"Machine: {member.machine}\n"
+            f"Directory: {POOL_DIRECTORY}\n"
+            f"Expires In: {ttl:g} s\n"
+            f"Wait: {wait_ms} ms "
+            f"({'machine was ready' if hit else 'no machine was ready'})\n\n"
+            f"Pass directory \"{POOL_DIRECTORY}\" and machine_name "
+            f"\"{member.machine}\" to the other tools, and call "
+            "vagrant_release with the lease ID when done.\n"
+        )
+        return self._tool_result(response, result)
+
+    async def _vagrant_release(self, args: dict) -> ToolResult:
+        """Return a leased machine to the pool"""
+        lease_id = args.get("lease_id")
+        if not lease_id:
+            raise ValueError("lease_id parameter is required")
+        member = next(
+            (m for m in self._pool.values() if m.lease_id == lease_id), None
+        )
+        if member is None:
+            raise ValueError(f"Unknown or expired lease: {lease_id}")
+
+        held_s = round(time.time() - member.leased_at, 1)
+        self._pool_release(member)
+        self._pool_stats["released"] += 1
+        result = {"lease_id": lease_id, "machine": member.machine,
+                  "state": member.state, "held_s": held_s}
+        response = (
+            "Vagrant Release:\n"
+            f"Lease ID: {lease_id}\n"
+            f"Machine: {member.machine}\n"
+            f"Held: {held_s} s\n"
+            "Restoring the clean snapshot in the background\n"
+        )
+        return self._tool_result(response, result)
+
+    async def _pool_start(self) -> None:
+        """Load the pool's machines from its project, once"""
+        if self._pool_loading is None:
+            self._pool_loading = self._start_background(self._pool_load())
+        try:
+            await asyncio.shield(self._pool_loading)
+        except ValueError:
+            # Let the next call try again
+            self._pool_loading = None
+            raise
+
+    async def _pool_load(self) -> None:
+        """List the pool project's machines and start preparing them"""
+        _, status = await self._vagrant_status({"directory": POOL_DIRECTORY})
+        if not status["success"]:
+            raise ValueError(
+                f"Cannot list the pool machines: {status['stderr'].strip()}"
+            )
+        for machine in status["machines"]:
+            self._pool.setdefault(machine["name"], PoolMember(machine["name"]))
+        logger.info(
+            f"Warm pool: {len(self._pool)} machines in {POOL_DIRECTORY}"
+        )
+        self._pool_refill()
+
+    def _pool_refill(self) -> None:
+        """Prepare cold machines until POOL_SIZE are ready or on the way"""
+        available = sum(
+            1
+            for m in self._pool.values()
+            if m.state in ("ready", "warming", "restoring")
+        )
+        for member in self._pool.values():
+            if available >= POOL_SIZE:
+                break
+            if member.state == "cold":
+                member.state = "warming"
+                available += 1
+                self._start_background_detached(self._pool_prepare(member))
+
+    def _pool_release(self, member: PoolMember) -> None:
+        """End a member's lease and reset it in the background"""
+        member.state = "restoring"
+        member.lease_id = member.leased_at = member.expires_at = None
+        self._start_background_detached(self._pool_prepare(member))
+
+    async def _pool_prepare(self, member: PoolMember) -> None:
+        """
+        Bring a member to its clean snapshot and mark it ready, or failed.
+
+        This runs as a background task nobody awaits, so every error ends
+        here: one escaping would leave the member warming for good and
+        silently shrink the pool.
+        """
+        kind = "restored" if member.state == "restoring" else "warmed"
+        CALL_LIMITS.set(
+            (TOOL_TIMEOUTS.get("vagrant_up"), STALL_TIMEOUT_SECONDS or None)
+        )
+        try:
+            result, kind, duration_ms = await self._pool_reset_member(
+                member, kind
+            )
+        except Exception as e:
+            # E.g. the pool directory vanished, or Vagrant could not be run
+            result = {
+                "success": False,
+                "stdout": "",
+                "stderr": f"{type(e).__name__}: {e}"
+            }
+
+        if result["success"]:
+            member.state = "ready"
+            member.ready_since = time.monotonic()
+            member.error = None
+            member.failures = 0
+            self._pool_stats[kind] += 1
+            self._pool_stats[
+                "last_warm_ms" if kind == "warmed" else "last_restore_ms"
+            ] = duration_ms
+        else:
+            member.state = "failed"
+            member.error = (result["stderr"] or result["stdout"]).strip()[
+                -1000:
+            ]
+            self._pool_stats["failed"] += 1
+            member.failures += 1
+            delay = min(
+                POOL_RETRY_SECONDS * 2 ** (member.failures - 1),
+                POOL_RETRY_MAX_SECONDS
+            )
+            member.retry_at = time.monotonic() + delay
+            logger.error(
+                f"Pool machine {member.machine} could not be prepared, "
+                f"retrying in {delay:g} s: {member.error}"
+            )
+            self._start_background_detached(self._pool_retry(member, delay))
+            # Try to keep the pool at size with another machine meanwhile
+            self._pool_refill()
+        async with self._pool_changed:
+            self._pool_changed.notify_all()
+
+    async def _pool_retry(self, member: PoolMember, delay: float) -> None:
+        """Return a failed member to the cold ones after delay seconds"""
+        await asyncio.sleep(delay)
+        if member.state == "failed":
+            member.state = "cold"
+            member.retry_at = None
+            self._pool_refill()
+
+    async def _pool_reset_member(
+        self, member: PoolMember, kind: str
+    ) -> Tuple[Dict[str, Any], str, int]:
+        """
+        Restore a member's clean snapshot, or, for a machine without it
+        (never prepared, or destroyed while leased), bring it up and take
+        the snapshot. Returns the last command's result, whether the
+        member was "restored" or "warmed", and the time taken in ms.
+        """
+        async with self._pool_slots:
+            began = time.monotonic()
+            result = await self._run_vagrant_command(
+                ["snapshot", "restore", member.machine, POOL_SNAPSHOT],
+                POOL_DIRECTORY
+            )
+            if not result["success"]:
+                logger.info(
+                    f"Pool machine {member.machine} has no clean snapshot, "
+                    "preparing it"
+                )
+                kind = "warmed"
+                result = await self._run_vagrant_command(
+                    ["up", member.machine], POOL_DIRECTORY
+                )
+                if result["success"]:
+                    result = await self._run_vagrant_command(
+                        [
+                            "snapshot", "save", member.machine, POOL_SNAPSHOT,
+                            "--force"
+                        ],
+                        POOL_DIRECTORY
+                    )
+            self._invalidate_machine_state(POOL_DIRECTORY)
+            return result, kind, int((time.monotonic() - began) * 1000)
 
-    async def _vagrant_halt(self, args: dict) -> list[TextContent]:
-        """Halt vagrant machines"""
-        cmd_args = ["halt"]
-        
-        if args.get("machine_name"):
-            cmd_args.append(args["machine_name"])
-            
-        if args.get("force", False):
-            cmd_args.append("--force")
-            
-        result = await self._run_vagrant_command(cmd_args, args.get("directory"))
-        
-        response = f"Vagrant Halt:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
-        
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
+    async def _reap_pool_leases(self) -> None:
+        """Return machines of expired leases to the pool until none is left"""
+        try:
+            while any(m.state == "leased" for m in self._pool.values()):
+                await asyncio.sleep(min(30.0, max(0.5, min(
+                    m.expires_at - time.time()
+                    for m in self._pool.values() if m.state == "leased"
+                ))))
+                for member in list(self._pool.values()):
+                    if (member.state == "leased"
+                            and member.expires_at <= time.time()):
+                        logger.info(
+                            f"Lease {member.lease_id} on {member.machine} "
+                            "expired"
+                        )
+                        self._pool_stats["expired"] += 1
+                        self._pool_release(member)
+        finally:
+            self._pool_reaper_task = None
+
+    def _note_activity(self, name: str, args: dict) -> None:
+        """
+        Record a tool call as activity on the machines it names, or on the
+        whole project when it names none, and start the idle reaper.
+        """
+        if name in TOOLS_WITHOUT_ACTIVITY:
+            return
+        if name == "vagrant_job_submit":
+            args = args.get("arguments") or {}
+        session = self._shell_sessions.get(args.get("session_id") or "")
+        try:
+            cwd = (
+                session.cwd
+                if session
+                else self._get_working_directory(args.get("directory"))
+            )
+        except ValueError:
+            return
+        if session:
+            machines = [session.machine or "*"]
+        elif args.get("machine_name"):
+            machines = [args["machine_name"]]
         else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+            machines = [
+                m for m in args.get("machines") or [] if isinstance(m, str)
+            ] or ["*"]
+        now = time.monotonic()
+        for machine in machines:
+            self._activity[(cwd, machine)] = now
+        if IDLE_TIMEOUT_SECONDS > 0 and self._idle_reaper_task is None:
+            self._idle_reaper_task = self._start_background_detached(
+                self._reap_idle_machines()
+            )
 
-    async def _vagrant_destroy(self, args: dict) -> list[TextContent]:
-        """Destroy vagrant machines"""
-        cmd_args = ["destroy"]
-        
-        if args.get("machine_name"):
-            cmd_args.append(args["machine_name"])
-            
-        if args.get("force", False):
-            cmd_args.append("--force")
-            
-        input_text = "y\n" if not args.get("force", False) else None
-        result = await self._run_vagrant_command(
-            cmd_args, args.get("directory"), input_text
+    async def _reap_idle_machines(self) -> None:
+        """Suspend or halt machines idle for IDLE_TIMEOUT_SECONDS"""
+        try:
+            while self._activity:
+                await asyncio.sleep(
+                    max(5.0, min(60.0, IDLE_TIMEOUT_SECONDS / 4))
+                )
+                for cwd in sorted({cwd for cwd, _ in self._activity}):
+                    try:
+                        await self._reap_idle_project(cwd)
+                    except Exception as e:
+                        logger.error(f"Idle check of {cwd} failed: {e}")
+        finally:
+            self._idle_reaper_task = None
+
+    async def _reap_idle_project(self, cwd: str) -> None:
+        """
+        Suspend or halt the running machines of a project that have been
+        idle too long.
+
+        Only machines this server has seen tool calls for are considered.
+        Machines of the warm pool, allowlisted machines, machines with an
+        open shell session and machines with commands queued or running are
+        left alone. Activity entries older than the idle window are dropped
+        afterwards, so a project is only checked again once it is used.
+        """
+        now = time.monotonic()
+        entries = {
+            machine: at
+            for (c, machine), at in self._activity.items()
+            if c == cwd
+        }
+        if not entries or now - min(entries.values()) < IDLE_TIMEOUT_SECONDS:
+            return
+        if POOL_DIRECTORY and cwd == os.path.realpath(
+            os.path.join(self._projects_root, POOL_DIRECTORY)
+        ):
+            return
+
+        _, status = await self._vagrant_status({"directory": cwd})
+        if not status["success"]:
+            return
+        relative = os.path.relpath(cwd, self._projects_root)
+        project_at = entries.get("*", 0.0)
+        keep = set()
+        for machine in status["machines"]:
+            name = machine["name"]
+            last = max(entries.get(name, 0.0), project_at)
+            if (
+                machine.get("state") != "running"
+                or not last
+                or now - last < IDLE_TIMEOUT_SECONDS
+            ):
+                continue
+            if any(fnmatch.fnmatchcase(name, pattern) or
+                   fnmatch.fnmatchcase(f"{relative}/{name}", pattern)
+                   for pattern in IDLE_ALLOWLIST):
+                continue
+            if self._scheduler.busy(cwd, frozenset([name])) or any(
+                session.cwd == cwd and session.machine in (name, None)
+                for session in self._shell_sessions.values()
+            ):
+                # Look again on the next pass
+                keep.add(name)
+                continue
+            await self._reap_machine(cwd, machine, now - last)
+
+        for machine, at in entries.items():
+            if machine not in keep and now - at >= IDLE_TIMEOUT_SECONDS:
+                # Only drop the entry if it was not refreshed meanwhile
+                if self._activity.get((cwd, machine)) == at:
+                    del self._activity[(cwd, machine)]
+
+    async def _reap_machine(
+        self, cwd: str, machine: Dict[str, Any], idle: float
+    ) -> None:
+        """Suspend (or halt) one idle machine and account for what it freed"""
+        name = machine["name"]
+        action = IDLE_ACTION
+        if (
+            action == "suspend"
+            and machine.get("provider") not in SUSPEND_PROVIDERS
+        ):
+            action = "halt"
+        resources = await self._machine_resources(cwd, name)
+        logger.info(
+            f"Machine {name} in {cwd} idle for {int(idle)} s, running {action}"
         )
-        
-        response = f"Vagrant Destroy:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
-        
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
-        else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
 
-    async def _vagrant_ssh(self, args: dict) -> list[TextContent]:
-        """Execute SSH commands on vagrant machines"""
-        if not args.get("command"):
-            raise ValueError("command parameter is required")
-            
-        cmd_args = ["ssh"]
-        
-        if args.get("machine_name"):
-            cmd_args.append(args["machine_name"])
-            
-        cmd_args.extend(["-c", args["command"]])
-        
-        result = await self._run_vagrant_command(cmd_args, args.get("directory"))
-        
-        response = f"Vagrant SSH Command:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
-        
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
-        else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+        CALL_LIMITS.set((
+            TOOL_TIMEOUTS.get(f"vagrant_{action}"),
+            STALL_TIMEOUT_SECONDS or None
+        ))
+        handler = (
+            self._vagrant_suspend if action == "suspend"
+            else self._vagrant_halt
+        )
+        _, result = await handler({"directory": cwd, "machine_name": name})
+        if not result["success"]:
+            self._idle_stats["failed"] += 1
+            logger.warning(f"Idle {action} of {name} in {cwd} failed")
+            return
+        self._idle_stats["reaped"] += 1
+        self._idle_stats["suspended" if action == "suspend" else "halted"] += 1
+        self._idle_stats["memory_mb_reclaimed"] += resources.get(
+            "memory_mb", 0
+        )
+        self._idle_stats["cpus_reclaimed"] += resources.get("cpus", 0)
+        self._idle_recent.append(dict(
+            resources,
+            directory=os.path.relpath(cwd, self._projects_root),
+            machine=name,
+            action=action,
+            idle_s=int(idle),
+            at=time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        ))
+
+    async def _machine_resources(self, cwd: str, name: str) -> Dict[str, int]:
+        """Memory (MB) and CPUs of a created machine, from its provider"""
+        machine = next(
+            (m for m in read_machine_dirs(cwd) or [] if m["name"] == name),
+            None
+        )
+        if (machine is None or not machine["id"]
+                or machine["provider"] not in PROVIDER_RESOURCE_COMMANDS):
+            return {}
+        cmd = [
+            part.format(id=machine["id"])
+            for part in PROVIDER_RESOURCE_COMMANDS[machine["provider"]]
+        ]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await process.communicate()
+        except OSError as e:
+            logger.debug(f"Resource query failed for {name}: {e}")
+            return {}
+        output = stdout.decode("utf-8", errors="replace")
+        memory_re, cpus_re, per_mb = PROVIDER_RESOURCE_RES[machine["provider"]]
+        resources = {}
+        memory, cpus = memory_re.search(output), cpus_re.search(output)
+        if memory:
+            resources["memory_mb"] = int(memory.group(1)) // per_mb
+        if cpus:
+            resources["cpus"] = int(cpus.group(1))
+        return resources
 
-    async def _vagrant_provision(self, args: dict) -> list[TextContent]:
+    async def _vagrant_provision(self, args: dict) -> ToolResult:
         """Run provisioners on vagrant machines"""
         cmd_args = ["provision"]
         
@@ -466,21 +5957,22 @@ class VagrantMCPServer:
             
         if args.get("provision_with"):
             cmd_args.extend(["--provision-with", args["provision_with"]])
-            
-        result = await self._run_vagrant_command(cmd_args, args.get("directory"))
-        
-        response = f"Vagrant Provision:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
+
+        planned = await self._plan_lifecycle_command(
+            "provision", cmd_args, args, "Vagrant Provision"
+        )
+        if planned is not None:
+            return planned
+
+        result = await self._run_vagrant_command(
+            cmd_args, args.get("directory"), stream=True,
+            max_output_bytes=args.get("max_output_bytes")
+        )
         
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
-        else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+        response = self._format_result("Vagrant Provision", result)
+        return self._tool_result(response, result)
 
-    async def _vagrant_reload(self, args: dict) -> list[TextContent]:
+    async def _vagrant_reload(self, args: dict) -> ToolResult:
         """Reload vagrant machines"""
         cmd_args = ["reload"]
         
@@ -489,21 +5981,23 @@ class VagrantMCPServer:
             
         if args.get("provision", False):
             cmd_args.append("--provision")
-            
-        result = await self._run_vagrant_command(cmd_args, args.get("directory"))
-        
-        response = f"Vagrant Reload:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
+
+        planned = await self._plan_lifecycle_command(
+            "reload", cmd_args, args, "Vagrant Reload"
+        )
+        if planned is not None:
+            return planned
+
+        result = await self._run_vagrant_command(
+            cmd_args, args.get("directory"), stream=True,
+            max_output_bytes=args.get("max_output_bytes")
+        )
         
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
-        else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+        self._invalidate_machine_state(args.get("directory"))
+        response = self._format_result("Vagrant Reload", result)
+        return self._tool_result(response, result)
 
-    async def _vagrant_snapshot(self, args: dict) -> list[TextContent]:
+    async def _vagrant_snapshot(self, args: dict) -> ToolResult:
         """Manage vagrant snapshots"""
         action = args.get("action")
         if not action:
@@ -511,63 +6005,939 @@ class VagrantMCPServer:
             
         cmd_args = ["snapshot", action]
         
-        if action in ["save", "restore", "delete"] and not args.get("snapshot_name"):
+        if (action in ["save", "restore", "delete"]
+                and not args.get("snapshot_name")):
             raise ValueError(f"snapshot_name is required for {action} action")
             
-        if args.get("snapshot_name"):
-            cmd_args.append(args["snapshot_name"])
-            
+        # Vagrant expects `snapshot <action> [vm-name] <name>`
         if args.get("machine_name"):
             cmd_args.append(args["machine_name"])
             
-        result = await self._run_vagrant_command(cmd_args, args.get("directory"))
-        
-        response = f"Vagrant Snapshot {action.title()}:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
+        if args.get("snapshot_name"):
+            cmd_args.append(args["snapshot_name"])
+            
+        result = await self._run_vagrant_command(
+            cmd_args, args.get("directory"),
+            max_output_bytes=args.get("max_output_bytes")
+        )
         
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
+        if action == "restore":
+            self._invalidate_machine_state(args.get("directory"))
+        elif action != "list":
+            # The snapshot set changed, possibly under a checkpoint stack
+            self._forget_checkpoints(
+                self._get_working_directory(args.get("directory"))
+            )
+        response = self._format_result(
+            f"Vagrant Snapshot {action.title()}", result
+        )
+        return self._tool_result(response, result)
+
+    async def _vagrant_checkpoint_push(self, args: dict) -> ToolResult:
+        """Save a checkpoint on top of a machine's stack, pruning the oldest"""
+        target = self._resolve_machine(args)
+        cwd, machine = target[0], target[1]
+        async with self._checkpoint_lock(cwd, machine):
+            began = time.monotonic()
+            stack = await self._checkpoint_stack(*target)
+            last = CHECKPOINT_NAME_RE.match(stack[-1]) if stack else None
+            number = int(last.group(1)) + 1 if last else 1
+            name = f"{CHECKPOINT_PREFIX}{number:04d}"
+            result = await self._checkpoint_snapshot(*target, "save", name)
+            if result["success"]:
+                stack.append(name)
+                self._checkpoint_stats["pushed"] += 1
+                while len(stack) > CHECKPOINT_MAX_DEPTH:
+                    oldest = stack.pop(0)
+                    pruned = await self._checkpoint_snapshot(
+                        *target, "delete", oldest
+                    )
+                    if not pruned["success"]:
+                        logger.warning(
+                            f"Could not prune checkpoint {oldest} of {machine}"
+                        )
+                        stack.insert(0, oldest)
+                        break
+                    self._checkpoint_stats["pruned"] += 1
+            return self._checkpoint_result(
+                "Vagrant Checkpoint Push", result, name, stack, began
+            )
+
+    async def _vagrant_checkpoint_pop(self, args: dict) -> ToolResult:
+        """Roll a machine back to its newest checkpoint"""
+        target = self._resolve_machine(args)
+        cwd, machine = target[0], target[1]
+        async with self._checkpoint_lock(cwd, machine):
+            began = time.monotonic()
+            stack = await self._checkpoint_stack(*target)
+            if not stack:
+                raise ValueError(f"Machine '{machine}' has no checkpoints")
+            name = stack[-1]
+            result = await self._checkpoint_snapshot(*target, "restore", name)
+            self._invalidate_machine_state(
+                args.get("directory"), keep_checkpoints=True
+            )
+            if result["success"] and not args.get("keep", False):
+                deleted = await self._checkpoint_snapshot(
+                    *target, "delete", name
+                )
+                if deleted["success"]:
+                    stack.pop()
+                else:
+                    logger.warning(
+                        f"Restored {name} of {machine} but could not delete it"
+                    )
+            if result["success"]:
+                self._checkpoint_stats["popped"] += 1
+            return self._checkpoint_result(
+                "Vagrant Checkpoint Pop", result, name, stack, began
+            )
+
+    async def _vagrant_checkpoint_drop(self, args: dict) -> ToolResult:
+        """Delete a machine's newest checkpoint, or all of them"""
+        target = self._resolve_machine(args)
+        cwd, machine = target[0], target[1]
+        async with self._checkpoint_lock(cwd, machine):
+            began = time.monotonic()
+            stack = await self._checkpoint_stack(*target)
+            if not stack:
+                raise ValueError(f"Machine '{machine}' has no checkpoints")
+            dropped = []
+            for name in reversed(
+                stack[:] if args.get("all", False) else stack[-1:]
+            ):
+                result = await self._checkpoint_snapshot(
+                    *target, "delete", name
+                )
+                if not result["success"]:
+                    break
+                stack.pop()
+                dropped.append(name)
+                self._checkpoint_stats["dropped"] += 1
+            return self._checkpoint_result(
+                "Vagrant Checkpoint Drop", result,
+                ", ".join(dropped) or name, stack, began
+            )
+
+    def _resolve_machine(self, args: dict) -> Tuple[str, str, Optional[str]]:
+        """
+        Resolve the project, machine and (for VirtualBox machines, when
+        VBoxManage is available) the VirtualBox VM id a single-machine tool
+        acts on.
+        """
+        context = self._project(args.get("directory"))
+        if context.vagrantfile is None:
+            raise ValueError(f"No Vagrantfile found in: {context.path}")
+        machine_dirs = read_machine_dirs(context.path) or []
+        machine = args.get("machine_name")
+        if not machine:
+            definitions = self._vagrantfiles.lookup(context.path)
+            if definitions and definitions["default_machine"]:
+                machine = definitions["default_machine"]
+            elif len(machine_dirs) == 1:
+                machine = machine_dirs[0]["name"]
+            else:
+                raise ValueError(
+                    "machine_name is required for multi-machine projects"
+                )
+        vm_id = next((
+            m["id"] for m in machine_dirs
+            if m["name"] == machine
+            and m["provider"] == "virtualbox" and m["id"]
+        ), None)
+        if vm_id and not shutil.which("VBoxManage"):
+            vm_id = None
+        return context.path, machine, vm_id
+
+    def _checkpoint_lock(self, cwd: str, machine: str) -> asyncio.Lock:
+        """The lock serialising checkpoint operations on one machine"""
+        return self._checkpoint_locks.setdefault(
+            (cwd, machine), asyncio.Lock()
+        )
+
+    async def _checkpoint_stack(
+        self, cwd: str, machine: str, vm_id: Optional[str]
+    ) -> List[str]:
+        """
+        The machine's checkpoint names, oldest first. The first call per
+        machine rebuilds the stack from the machine's snapshot list, so
+        checkpoints survive server restarts.
+        """
+        key = (cwd, machine)
+        if key not in self._checkpoints:
+            names = await self._snapshot_names(cwd, machine, vm_id)
+            self._checkpoints[key] = sorted(
+                (name for name in names if CHECKPOINT_NAME_RE.match(name)),
+                key=lambda name: int(CHECKPOINT_NAME_RE.match(name).group(1))
+            )
+        return self._checkpoints[key]
+
+    async def _snapshot_names(
+        self, cwd: str, machine: str, vm_id: Optional[str]
+    ) -> List[str]:
+        """
+        Names of a machine's snapshots, from VBoxManage when possible.
+
+        Raises ValueError when Vagrant cannot list them (e.g. the provider
+        has no snapshot support). VBoxManage exits non-zero for a VM
+        without snapshots, so its exit code is not checked.
+        """
+        if vm_id:
+            cmd = [
+                "VBoxManage", "snapshot", vm_id, "list", "--machinereadable"
+            ]
+            run = await self._execute(cmd, cwd, machine_readable=False)
+            return VBOX_SNAPSHOT_NAME_RE.findall(
+                self._build_result(cmd, cwd, run)["stdout"]
+            )
+        cmd = ["vagrant", "snapshot", "list", machine, "--machine-readable"]
+        run = await self._execute_single_flight(
+            cmd, cwd, machine_readable=True
+        )
+        run.parser.close()
+        if run.return_code != 0:
+            error = "\n".join(run.parser.errors) or f"exit {run.return_code}"
+            raise ValueError(f"Cannot list snapshots of '{machine}': {error}")
+        return parse_snapshot_list(run.parser, machine)
+
+    async def _checkpoint_snapshot(
+        self,
+        cwd: str,
+        machine: str,
+        vm_id: Optional[str],
+        action: str,
+        name: str
+    ) -> Dict[str, Any]:
+        """
+        Save, restore or delete one snapshot.
+
+        VirtualBox machines are handled with VBoxManage directly, which
+        skips Vagrant's startup. A restore powers the VM off first, as
+        VirtualBox requires, and resumes it when the snapshot holds a
+        running machine's saved state. Other providers go through
+        `vagrant snapshot`.
+        """
+        if not vm_id:
+            self._checkpoint_stats["vagrant"] += 1
+            result = await self._run_vagrant_command(
+                ["snapshot", action, machine, name], cwd
+            )
+            result["backend"] = "vagrant"
+            return result
+
+        self._checkpoint_stats["native"] += 1
+        if action == "save":
+            steps = [["VBoxManage", "snapshot", vm_id, "take", name]]
+        elif action == "delete":
+            steps = [["VBoxManage", "snapshot", vm_id, "delete", name]]
         else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+            steps = [["VBoxManage", "snapshot", vm_id, "restore", name]]
+            state = await self._provider_state("virtualbox", vm_id)
+            if state in ("running", "paused"):
+                steps.insert(0, ["VBoxManage", "controlvm", vm_id, "poweroff"])
+
+        executed = []
+        async with self._scheduler.hold(
+            cwd, frozenset([machine])
+        ) as queue_wait:
+            for cmd in steps:
+                executed.append(" ".join(cmd))
+                run = await self._execute(cmd, cwd, machine_readable=False)
+                if run.return_code != 0:
+                    break
+            else:
+                if (action == "restore"
+                        and await self._provider_state(
+                            "virtualbox", vm_id
+                        ) == "saved"):
+                    cmd = [
+                        "VBoxManage", "startvm", vm_id, "--type", "headless"
+                    ]
+                    executed.append(" ".join(cmd))
+                    run = await self._execute(cmd, cwd, machine_readable=False)
+        result = self._build_result(cmd, cwd, run, queue_wait=queue_wait)
+        # Output and return code are those of the last step
+        result["command"] = " && ".join(executed)
+        result["backend"] = "VBoxManage"
+        return result
+
+    def _checkpoint_result(
+        self,
+        title: str,
+        result: Dict[str, Any],
+        name: str,
+        stack: List[str],
+        began: float
+    ) -> ToolResult:
+        """Add checkpoint details to a snapshot command result and format it"""
+        result.update(
+            checkpoint=name,
+            stack=list(stack),
+            depth=len(stack),
+            duration_ms=int((time.monotonic() - began) * 1000)
+        )
+        response = self._format_result(title, result, details=[
+            f"Checkpoint: {name}",
+            f"Stack Depth: {len(stack)}",
+            f"Backend: {result['backend']}",
+            f"Duration: {result['duration_ms']} ms"
+        ])
+        return self._tool_result(response, result)
+
+    async def _vagrant_reset(self, args: dict) -> ToolResult:
+        """
+        Reset a machine with the cheapest strategy reaching the requested
+        cleanliness.
+
+        Strategies are ranked by their expected time: the smoothed duration
+        measured for this project and machine (a default estimate until
+        one is measured), divided by the strategy's observed success rate.
+        If the chosen strategy fails, the next one is tried. Every attempt
+        is recorded, so later choices follow how the host actually
+        performs.
+        """
+        level = args.get("cleanliness", "clean")
+        if level not in RESET_LEVELS:
+            raise ValueError(
+                f"cleanliness must be one of: {', '.join(RESET_LEVELS)}"
+            )
+        forced = args.get("strategy")
+        if forced and forced not in RESET_STRATEGIES:
+            raise ValueError(
+                f"strategy must be one of: {', '.join(RESET_STRATEGIES)}"
+            )
+        cwd, machine, vm_id = self._resolve_machine(args)
+        snapshot = args.get("snapshot_name") or POOL_SNAPSHOT
+        has_snapshot = False
+        # Listing snapshots may cost a Vagrant run; skip it when a snapshot
+        # restore could not reach the level anyway
+        if level in RESET_STRATEGIES["snapshot"]:
+            try:
+                has_snapshot = snapshot in await self._snapshot_names(
+                    cwd, machine, vm_id
+                )
+            except ValueError:
+                # No snapshot support: the other strategies remain
+                pass
+
+        options = self._rank_reset_strategies(
+            cwd, machine, level, snapshot, has_snapshot
+        )
+        if forced:
+            option = next(o for o in options if o["strategy"] == forced)
+            if option["excluded"]:
+                raise ValueError(
+                    f"Strategy {forced} cannot be used: {option['excluded']}"
+                )
+            chosen = [option]
+            reason = f"{forced} was requested"
+        else:
+            chosen = [o for o in options if not o["excluded"]]
+            reason = self._explain_reset_choice(options, level)
+
+        if args.get("dry_run", False):
+            result = {
+                "dry_run": True, "machine": machine, "cleanliness": level,
+                "strategy": chosen[0]["strategy"], "reason": reason,
+                "options": options
+            }
+            response = (
+                f"Vagrant Reset (dry run):\nMachine: {machine}\n"
+                f"Cleanliness: {level}\n"
+                f"Strategy: {chosen[0]['strategy']}\nWhy: {reason}\n\n"
+                + format_reset_options(options)
+            )
+            return self._tool_result(response, result)
+
+        attempts = []
+        for option in chosen:
+            began = time.monotonic()
+            result = await self._run_reset_strategy(
+                option["strategy"], cwd, machine, vm_id, snapshot,
+                args.get("max_output_bytes")
+            )
+            seconds = time.monotonic() - began
+            self._durations.record(
+                cwd, machine, f"reset:{option['strategy']}", seconds,
+                result["success"]
+            )
+            attempts.append({
+                "strategy": option["strategy"],
+                "success": result["success"],
+                "duration_ms": int(seconds * 1000)
+            })
+            if result["success"]:
+                break
+            logger.warning(
+                f"Reset of {machine} with {option['strategy']} failed"
+            )
+        self._invalidate_machine_state(cwd)
+
+        result.update(
+            machine=machine, cleanliness=level,
+            strategy=attempts[-1]["strategy"], reason=reason,
+            attempts=attempts, options=options,
+            duration_ms=sum(a["duration_ms"] for a in attempts)
+        )
+        details = [f"Machine: {machine}", f"Cleanliness: {level}",
+                   f"Strategy: {result['strategy']}", f"Why: {reason}"]
+        if len(attempts) > 1:
+            details.append(
+                "Fell back after: "
+                + ", ".join(
+                    f"{a['strategy']} "
+                    f"(failed after {a['duration_ms'] / 1000:.1f} s)"
+                    for a in attempts[:-1]
+                )
+            )
+        details.append(f"Duration: {result['duration_ms'] / 1000:.1f} s")
+        response = self._format_result(
+            "Vagrant Reset", result, details=details
+        )
+        response += "\n\n" + format_reset_options(options)
+        return self._tool_result(response, result)
+
+    def _rank_reset_strategies(
+        self,
+        cwd: str,
+        machine: str,
+        level: str,
+        snapshot: str,
+        has_snapshot: bool
+    ) -> List[Dict[str, Any]]:
+        """
+        Every reset strategy with its estimate, usable ones first in order
+        of expected time. excluded holds why a strategy cannot be used.
+        """
+        options = []
+        for strategy, levels in RESET_STRATEGIES.items():
+            record = (
+                self._durations.get(cwd, machine, f"reset:{strategy}") or {}
+            )
+            samples = record.get("samples", 0)
+            failures = record.get("failures", 0)
+            estimate = (
+                record.get("seconds") or RESET_DEFAULT_ESTIMATES[strategy]
+            )
+            excluded = None
+            if level not in levels:
+                excluded = f"does not reach '{level}'"
+            elif strategy == "snapshot" and not has_snapshot:
+                excluded = f"no snapshot named '{snapshot}'"
+            options.append({
+                "strategy": strategy,
+                "reaches": levels[-1],
+                "estimate_s": estimate,
+                "expected_s": round(
+                    estimate * (samples + failures + 1) / (samples + 1), 3
+                ),
+                "samples": samples,
+                "failures": failures,
+                "measured": samples > 0,
+                "excluded": excluded
+            })
+        options.sort(
+            key=lambda o: (o["excluded"] is not None, o["expected_s"])
+        )
+        return options
+
+    @staticmethod
+    def _explain_reset_choice(
+        options: List[Dict[str, Any]], level: str
+    ) -> str:
+        """One sentence on why the first usable strategy was chosen"""
+        def basis(option: Dict[str, Any]) -> str:
+            text = f"{option['expected_s']:.1f} s"
+            if option["measured"]:
+                runs = "run" if option["samples"] == 1 else "runs"
+                text += f", measured over {option['samples']} {runs}"
+            else:
+                text += ", default estimate"
+            if option["failures"]:
+                text += f", {option['failures']} failures"
+            return text
+
+        usable = [o for o in options if not o["excluded"]]
+        reason = (
+            f"{usable[0]['strategy']} has the lowest expected time "
+            f"({basis(usable[0])}) of the strategies reaching '{level}'"
+        )
+        others = [f"{o['strategy']}: {basis(o)}" for o in usable[1:]]
+        others += [
+            f"{o['strategy']}: {o['excluded']}"
+            for o in options
+            if o["excluded"]
+        ]
+        if others:
+            reason += "; " + "; ".join(others)
+        return reason
+
+    async def _run_reset_strategy(
+        self,
+        strategy: str,
+        cwd: str,
+        machine: str,
+        vm_id: Optional[str],
+        snapshot: str,
+        max_output_bytes: Optional[int]
+    ) -> Dict[str, Any]:
+        """Run one reset strategy and return the result of its last command"""
+        if strategy == "snapshot":
+            return await self._checkpoint_snapshot(
+                cwd, machine, vm_id, "restore", snapshot
+            )
+        if strategy == "reprovision":
+            return await self._run_vagrant_command(
+                ["reload", machine, "--provision"], cwd, stream=True,
+                max_output_bytes=max_output_bytes
+            )
+        destroyed = await self._run_vagrant_command(
+            ["destroy", machine, "--force"], cwd,
+            max_output_bytes=max_output_bytes
+        )
+        if not destroyed["success"]:
+            return destroyed
+        result = await self._run_vagrant_command(
+            ["up", machine], cwd, stream=True,
+            max_output_bytes=max_output_bytes
+        )
+        result["command"] = f"{destroyed['command']} && {result['command']}"
+        return result
+
+    async def _vagrant_global_status(self, args: dict) -> ToolResult:
+        """
+        Get global vagrant status.
+
+        The machine index is read directly; `vagrant global-status` is only
+        run when the index cannot be read.
+        """
+        try:
+            entries, cached = self._machine_index.read()
+        except (OSError, ValueError) as e:
+            logger.info(f"Machine index unavailable, using vagrant CLI: {e}")
+            return await self._vagrant_global_status_cli(args)
+
+        if args.get("prune", False):
+            entries = await self._prune_index_entries(entries)
+
+        result = {
+            "command": f"read {self._machine_index.path}",
+            "return_code": 0,
+            "stdout": format_global_status(entries),
+            "stderr": "",
+            "success": True,
+            "machines": entries
+        }
+        response = self._format_result(
+            "Vagrant Global Status", result,
+            details=[f"Cached: {'yes' if cached else 'no'}"]
+        )
+        return self._tool_result(response, result)
+
+    async def _prune_index_entries(
+        self, entries: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Drop entries whose project directory no longer exists.
+
+        This mirrors what `--prune` reports without rewriting the index, which
+        stays owned by Vagrant. The checks run in parallel since the paths
+        may live on slow network mounts.
+        """
+        loop = asyncio.get_running_loop()
+        valid = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    None, os.path.isdir, entry["vagrantfile_path"] or ""
+                )
+                for entry in entries
+            )
+        )
+        return [entry for entry, ok in zip(entries, valid) if ok]
 
-    async def _vagrant_global_status(self, args: dict) -> list[TextContent]:
-        """Get global vagrant status"""
+    async def _vagrant_global_status_cli(self, args: dict) -> ToolResult:
+        """Get global vagrant status from the vagrant CLI"""
         cmd_args = ["global-status"]
         
         if args.get("prune", False):
             cmd_args.append("--prune")
             
-        result = await self._run_vagrant_command(cmd_args)
-        
-        response = f"Vagrant Global Status:\n"
-        response += f"Command: {result['command']}\n"
-        response += f"Return Code: {result['return_code']}\n\n"
+        result = await self._run_vagrant_command(
+            cmd_args, max_output_bytes=args.get("max_output_bytes")
+        )
         
-        if result['success']:
-            response += f"Output:\n{result['stdout']}"
+        response = self._format_result("Vagrant Global Status", result)
+        return self._tool_result(response, result)
+
+    async def _vagrant_job_submit(self, args: dict) -> ToolResult:
+        """Start a tool call as a background job"""
+        tool = args.get("tool")
+        if tool not in JOB_TOOLS:
+            raise ValueError(f"tool must be one of: {', '.join(JOB_TOOLS)}")
+        arguments = args.get("arguments") or {}
+        if not isinstance(arguments, dict):
+            raise ValueError("arguments must be an object")
+        self._check_machine_names(arguments)
+
+        job = Job(tool, arguments)
+        self._jobs[job.job_id] = job
+        # Run the job in an empty context: it must outlive this request, so
+        # it must not see (and report progress to) the request context
+        job.task = contextvars.Context().run(
+            asyncio.ensure_future, self._run_job(job)
+        )
+        self._evict_jobs()
+
+        info = job.describe()
+        response = (
+            f"Vagrant Job Submitted:\nJob ID: {job.job_id}\nTool: {tool}\n"
+        )
+        return self._tool_result(response, info)
+
+    async def _run_job(self, job: Job) -> None:
+        """Run a job's tool call and record its outcome"""
+        CURRENT_JOB.set(job)
+        try:
+            _, result = await self._dispatch_tool(job.tool, job.arguments)
+            job.result = result
+            job.state = (
+                "succeeded" if result.get("success", True) else "failed"
+            )
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.tool}) failed: {e}")
+            job.state = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def _evict_jobs(self) -> None:
+        """Forget the oldest finished jobs beyond RETAINED_JOBS"""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= RETAINED_JOBS:
+                break
+            if self._jobs[job_id].finished_at is not None:
+                del self._jobs[job_id]
+
+    def _get_job(self, args: dict) -> Job:
+        """Look up the job named by the job_id argument"""
+        job_id = args.get("job_id")
+        if not job_id:
+            raise ValueError("job_id parameter is required")
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Unknown job: {job_id}")
+        return job
+
+    async def _vagrant_job_status(self, args: dict) -> ToolResult:
+        """Report the state of one or all background jobs"""
+        if args.get("job_id"):
+            jobs = [self._get_job(args)]
         else:
-            response += f"Error:\n{result['stderr']}"
-            
-        return [TextContent(type="text", text=response)]
+            jobs = list(self._jobs.values())
+
+        infos = [job.describe() for job in jobs]
+        response = "Vagrant Jobs:\n"
+        for info in infos:
+            response += (
+                f"{info['job_id']}  {info['tool']:<18} {info['state']:<10} "
+                f"{info['duration_s']}s\n"
+            )
+        if not infos:
+            response += "No jobs\n"
+        if (len(jobs) == 1 and jobs[0].result is not None
+                and jobs[0].finished_at):
+            response += "\n" + self._format_result(
+                f"Result of {jobs[0].tool}", jobs[0].result
+            )
+        return self._tool_result(response, {"jobs": infos})
+
+    async def _vagrant_job_output(self, args: dict) -> ToolResult:
+        """
+        Read a byte range of a job's output.
+
+        Reads stop at the last complete line so records are never split
+        between two reads; machine-readable records are rendered as their
+        messages. next_offset is where the following read should start.
+
+        Offsets belong to one command of the job: the one named by run_id,
+        or the job's first. Jobs that run several commands, possibly at
+        once (vagrant_up_graph starts one `vagrant up` per machine), list
+        them in runs so each can be followed on its own.
+        """
+        job = self._get_job(args)
+        stream_name = args.get("stream", "stdout")
+        offset = max(0, int(args.get("offset", 0)))
+        max_bytes = max(
+            1, int(args.get("max_bytes", DEFAULT_MAX_OUTPUT_BYTES))
+        )
+
+        run = job.runs[0] if job.runs else None
+        if args.get("run_id"):
+            run = next(
+                (r for r in job.runs if r.run_id == args["run_id"]), None
+            )
+            if run is None:
+                raise ValueError(
+                    f"Job {job.job_id} has no run {args['run_id']}"
+                )
+        info: Dict[str, Any] = {
+            "job_id": job.job_id,
+            "state": job.state,
+            "stream": stream_name,
+            "run_id": run.run_id if run else None,
+            "command": run.command if run else None,
+            "offset": offset,
+            "next_offset": offset,
+            "total_bytes": 0,
+            "text": ""
+        }
+        if len(job.runs) > 1:
+            info["runs"] = job.describe()["runs"]
+        if run is not None:
+            if run.run_id not in self._runs:
+                raise ValueError(f"Output of job {job.job_id} has expired")
+            capture = run.capture(stream_name)
+            data = capture.read(offset, max_bytes)
+            if run.finished_at is None or offset + len(data) < capture.size:
+                last_newline = data.rfind(b"\n")
+                if last_newline >= 0:
+                    data = data[:last_newline + 1]
+                elif len(data) < max_bytes:
+                    # Wait for the rest of the line
+                    data = b""
+
+            if run.parser is not None and stream_name == "stdout":
+                parser = MachineReadableParser()
+                parser.feed(data)
+                parser.close()
+                text = parser.text()
+            else:
+                text = data.decode("utf-8", errors="replace")
+            info.update(
+                next_offset=offset + len(data), total_bytes=capture.size,
+                text=text
+            )
+
+        # One command of several is complete once it has finished, even
+        # while the job's other commands still run
+        finished = job.finished_at is not None or (
+            len(job.runs) > 1 and run.finished_at is not None
+        )
+        info["complete"] = (
+            finished and info["next_offset"] >= info["total_bytes"]
+        )
+        response = f"Vagrant Job Output ({job.job_id}, {job.state}):\n"
+        if run is not None:
+            response += f"Command: {run.command} (run {run.run_id})\n"
+        if len(job.runs) > 1:
+            response += (
+                f"Other commands of this job: {len(job.runs) - 1} "
+                "(pass one of the run_ids in runs to read it)\n"
+            )
+        response += (
+            f"Bytes {offset}-{info['next_offset']} of {info['total_bytes']}"
+            f"{' (complete)' if info['complete'] else ''}\n\n{info['text']}"
+        )
+        return self._tool_result(response, info)
+
+    async def _vagrant_job_cancel(self, args: dict) -> ToolResult:
+        """Cancel a running background job"""
+        job = self._get_job(args)
+        if job.finished_at is None and job.task is not None:
+            job.task.cancel()
+            # Let the job record its cancellation and stop its process
+            await asyncio.wait([job.task])
+
+        info = job.describe()
+        response = (
+            f"Vagrant Job Cancel:\nJob ID: {job.job_id}\nState: {job.state}\n"
+        )
+        return self._tool_result(response, info)
+
+    async def _vagrant_list_projects(self, args: dict) -> ToolResult:
+        """
+        List project directories from the project index.
+
+        Machine states come from the project's last status result in this
+        server, or else from Vagrant's machine index when it has entries for
+        the Vagrantfile's path. Failing both, machine names (without states)
+        come from the Vagrantfile cache.
+        """
+        index = self._project_index
+        await index.start()
+        if args.get("refresh", False):
+            await index.rescan()
+        limit = int(args.get("limit") or 1000)
+
+        index_machines: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            entries, _ = self._machine_index.read()
+        except (OSError, ValueError):
+            entries = []
+        for entry in entries:
+            if entry["vagrantfile_path"]:
+                index_machines.setdefault(
+                    os.path.normpath(entry["vagrantfile_path"]), []
+                ).append({"name": entry["name"], "state": entry["state"]})
+
+        projects = []
+        for path in sorted(index.projects):
+            directory = os.path.relpath(path, self._projects_root)
+            if args.get("filter") and not fnmatch.fnmatchcase(
+                directory, args["filter"]
+            ):
+                continue
+            project = {
+                "directory": directory,
+                "path": path,
+                "machines": None,
+                "states_from": None
+            }
+            context = self._projects.get(path)
+            if context is not None and context.last_machines is not None:
+                project.update(
+                    machines=context.last_machines, states_from="status",
+                    checked_at=context.last_status_at
+                )
+            elif path in index_machines:
+                project.update(
+                    machines=index_machines[path], states_from="machine-index"
+                )
+            else:
+                definitions = self._vagrantfiles.lookup(path)
+                if definitions is not None:
+                    project["machines"] = [
+                        {"name": name, "state": None}
+                        for name in definitions["machines"]
+                    ]
+            projects.append(project)
+
+        result = {
+            "root": self._projects_root,
+            "index": index.describe(),
+            "total": len(projects),
+            "projects": projects[:limit]
+        }
+
+        info = result["index"]
+        response = (
+            "Vagrant Projects:\n"
+            f"Root: {self._projects_root}\n"
+            f"Index: {info['mode']}, {info['projects']} projects, scanned in "
+            f"{info['scan_ms']} ms\n"
+            f"Matching: {len(projects)}\n\n"
+        )
+        rows = [("DIRECTORY", "MACHINES")]
+        for project in result["projects"]:
+            if project["machines"] is None:
+                machines = "(unknown)"
+            else:
+                machines = (
+                    ", ".join(
+                        f"{m['name']}={m['state'] or 'unknown'}"
+                        for m in project["machines"]
+                    )
+                    or "(none)"
+                )
+            rows.append((project["directory"], machines))
+        width = max(len(row[0]) for row in rows)
+        response += "".join(
+            f"{row[0].ljust(width)}  {row[1]}\n" for row in rows
+        )
+        if len(projects) > limit:
+            response += (
+                f"... {len(projects) - limit} more "
+                "(raise limit or use filter)\n"
+            )
+        return self._tool_result(response, result)
+
+    async def _vagrant_server_stats(self, args: dict) -> ToolResult:
+        """Report server statistics"""
+        stats = {
+            "single_flight": dict(
+                self._single_flight_stats, in_flight=len(self._in_flight)
+            ),
+            "scheduler": self._scheduler.snapshot(),
+            "lifecycle_planning": dict(self._plan_stats),
+            "durations": self._durations.summary(),
+            "ssh": dict(
+                self._ssh_stats,
+                cached_targets=len(self._ssh_targets),
+                client_missing=self._ssh_missing
+            ),
+            "shell_sessions": dict(
+                self._shell_stats, open=len(self._shell_sessions)
+            ),
+            "checkpoints": dict(
+                self._checkpoint_stats,
+                stacks={
+                    f"{cwd}:{machine}": len(names)
+                    for (cwd, machine), names in self._checkpoints.items()
+                    if names
+                }
+            ),
+            "idle_reaper": dict(
+                self._idle_stats,
+                enabled=IDLE_TIMEOUT_SECONDS > 0,
+                idle_timeout_s=IDLE_TIMEOUT_SECONDS,
+                action=IDLE_ACTION,
+                tracked=len(self._activity),
+                recent=list(self._idle_recent)
+            ),
+            "pool": dict(self._pool_stats, members={
+                state: sum(1 for m in self._pool.values() if m.state == state)
+                for state in (
+                    "cold", "warming", "ready", "leased", "restoring", "failed"
+                )
+            }) if POOL_DIRECTORY else None,
+            "jobs": {
+                "running": sum(
+                    1 for job in self._jobs.values()
+                    if job.finished_at is None
+                ),
+                "retained": len(self._jobs)
+            },
+            "projects": len(self._projects),
+            "project_index": self._project_index.describe(),
+            "retained_runs": len(self._runs)
+        }
+        response = f"Vagrant MCP Server Stats:\n{json.dumps(stats, indent=2)}"
+        return self._tool_result(response, stats)
 
     async def run(self):
         """Run the MCP server"""
-        async with stdio_server() as (read_stream, write_stream):
-            await self.server.run(
-                read_stream,
-                write_stream,
-                InitializationOptions(
-                    server_name="vagrant-mcp-server",
-                    server_version="0.1.0",
-                    capabilities=self.server.get_capabilities(
-                        notification_options=NotificationOptions(),
-                        experimental_capabilities={}
+        # Build the project index and fill the warm pool while the client
+        # connects
+        self._start_background(self._project_index.start())
+        if POOL_DIRECTORY:
+            self._start_background(self._pool_start())
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    InitializationOptions(
+                        server_name="vagrant-mcp-server",
+                        server_version="0.1.0",
+                        capabilities=self.server.get_capabilities(
+                            notification_options=NotificationOptions(),
+                            experimental_capabilities={}
+                        )
                     )
                 )
-            )
+        finally:
+            # Do not leave Vagrant processes holding machine locks behind
+            with anyio.CancelScope(shield=True):
+                await self._terminate_all_processes()
+                await asyncio.gather(*(
+                    self._close_ssh_target(target)
+                    for target in self._ssh_targets.values()
+                ))
+            shutil.rmtree(self._ssh_runtime_dir, ignore_errors=True)
+            self._project_index.close()
 
 async def main():
     """Main entry point"""
@@ -575,4 +6945,4 @@ async def main():
     await server.run()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())